@@ -0,0 +1,754 @@
+#!/usr/bin/env python3
+"""
+GeniusMultiTrader のベクトル化バックテスト
+5分足の履歴から全時間足のEMA・日足のATR/RSI/サポレジ・24h出来高を
+(通貨数 × 本数) の時系列として一括計算し、analyze_genius と同じ採点で全バーの信頼度を求める
+取引は信頼度が閾値を超えたバーでエントリーし、Dynamic Exit Matrix の最初の利確と最終損切りで決済
+"""
+
+import os
+import heapq
+import time
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pytz
+from numpy.lib.stride_tricks import sliding_window_view
+
+import indicators
+from batch_indicators import BULLISH, BEARISH, classify_cross
+from cycle_cache import HitStats
+from exit_replay import bar_ticks, replay
+from services.kline_cache import INTERVAL_MS, KLINE_DTYPE, to_kline_array
+
+logger = logging.getLogger(__name__)
+
+BASE_INTERVAL = '5'
+BAR_MS = INTERVAL_MS[BASE_INTERVAL]
+BARS_PER_DAY = INTERVAL_MS['D'] // BAR_MS
+DAILY_WINDOW = 30  # _fetch_market_data の日足本数
+
+# 決済理由コード
+EXIT_TP, EXIT_SL, EXIT_TIME, EXIT_END, EXIT_TRAIL = 0, 1, 2, 3, 4
+EXIT_REASONS = ('take_profit', 'stop_loss', 'time', 'end_of_data', 'trailing_stop')
+
+TRADE_DTYPE = np.dtype([
+    ('symbol', np.int32),        # MarketHistory.symbols のインデックス
+    ('entry_index', np.int64),
+    ('exit_index', np.int64),
+    ('direction', np.int8),      # 1: LONG, -1: SHORT
+    ('entry_price', np.float64),
+    ('exit_price', np.float64),
+    ('confidence', np.float64),
+    ('position_size', np.float64),
+    ('return', np.float64),      # 手数料控除後の価格リターン
+    ('reason', np.int8),
+])
+
+class MarketHistory:
+    """共通の5分足時間軸に揃えた全通貨の履歴（各フィールドは (通貨数 × 本数) 行列）
+
+    時間軸はUTCの日の区切りから始まるため、上位足の足はすべて取引所と同じ区切りになる。
+    欠損バーと上場前のバーは直前（上場前は最初）の終値・出来高0で埋め、
+    first_index で上場後の最初のバーを保持する。
+    """
+
+    FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, symbols: List[str], timestamps: np.ndarray, open: np.ndarray, high: np.ndarray,
+                 low: np.ndarray, close: np.ndarray, volume: np.ndarray, first_index: np.ndarray):
+        self.symbols = list(symbols)
+        self.timestamps = timestamps
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.first_index = first_index
+
+    @classmethod
+    def from_klines(cls, klines_by_symbol: Dict[str, np.ndarray]) -> 'MarketHistory':
+        """通貨ごとの5分足（KLINE_DTYPE）から作成"""
+        arrays = {symbol: to_kline_array(klines) for symbol, klines in klines_by_symbol.items()}
+        arrays = {symbol: klines for symbol, klines in arrays.items() if len(klines) > 0}
+        if not arrays:
+            raise ValueError("no klines")
+
+        day_ms = INTERVAL_MS['D']
+        start = min(int(k['timestamp'][0]) for k in arrays.values()) // day_ms * day_ms
+        end = max(int(k['timestamp'][-1]) for k in arrays.values())
+        timestamps = start + np.arange((end - start) // BAR_MS + 1, dtype=np.int64) * BAR_MS
+
+        shape = (len(arrays), len(timestamps))
+        fields = {field: np.full(shape, np.nan) for field in cls.FIELDS}
+        first_index = np.empty(len(arrays), dtype=np.int64)
+        for i, klines in enumerate(arrays.values()):
+            index = (klines['timestamp'] - start) // BAR_MS
+            for field in cls.FIELDS:
+                fields[field][i, index] = klines[field]
+            first_index[i] = index[0]
+
+        # 欠損バーは直前の終値で埋める（上場前は最初の終値）
+        present = ~np.isnan(fields['close'])
+        source = np.where(present, np.arange(shape[1]), 0)
+        np.maximum.accumulate(source, axis=1, out=source)
+        np.maximum(source, first_index[:, None], out=source)
+        close = np.take_along_axis(fields['close'], source, axis=1)
+        for field in ('open', 'high', 'low'):
+            fields[field] = np.where(present, fields[field], close)
+        fields['close'] = close
+        fields['volume'] = np.where(present, fields['volume'], 0.0)
+
+        return cls(list(arrays), timestamps, first_index=first_index, **fields)
+
+    @classmethod
+    def load(cls, path: str) -> 'MarketHistory':
+        data = np.load(path)
+        return cls(
+            data['symbols'].tolist(), data['timestamps'], first_index=data['first_index'],
+            **{field: data[field] for field in cls.FIELDS}
+        )
+
+    def save(self, path: str):
+        np.savez(
+            path, symbols=np.array(self.symbols), timestamps=self.timestamps, first_index=self.first_index,
+            **{field: getattr(self, field) for field in self.FIELDS}
+        )
+
+    def klines(self, s: int, stop: Optional[int] = None) -> np.ndarray:
+        """1通貨の5分足を KLINE_DTYPE で取り出す（stop 本目の手前まで）"""
+        out = np.empty(len(self.timestamps[:stop]), dtype=KLINE_DTYPE)
+        out['timestamp'] = self.timestamps[:stop]
+        for field in self.FIELDS:
+            out[field] = getattr(self, field)[s, :stop]
+        return out
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+def fetch_history(bybit, symbol: str, days: int, interval: str = BASE_INTERVAL,
+                  end_ms: Optional[int] = None) -> np.ndarray:
+    """BybitService 経由で過去 days 日分のローソク足を新しい方から1000本ずつ取得"""
+    end_ms = end_ms or int(time.time() * 1000)
+    start_ms = end_ms - days * INTERVAL_MS['D']
+    rows = []
+    while end_ms > start_ms:
+        response = bybit.request(
+            "market", "get_kline", category="linear", symbol=symbol, interval=interval, end=end_ms, limit=1000
+        )
+        if response["retCode"] != 0:
+            raise RuntimeError(f"{symbol}: {response.get('retMsg', 'Unknown error')}")
+        page = response["result"]["list"]  # 新しい順
+        rows.extend((int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5])) for k in page)
+        if len(page) < 1000:
+            break
+        end_ms = int(page[-1][0]) - 1
+
+    klines = to_kline_array(rows)
+    _, unique = np.unique(klines['timestamp'], return_index=True)
+    klines = klines[unique]
+    return klines[klines['timestamp'] >= start_ms]
+
+def _bucket_index(timestamps: np.ndarray, interval: str) -> Tuple[np.ndarray, np.ndarray]:
+    """各5分足が属する上位足の番号と、上位足ごとの最後の5分足の位置"""
+    buckets = timestamps // INTERVAL_MS[interval]
+    new = np.r_[True, buckets[1:] != buckets[:-1]]
+    ends = np.r_[np.flatnonzero(new)[1:], len(timestamps)] - 1
+    return np.cumsum(new) - 1, ends
+
+def _trend_series(close: np.ndarray, timestamps: np.ndarray, interval: str,
+                  short_period: int = 20, long_period: int = 50, lookback: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    各バー時点の上位足トレンド判定（_analyze_timeframe と同じ規則）
+    形成中の足は現在の終値、lookback 本前は確定足のEMAを使う
+    """
+    bucket, ends = _bucket_index(timestamps, interval)
+    closes = close[:, ends]
+    prev_bucket = np.maximum(bucket - 1, 0)
+    past_bucket = np.maximum(bucket - (lookback - 1), 0)
+
+    now, past = [], []
+    for period in (short_period, long_period):
+        ema = indicators.ema(closes, period)
+        alpha = 2 / (period + 1)
+        # 形成中の足のEMA（最初の足ではEMA = 終値）
+        now.append(np.where(bucket > 0, (1 - alpha) * ema[:, prev_bucket] + alpha * close, close))
+        past.append(ema[:, past_bucket])
+    return classify_cross(now[0], now[1], past[0], past[1])
+
+def _top_distinct(values: np.ndarray, n: int, descending: bool) -> np.ndarray:
+    """最後の軸ごとに重複を除いた上位n個（NaNは無視、不足分はNaN）"""
+    v = np.sort(-values if descending else values, axis=-1)
+    duplicate = np.zeros(v.shape, dtype=bool)
+    duplicate[..., 1:] = v[..., 1:] == v[..., :-1]
+    v[duplicate] = np.nan
+    v = np.sort(v, axis=-1)[..., :n]
+    return -v if descending else v
+
+# トレンド強度コード → 強度（classify_cross の 0.3 / 0.5 / 0.8）
+STRENGTH_VALUES = np.array([0.3, 0.5, 0.8])
+
+class FeatureSeries:
+    """全通貨・全バーの採点用の指標（スコアの重みや閾値に依存しない部分）
+
+    時間足ごとのトレンドと強度はコード（int8）で保持する。
+    to_arrays() / from_arrays() で名前付きの配列に展開でき、プロセス間で共有できる。
+    """
+
+    def __init__(self, timeframes: List[str], trend: Dict[str, np.ndarray], strength: Dict[str, np.ndarray],
+                 rsi: np.ndarray, volume_ratio: np.ndarray, high_volume: np.ndarray, rising: np.ndarray,
+                 support_gap: np.ndarray, resistance_gap: np.ndarray, atr: np.ndarray, btc_down: np.ndarray,
+                 btc_index: int, session: np.ndarray, risk_adjustment: np.ndarray, ready: np.ndarray):
+        self.timeframes = list(timeframes)
+        self.trend = trend
+        self.strength = strength  # STRENGTH_VALUES のインデックス
+        self.rsi = rsi
+        self.volume_ratio = volume_ratio
+        self.high_volume = high_volume  # 24h出来高が日足平均の1.5倍超
+        self.rising = rising  # 24h変化率がプラス
+        self.support_gap = support_gap  # 最寄りサポートまでの距離 / 価格（なければinf）
+        self.resistance_gap = resistance_gap
+        self.atr = atr
+        self.btc_down = btc_down  # (本数,) BTCの24h変化率が-2%以下
+        self.btc_index = btc_index  # BTCUSDT の行（なければ-1）
+        self.session = session  # (本数,) タイムゾーン戦略の信頼度倍率
+        self.risk_adjustment = risk_adjustment  # (通貨数,)
+        self.ready = ready  # 上場後 DAILY_WINDOW 日以降のバー
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {
+            name: value for name, value in vars(self).items()
+            if isinstance(value, np.ndarray)
+        }
+        for tf in self.timeframes:
+            arrays[f'trend_{tf}'] = self.trend[tf]
+            arrays[f'strength_{tf}'] = self.strength[tf]
+        arrays['timeframes'] = np.array(self.timeframes)
+        arrays['btc_index'] = np.array(self.btc_index)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'FeatureSeries':
+        timeframes = [str(tf) for tf in arrays['timeframes']]
+        fields = {
+            name: value for name, value in arrays.items()
+            if name != 'timeframes' and not name.startswith(('trend_', 'strength_'))
+        }
+        fields['btc_index'] = int(fields['btc_index'])
+        return cls(
+            timeframes,
+            {tf: arrays[f'trend_{tf}'] for tf in timeframes},
+            {tf: arrays[f'strength_{tf}'] for tf in timeframes},
+            **fields
+        )
+
+class FeatureCache:
+    """(通貨, 時間足, 期間) をキーにした指標系列のキャッシュ
+
+    期間は履歴の (最初, 最後) のタイムスタンプ。指標は因果的（各バーはそれ以前の足だけを使う）なので、
+    同じ履歴から切り出すウォークフォワードの学習・検証の窓はすべて同じ系列を共有できる。
+    日足由来の指標（ATR・RSI・出来高比・サポレジ）は時間足 'D' として保存する。
+    directory を指定すると npz で永続化し、次回の実行でも再利用する（同じ通貨・期間の足が同一である前提）。
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self._entries: Dict[Tuple[str, str, Tuple[int, int]], Dict[str, np.ndarray]] = {}
+        self.stats = HitStats()  # 時間足ごとのヒット・ミス回数
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, symbol: str, timeframe: str, window: Tuple[int, int]) -> str:
+        return os.path.join(self.directory, f"{symbol}_{timeframe}_{window[0]}_{window[1]}.npz")
+
+    def get(self, symbol: str, timeframe: str, window: Tuple[int, int]) -> Optional[Dict[str, np.ndarray]]:
+        key = (symbol, timeframe, window)
+        value = self._entries.get(key)
+        if value is None and self.directory and os.path.exists(self._path(*key)):
+            with np.load(self._path(*key)) as data:
+                value = self._entries[key] = {name: data[name] for name in data.files}
+        self.stats.record(timeframe, value is not None)
+        return value
+
+    def put(self, symbol: str, timeframe: str, window: Tuple[int, int], value: Dict[str, np.ndarray]):
+        self._entries[(symbol, timeframe, window)] = value
+        if self.directory:
+            np.savez(self._path(symbol, timeframe, window), **value)
+
+    def hit_rate(self) -> float:
+        return self.stats.hit_rate()
+
+    def summary(self) -> str:
+        return self.stats.summary()
+
+def _cached_rows(cache: Optional[FeatureCache], history: MarketHistory, timeframe: str, compute) -> Dict[str, np.ndarray]:
+    """
+    通貨ごとの指標系列をキャッシュから集め、足りない通貨の行だけ compute(行番号) で計算
+    戻り値: 指標名 → (通貨数 × 本数) 行列
+    """
+    window = (int(history.timestamps[0]), int(history.timestamps[-1]))
+    entries = [cache.get(symbol, timeframe, window) if cache else None for symbol in history.symbols]
+    missing = np.array([i for i, entry in enumerate(entries) if entry is None], dtype=np.int64)
+    if len(missing):
+        computed = compute(missing)
+        for j, i in enumerate(missing):
+            entries[i] = {name: values[j] for name, values in computed.items()}
+            if cache:
+                cache.put(history.symbols[i], timeframe, window, entries[i])
+        if len(missing) == len(entries):
+            return computed
+    return {name: np.stack([entry[name] for entry in entries]) for name in entries[0]}
+
+def _timeframe_features(history: MarketHistory, rows: np.ndarray, timeframe: str) -> Dict[str, np.ndarray]:
+    """上位足のトレンドコードと強度コード"""
+    codes, values = _trend_series(history.close[rows], history.timestamps, timeframe)
+    return {
+        'trend': codes.astype(np.int8),
+        'strength': (values >= 0.5).astype(np.int8) + (values >= 0.8),
+    }
+
+def _daily_features(history: MarketHistory, rows: np.ndarray) -> Dict[str, np.ndarray]:
+    """日足（前日までの確定足）とティッカー相当の24h値から求める指標"""
+    close, timestamps = history.close[rows], history.timestamps
+    n_bars = close.shape[1]
+
+    # 日足（前日までの確定足）のATR・RSI・平均出来高・サポレジ
+    day, day_ends = _bucket_index(timestamps, 'D')
+    day_starts = np.r_[0, day_ends[:-1] + 1]
+    daily = {
+        'high': np.maximum.reduceat(history.high[rows], day_starts, axis=1),
+        'low': np.minimum.reduceat(history.low[rows], day_starts, axis=1),
+        'close': close[:, day_ends],
+        'volume': np.add.reduceat(history.volume[rows], day_starts, axis=1),
+    }
+    window = day - DAILY_WINDOW  # バーの日の前日までの窓
+    ready = (window >= 0)[None, :] & (
+        np.arange(n_bars)[None, :] >= history.first_index[rows, None] + DAILY_WINDOW * BARS_PER_DAY
+    )
+    if len(day_ends) > DAILY_WINDOW:
+        window = np.clip(window, 0, None)
+        w = {field: sliding_window_view(values, DAILY_WINDOW, axis=1) for field, values in daily.items()}
+        atr = indicators.atr(w['high'], w['low'], w['close'], 14)[:, window]
+        rsi = np.atleast_2d(indicators.rsi(w['close'][..., -14:], 14))[:, window]
+        avg_volume = w['volume'][..., -20:].mean(axis=-1)[:, window]
+        resistance_mask, support_mask = indicators.pivot_masks(w['high'], w['low'], 2)
+        supports = _top_distinct(np.where(support_mask, w['low'], np.nan), 3, descending=True)[:, window]
+        resistances = _top_distinct(np.where(resistance_mask, w['high'], np.nan), 3, descending=False)[:, window]
+    else:
+        atr, rsi, avg_volume = np.zeros(close.shape), np.full(close.shape, 50.0), np.zeros(close.shape)
+        supports = resistances = np.full(close.shape + (0,), np.nan)
+
+    # ティッカー相当の24h出来高・変化率
+    cumulative = np.cumsum(history.volume[rows], axis=1)
+    volume_24h = cumulative.copy()
+    volume_24h[:, BARS_PER_DAY:] -= cumulative[:, :-BARS_PER_DAY]
+    del cumulative
+    change_24h = close / close[:, np.maximum(np.arange(n_bars) - BARS_PER_DAY, 0)] - 1
+    high_volume = volume_24h > avg_volume * 1.5
+    volume_ratio = np.where(avg_volume > 0, volume_24h / np.where(avg_volume > 0, avg_volume, 1), 1.0)
+    del volume_24h, avg_volume
+
+    # サポート/レジスタンス（上位3レベルのうち最も近いもの）までの距離
+    gaps = []
+    for levels in (supports, resistances):
+        distance = np.full(close.shape, np.inf)
+        for j in range(levels.shape[-1]):
+            np.fmin(distance, np.abs(levels[..., j] - close), out=distance)
+        gaps.append(distance / close)
+    del supports, resistances, distance
+
+    return {
+        'atr': atr, 'rsi': rsi, 'volume_ratio': volume_ratio, 'high_volume': high_volume,
+        'change_24h': change_24h, 'support_gap': gaps[0], 'resistance_gap': gaps[1], 'ready': ready,
+    }
+
+def compute_features(history: MarketHistory, trader, cache: Optional[FeatureCache] = None) -> FeatureSeries:
+    """
+    全通貨・全バーの採点用の指標を一括計算
+    EMAは履歴の先頭から連続して計算する（ストリーミング指標モードと同じ）。
+    日足の指標は前日までの確定足 DAILY_WINDOW 本から計算する。
+    cache を渡すと (通貨, 時間足, 期間) ごとに計算済みの系列を再利用する。
+    """
+    n_bars = len(history)
+
+    # 1. マルチタイムフレームのトレンド
+    trend, strength = {}, {}
+    for tf in trader.TIMEFRAMES:
+        series = _cached_rows(cache, history, tf, lambda rows: _timeframe_features(history, rows, tf))
+        trend[tf], strength[tf] = series['trend'], series['strength']
+
+    # 2. 日足のATR・RSI・平均出来高・サポレジと24h出来高・変化率
+    daily = _cached_rows(cache, history, 'D', lambda rows: _daily_features(history, rows))
+
+    # 3. 通貨・時刻ごとの調整要素
+    risk_adjustment = np.array([trader._calculate_risk_adjustment(symbol, 'LONG') for symbol in history.symbols])
+    btc_index = history.symbols.index('BTCUSDT') if 'BTCUSDT' in history.symbols else -1
+    btc_down = daily['change_24h'][btc_index] < -0.02 if btc_index >= 0 else np.zeros(n_bars, dtype=bool)
+    # タイムゾーン戦略（UTCの1時間ごとに1回だけ判定）
+    hours, hour_index = np.unique(history.timestamps // 3_600_000, return_inverse=True)
+    multipliers = np.array([
+        trader._get_timezone_adjustment(datetime.fromtimestamp(int(hour) * 3600, tz=pytz.UTC))['confidence_multiplier']
+        for hour in hours
+    ])
+
+    return FeatureSeries(
+        list(trader.TIMEFRAMES), trend, strength, daily['rsi'], daily['volume_ratio'], daily['high_volume'],
+        daily['change_24h'] > 0, daily['support_gap'], daily['resistance_gap'], daily['atr'], btc_down, btc_index,
+        multipliers[hour_index], risk_adjustment, daily['ready']
+    )
+
+def score_genius(features: FeatureSeries, trader) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    _evaluate_market_data と同じ配点で採点
+    戻り値: (ロングスコア, ショートスコア, 調整後の信頼度（上限なし）)
+    """
+    shape = features.rsi.shape
+    long_score = np.zeros(shape)
+    short_score = np.zeros(shape)
+
+    # タイムフレーム分析
+    for tf in features.timeframes:
+        trend = features.trend[tf]
+        strength = STRENGTH_VALUES[features.strength[tf]]
+        weight = trader.TIMEFRAME_WEIGHTS.get(tf, 0.1)
+        long_score += np.where(trend == BULLISH, strength * weight, 0.0)
+        short_score += np.where(trend == BEARISH, strength * weight, 0.0)
+        del strength
+
+    # ボリューム分析
+    long_score += np.where(features.high_volume & features.rising, 0.1, 0.0)
+    short_score += np.where(features.high_volume & ~features.rising, 0.1, 0.0)
+
+    # サポート/レジスタンス（2%以内）
+    long_score += np.where(features.support_gap < 0.02, 0.15, 0.0)
+    short_score += np.where(features.resistance_gap < 0.02, 0.15, 0.0)
+
+    # RSI
+    long_score += np.where(features.rsi < 30, 0.1, 0.0)
+    short_score += np.where(features.rsi > 70, 0.1, 0.0)
+
+    # 最終判定と調整（リスク調整 → BTC相関フィルター → タイムゾーン）
+    confidence = np.maximum(long_score, short_score)
+    confidence *= features.risk_adjustment[:, None]
+    confidence *= np.where(_btc_filtered(features, long_score > short_score), 0.7, 1.0)
+    confidence *= features.session[None, :]
+    return long_score, short_score, confidence
+
+def score_improved(features: FeatureSeries, calculator) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    ImprovedConfidenceCalculator.calculate_improved_confidence と同じ配点で採点
+    戻り値: (ロングスコア, ショートスコア, スムージング後の信頼度（上限0.90の適用前）)
+    """
+    shape = features.rsi.shape
+    long_score = np.full(shape, calculator.base_confidence)
+    short_score = np.full(shape, calculator.base_confidence)
+
+    # MTF分析（強度を寛容に調整）
+    for tf in features.timeframes:
+        trend = features.trend[tf]
+        strength = STRENGTH_VALUES[features.strength[tf]]
+        adjusted = np.where(strength >= 0.8, 1.0, np.where(strength >= 0.5, 0.7 + (strength - 0.5) * 0.6, strength * 1.3))
+        weight = calculator.mtf_weights.get(tf, 0.05)
+        long_score += np.where(trend == BULLISH, adjusted * weight, 0.0)
+        short_score += np.where(trend == BEARISH, adjusted * weight, 0.0)
+        del strength, adjusted
+
+    # ボリューム（その時点で優勢な方向に加算）
+    ratio = features.volume_ratio
+    volume_score = np.select([ratio > 2.0, ratio > 1.5, ratio > 1.2, ratio > 1.0], [1.0, 0.8, 0.5, 0.3], 0.0)
+    volume_bonus = np.where(volume_score > 0, volume_score * calculator.volume_weight, 0.0)
+    leading = long_score > short_score
+    long_score += np.where(leading, volume_bonus, 0.0)
+    short_score += np.where(leading, 0.0, volume_bonus)
+    del volume_score, volume_bonus, leading
+
+    # サポート/レジスタンス（2%以内で近いほど高得点）
+    for gap, score in ((features.support_gap, long_score), (features.resistance_gap, short_score)):
+        score += np.where(gap < 0.02, (0.02 - np.where(gap < 0.02, gap, 0.0)) / 0.02 * calculator.sr_weight, 0.0)
+
+    # RSI
+    rsi = features.rsi
+    rsi_score = np.select(
+        [rsi < 20, rsi < 30, rsi < 40, rsi > 80, rsi > 70, rsi > 60],
+        [-1.0, -0.7, -0.3, 1.0, 0.7, 0.3], 0.0
+    )
+    rsi_bonus = np.where(rsi_score != 0, np.abs(rsi_score) * calculator.rsi_weight, 0.0)
+    long_score += np.where(rsi < 50, rsi_bonus, 0.0)
+    short_score += np.where(rsi < 50, 0.0, rsi_bonus)
+    del rsi_score, rsi_bonus
+
+    # 調整（BTC相関とタイムゾーンの平均）とスムージング
+    confidence = np.maximum(long_score, short_score)
+    btc_adjustment = np.where(_btc_filtered(features, long_score > short_score), 0.8, 1.0)
+    confidence *= (btc_adjustment + features.session[None, :]) / 2
+    confidence = np.where(
+        confidence < 0.25, 0.25 + confidence * 0.3,
+        np.where(confidence > 0.85, 0.85 + (confidence - 0.85) * 0.5, confidence)
+    )
+    return long_score, short_score, confidence
+
+def _btc_filtered(features: FeatureSeries, is_long: np.ndarray) -> np.ndarray:
+    """BTC下降時のBTC以外のLONG"""
+    if features.btc_index < 0:
+        return np.zeros(is_long.shape, dtype=bool)
+    not_btc = np.arange(is_long.shape[0]) != features.btc_index
+    return not_btc[:, None] & features.btc_down[None, :] & is_long
+
+# 採点モデル → (採点関数, 信頼度の上限)
+SCORING_MODELS = {
+    'genius': (score_genius, 0.85),
+    'improved': (score_improved, 0.90),
+}
+
+class SignalSeries:
+    """全通貨・全バーの分析結果（_evaluate_market_data の数値部分を行列で保持）"""
+
+    def __init__(self, history: MarketHistory, long_score: np.ndarray, short_score: np.ndarray,
+                 confidence: np.ndarray, atr: np.ndarray, volume_ratio: np.ndarray,
+                 risk_adjustment: np.ndarray, ready: np.ndarray, cap: float = 0.85):
+        self.history = history
+        self.long_score = long_score
+        self.short_score = short_score
+        self.confidence = confidence  # 上限なし（_evaluate_market_data の raw_confidence）
+        self.atr = atr
+        self.volume_ratio = volume_ratio
+        self.risk_adjustment = risk_adjustment
+        self.ready = ready  # 上場後 DAILY_WINDOW 日以降のバー
+        self.cap = cap  # 表示・閾値判定に使う信頼度の上限
+
+    def result(self, trader, s: int, t: int) -> Dict:
+        """1通貨・1バーの分析結果を analyze_genius と同じ形式で返す（理由の文字列は含まない）"""
+        price = float(self.history.close[s, t])
+        long_score = float(self.long_score[s, t])
+        short_score = float(self.short_score[s, t])
+        confidence = float(self.confidence[s, t])
+        atr = float(self.atr[s, t])
+        risk_adjustment = float(self.risk_adjustment[s])
+        return {
+            'symbol': self.history.symbols[s],
+            'price': price,
+            'confidence': min(confidence, self.cap),
+            'raw_confidence': confidence,
+            'direction': 'LONG' if long_score > short_score else 'SHORT',
+            'volume_ratio': float(self.volume_ratio[s, t]),
+            'position_size': trader._calculate_position_size(confidence, risk_adjustment),
+            'atr': atr,
+            'market_conditions': {
+                'trend_strength': max(long_score, short_score),
+                'volatility': 'high' if atr and atr / price > 0.03 else 'normal',
+                'volume_ratio': float(self.volume_ratio[s, t]),
+                'nearest_support': None,
+                'nearest_resistance': None
+            }
+        }
+
+def compute_signals(history: MarketHistory, trader, features: Optional[FeatureSeries] = None,
+                    model: str = 'genius', calculator=None) -> SignalSeries:
+    """
+    全通貨・全バーの信頼度を一括計算
+    model='genius' は _evaluate_market_data、'improved' は ImprovedConfidenceCalculator の配点
+    （calculator 省略時は既定の重み）。features を渡すと指標の計算を省略する。
+    """
+    if features is None:
+        features = compute_features(history, trader)
+    score, cap = SCORING_MODELS[model]
+    if model == 'improved' and calculator is None:
+        from confidence_improvement_v2 import ImprovedConfidenceCalculator
+        calculator = ImprovedConfidenceCalculator()
+    long_score, short_score, confidence = score(features, trader if model == 'genius' else calculator)
+    return SignalSeries(
+        history, long_score, short_score, confidence, features.atr, features.volume_ratio,
+        features.risk_adjustment, features.ready, cap
+    )
+
+class BacktestResult:
+    """バックテストの約定履歴と成績"""
+
+    def __init__(self, history: MarketHistory, trades: np.ndarray, timings: Optional[Dict[str, float]] = None):
+        self.history = history
+        self.trades = trades
+        self.timings = timings or {}
+
+    @property
+    def pnl(self) -> np.ndarray:
+        """各取引の口座残高に対する損益率（決済順）"""
+        ordered = self.trades[np.argsort(self.trades['exit_index'], kind='stable')]
+        return ordered['position_size'] * ordered['return']
+
+    def equity_curve(self) -> np.ndarray:
+        """決済ごとの残高（初期残高1、複利）"""
+        return np.cumprod(1 + self.pnl)
+
+    @property
+    def stats(self) -> Dict:
+        trades = self.trades
+        if len(trades) == 0:
+            return {'trades': 0}
+        returns = trades['return']
+        equity = np.r_[1.0, self.equity_curve()]
+        drawdown = 1 - equity / np.maximum.accumulate(equity)
+        losses = -returns[returns < 0].sum()
+        return {
+            'trades': len(trades),
+            'win_rate': float((returns > 0).mean()),
+            'avg_return': float(returns.mean()),
+            'total_return': float(equity[-1] - 1),
+            'max_drawdown': float(drawdown.max()),
+            'profit_factor': float(returns[returns > 0].sum() / losses) if losses > 0 else float('inf'),
+            'avg_bars_held': float((trades['exit_index'] - trades['entry_index']).mean()),
+            'long_ratio': float((trades['direction'] > 0).mean()),
+            'exits': {reason: int((trades['reason'] == code).sum()) for code, reason in enumerate(EXIT_REASONS)},
+        }
+
+    def summary(self) -> str:
+        stats = self.stats
+        if not stats['trades']:
+            return "取引なし"
+        return (
+            f"取引 {stats['trades']}回, 勝率 {stats['win_rate']:.1%}, 平均 {stats['avg_return']:+.2%}, "
+            f"累計 {stats['total_return']:+.1%}, 最大DD {stats['max_drawdown']:.1%}, "
+            f"PF {stats['profit_factor']:.2f}, 平均保有 {stats['avg_bars_held'] * BAR_MS / 60000:.0f}分"
+        )
+
+def simulate_trades(signals: SignalSeries, trader, max_hold_bars: int = BARS_PER_DAY,
+                    fee_rate: float = 0.00055, max_positions: Optional[int] = None,
+                    thresholds: Optional[Dict[str, float]] = None, exits: str = 'bracket',
+                    start: int = 0, end: Optional[int] = None,
+                    plan_cache: Optional[Dict[Tuple[int, int], Dict]] = None) -> np.ndarray:
+    """
+    閾値を超えたバーの終値でエントリーし、max_hold_bars 本経過で残りを決済する。
+    exits='bracket': 決済プランの最初の利確か最終損切り（取引所に出す注文と同じ）で全決済。
+      同一バーで利確と損切りの両方に届いた場合は損切りを優先する。
+    exits='matrix': 決済プラン全体（段階的利確・損切り・トレーリング）を exit_replay でリプレイ。
+      決済価格は平均決済価格、決済バーはトレーリングで全決済したバー。
+    SHORTは利確・損切り（matrix では価格パス）をエントリー価格で反転させる。
+    通貨ごとに同時1ポジション、全体で max_positions（省略時は trader.max_positions）まで。
+    thresholds 省略時は trader.THRESHOLDS を使う。
+    start / end を指定するとその区間のバーだけでエントリーし、end の手前で残りを決済する（ウォークフォワード用）。
+    plan_cache を渡すと (通貨, バー) ごとの分析結果と決済プランを再利用する
+    （同じ signals・同じ設定の trader で繰り返し呼ぶ場合のみ）。
+    """
+    if exits not in ('bracket', 'matrix'):
+        raise ValueError(f"exits must be 'bracket' or 'matrix': {exits}")
+    history = signals.history
+    max_positions = max_positions or trader.max_positions
+    n_bars = len(history) if end is None else min(end, len(history))
+    thresholds = thresholds or trader.THRESHOLDS
+    thresholds = np.array([thresholds.get(symbol, thresholds['default']) for symbol in history.symbols])
+    window = slice(start, n_bars)
+    candidates = signals.ready[:, window] & (np.minimum(signals.confidence[:, window], signals.cap) >= thresholds[:, None])
+    # next_bar[s, i]: 区間の i 本目以降で最初の候補バー（なければ n_bars）
+    n_symbols, width = candidates.shape
+    next_bar = np.where(candidates, start + np.arange(width), n_bars)
+    next_bar = np.minimum.accumulate(np.c_[next_bar, np.full(n_symbols, n_bars)][:, ::-1], axis=1)[:, ::-1]
+    rows = np.arange(n_symbols)
+
+    # 通貨ごとの次の候補のうち最も早いバー（同時刻は信頼度順）から処理する。
+    # 満枠なら最初の決済バーまで時刻を進める
+    ready_from = np.full(n_symbols, start)  # 通貨ごとの次にエントリーできるバー
+    now = start
+    open_exits: List[int] = []
+    trades = []
+    while True:
+        bars = next_bar[rows, np.maximum(ready_from, now) - start]
+        t = int(bars.min())
+        if t >= n_bars:
+            break
+        tied = np.flatnonzero(bars == t)
+        s = int(tied[np.argmax(signals.confidence[tied, t])]) if len(tied) > 1 else int(tied[0])
+        now = t
+        while open_exits and open_exits[0] <= t:
+            heapq.heappop(open_exits)
+        if len(open_exits) >= max_positions:
+            now = open_exits[0]
+            continue
+
+        result = plan_cache.get((s, t)) if plan_cache is not None else None
+        if result is None:
+            result = trader.plan_exits(signals.result(trader, s, t))
+            if plan_cache is not None:
+                plan_cache[(s, t)] = result
+        entry = result['price']
+        direction = 1 if result['direction'] == 'LONG' else -1
+        if exits == 'matrix':
+            exit_index, exit_return, reason = _replay_exit(
+                history, s, t, direction, result['exit_plan'], max_hold_bars, n_bars
+            )
+            trades.append((
+                s, t, exit_index, direction, entry, entry * (1 + direction * exit_return), result['confidence'],
+                result['position_size'], exit_return - 2 * fee_rate, reason
+            ))
+            heapq.heappush(open_exits, exit_index)
+            ready_from[s] = exit_index + 1
+            continue
+
+        take_profit = float(result['exit_plan'].tp_prices[0])
+        stop_loss = float(result['exit_plan'].sl_prices[-1])
+        if direction < 0:
+            take_profit, stop_loss = 2 * entry - take_profit, 2 * entry - stop_loss
+
+        stop = min(t + 1 + max_hold_bars, n_bars)
+        highs, lows = history.high[s, t + 1:stop], history.low[s, t + 1:stop]
+        hit_tp = highs >= take_profit if direction > 0 else lows <= take_profit
+        hit_sl = lows <= stop_loss if direction > 0 else highs >= stop_loss
+        first_tp = int(hit_tp.argmax()) if hit_tp.any() else len(hit_tp)
+        first_sl = int(hit_sl.argmax()) if hit_sl.any() else len(hit_sl)
+        if first_sl < len(hit_sl) and first_sl <= first_tp:
+            exit_index, exit_price, reason = t + 1 + first_sl, stop_loss, EXIT_SL
+        elif first_tp < len(hit_tp):
+            exit_index, exit_price, reason = t + 1 + first_tp, take_profit, EXIT_TP
+        else:
+            exit_index = stop - 1
+            exit_price = float(history.close[s, exit_index])
+            reason = EXIT_TIME if stop - 1 - t == max_hold_bars else EXIT_END
+
+        trades.append((
+            s, t, exit_index, direction, entry, exit_price, result['confidence'], result['position_size'],
+            direction * (exit_price / entry - 1) - 2 * fee_rate, reason
+        ))
+        heapq.heappush(open_exits, exit_index)
+        ready_from[s] = exit_index + 1
+
+    return np.array(trades, dtype=TRADE_DTYPE)
+
+def _replay_exit(history: MarketHistory, s: int, t: int, direction: int, plan, max_hold_bars: int,
+                 n_bars: int) -> Tuple[int, float, int]:
+    """1ポジションの決済プランをエントリー後の足でリプレイ（戻り値: 決済バー、リターン、決済理由）"""
+    stop = min(t + 1 + max_hold_bars, n_bars)
+    if stop <= t + 1:
+        return t, 0.0, EXIT_END
+    path = bar_ticks(*(getattr(history, field)[s, t + 1:stop] for field in ('open', 'high', 'low', 'close')))[None, :]
+    if direction < 0:
+        path = 2 * plan.entry_price - path
+    outcome = replay([plan], path)
+    if outcome.closed[0]:
+        return t + 1 + int(outcome.exit_step[0]) // 4, float(outcome.pnl[0]), EXIT_TRAIL
+    return stop - 1, float(outcome.pnl[0]), EXIT_TIME if stop - 1 - t == max_hold_bars else EXIT_END
+
+def run_backtest(klines_by_symbol, trader=None, model: str = 'genius', calculator=None,
+                 **simulation_kwargs) -> BacktestResult:
+    """5分足（通貨ごとの辞書 または MarketHistory）からバックテストを実行"""
+    if trader is None:
+        from genius_multi_trading_v2_with_trading import GeniusMultiTrader
+        trader = GeniusMultiTrader(None)
+
+    timings = {}
+    started = time.perf_counter()
+    history = klines_by_symbol if isinstance(klines_by_symbol, MarketHistory) else MarketHistory.from_klines(klines_by_symbol)
+    timings['align'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    signals = compute_signals(history, trader, model=model, calculator=calculator)
+    timings['signals'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    trades = simulate_trades(signals, trader, **simulation_kwargs)
+    timings['trades'] = time.perf_counter() - started
+
+    logger.info(
+        f"📊 Backtest: {len(history.symbols)} symbols × {len(history):,} bars "
+        f"(signals {timings['signals']:.1f}s, trades {timings['trades']:.1f}s)"
+    )
+    return BacktestResult(history, trades, timings)
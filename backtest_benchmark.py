@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+バックテストの整合性チェックとベンチマーク
+合成した5分足で、ベクトル化した信頼度が _evaluate_market_data（1バーずつの分析）と一致するかを確認し、
+通貨数 × 期間ごとの実行時間を計測
+"""
+
+import sys
+import time
+import logging
+from datetime import datetime
+import numpy as np
+import pytz
+
+from backtest import BARS_PER_DAY, DAILY_WINDOW, MarketHistory, compute_signals, run_backtest
+from services.kline_cache import KLINE_DTYPE, INTERVAL_MS
+from services.kline_resampler import resample_klines
+from genius_multi_trading_v2_with_trading import GeniusMultiTrader
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MAJOR_SYMBOLS = ['BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'XRPUSDT', 'DOGEUSDT']
+
+def synthetic_klines(n_symbols: int, days: int, seed: int = 42) -> dict:
+    """トレンド局面が切り替わる幾何ブラウン運動の5分足（2024-01-01 UTC開始）"""
+    rng = np.random.default_rng(seed)
+    n_bars = days * BARS_PER_DAY
+    start = int(datetime(2024, 1, 1, tzinfo=pytz.UTC).timestamp() * 1000)
+    timestamps = start + np.arange(n_bars, dtype=np.int64) * INTERVAL_MS['5']
+    symbols = (MAJOR_SYMBOLS + [f"SYM{i}USDT" for i in range(n_symbols)])[:n_symbols]
+
+    klines = {}
+    for symbol in symbols:
+        volatility = rng.uniform(0.001, 0.004)
+        # 約1日ごとに変わるドリフト
+        regimes = np.repeat(rng.normal(0, volatility / 8, n_bars // BARS_PER_DAY + 1), BARS_PER_DAY)[:n_bars]
+        log_returns = regimes + rng.normal(0, volatility, n_bars)
+        close = rng.uniform(1, 50000) * np.exp(np.cumsum(log_returns))
+        open_ = np.r_[close[0], close[:-1]]
+        wick = np.abs(rng.normal(0, volatility / 2, (2, n_bars))) * close
+
+        rows = np.empty(n_bars, dtype=KLINE_DTYPE)
+        rows['timestamp'] = timestamps
+        rows['open'] = open_
+        rows['high'] = np.maximum(open_, close) + wick[0]
+        rows['low'] = np.minimum(open_, close) - wick[1]
+        rows['close'] = close
+        rows['volume'] = rng.lognormal(10, 0.8, n_bars)
+        klines[symbol] = rows
+    return klines
+
+def check_parity(history: MarketHistory, trader: GeniusMultiTrader, samples: int = 150, seed: int = 0) -> int:
+    """ランダムなバーで _evaluate_market_data と比較（不一致数を返す）"""
+    signals = compute_signals(history, trader)
+    rng = np.random.default_rng(seed)
+    ready = np.argwhere(signals.ready)
+    btc = history.symbols.index('BTCUSDT') if 'BTCUSDT' in history.symbols else None
+    mismatches = 0
+
+    for s, t in ready[rng.choice(len(ready), size=min(samples, len(ready)), replace=False)]:
+        # 分析時点までの全履歴（日足は前日までの確定足）を1バーずつの分析に渡す
+        klines = history.klines(s, t + 1)
+        mtf_klines = {'5': klines}
+        for tf in trader.TIMEFRAMES:
+            if tf != '5':
+                mtf_klines[tf] = resample_klines(klines, '5', tf)
+        daily = resample_klines(klines, '5', 'D')
+        if daily['timestamp'][-1] == history.timestamps[t] // INTERVAL_MS['D'] * INTERVAL_MS['D']:
+            daily = daily[:-1]
+
+        def ticker(i: int) -> dict:
+            past = history.close[i, max(t - BARS_PER_DAY, 0)]
+            return {
+                'lastPrice': history.close[i, t],
+                'volume24h': history.volume[i, max(t - BARS_PER_DAY + 1, 0):t + 1].sum(),
+                'price24hPcnt': history.close[i, t] / past - 1,
+            }
+
+        trader.btc_trend = 'down' if btc is not None and ticker(btc)['price24hPcnt'] < -0.02 else 'neutral'
+        expected = trader._evaluate_market_data(
+            history.symbols[s],
+            {'mtf_klines': mtf_klines, 'ticker': ticker(s), 'klines_daily': daily[-DAILY_WINDOW:]},
+            as_of=datetime.fromtimestamp(history.timestamps[t] / 1000, tz=pytz.UTC)
+        )
+        actual = signals.result(trader, s, t)
+        same = (
+            abs(expected['raw_confidence'] - actual['raw_confidence']) < 1e-9
+            and expected['direction'] == actual['direction']
+            and abs(expected['atr'] - actual['atr']) <= 1e-9 * max(1.0, expected['atr'])
+            and abs(expected['volume_ratio'] - actual['volume_ratio']) <= 1e-9 * max(1.0, expected['volume_ratio'])
+        )
+        if not same:
+            mismatches += 1
+            logger.info(
+                f"  ❌ {history.symbols[s]} bar {t}: {expected['direction']} {expected['raw_confidence']:.6f} "
+                f"vs {actual['direction']} {actual['raw_confidence']:.6f}"
+            )
+    trader.btc_trend = None
+    return mismatches
+
+def main():
+    trader = GeniusMultiTrader(None)
+    failures = 0
+
+    logger.info("=" * 60)
+    logger.info("🔬 バックテスト整合性チェック（5通貨 × 45日）")
+    logger.info("=" * 60)
+    history = MarketHistory.from_klines(synthetic_klines(5, 45))
+    mismatches = check_parity(history, trader)
+    if mismatches:
+        failures += 1
+        logger.info(f"  ❌ {mismatches}件が1バーずつの分析と不一致")
+    else:
+        logger.info("  ✅ 信頼度・方向・ATR・出来高比が1バーずつの分析と一致")
+
+    logger.info("\n" + "=" * 60)
+    logger.info("⏱️  ベンチマーク")
+    logger.info("=" * 60)
+    for n_symbols, days in ((10, 90), (50, 365)):
+        klines = synthetic_klines(n_symbols, days, seed=n_symbols)
+        started = time.perf_counter()
+        result = run_backtest(klines, trader)
+        elapsed = time.perf_counter() - started
+        logger.info(f"  {n_symbols}通貨 × {days}日 ({n_symbols * days * BARS_PER_DAY:,}バー): {elapsed:.1f}秒")
+        logger.info(f"    {result.summary()}")
+        if not len(result.trades):
+            failures += 1
+            logger.info("  ❌ 取引が1件も発生しない")
+
+    if failures:
+        logger.info(f"\n❌ {failures}件のチェックが失敗しました")
+        sys.exit(1)
+    logger.info("\n✅ すべてのテストが完了しました！")
+
+if __name__ == "__main__":
+    main()
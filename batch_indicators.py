@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+複数通貨の一括指標計算
+同じ時間足の全通貨を (通貨数 × 本数) の行列に積み、EMAクロス・ATR・RSI・ピボットを1回のベクトル演算で計算
+"""
+
+import numpy as np
+from typing import Dict, List, Tuple
+
+import indicators
+from services.kline_cache import to_kline_array
+
+# トレンド判定コード
+TREND_NAMES = np.array(['NEUTRAL', 'BULLISH', 'BEARISH'])
+NEUTRAL, BULLISH, BEARISH = 0, 1, 2
+
+def stack_columns(klines_by_symbol: Dict[str, np.ndarray], fields: Tuple[str, ...]) -> List[Tuple[List[str], Dict[str, np.ndarray]]]:
+    """
+    通貨ごとのローソク足を本数ごとにグループ化して行列に積む
+    上場直後などで本数が揃わない通貨は別グループとして計算する
+    戻り値: [(通貨リスト, {フィールド: (通貨数 × 本数) 行列}), ...]
+    """
+    groups: Dict[int, List[Tuple[str, np.ndarray]]] = {}
+    for symbol, klines in klines_by_symbol.items():
+        klines = to_kline_array(klines)
+        if len(klines) > 0:
+            groups.setdefault(len(klines), []).append((symbol, klines))
+
+    stacked = []
+    for members in groups.values():
+        symbols = [symbol for symbol, _ in members]
+        matrices = {field: np.stack([klines[field] for _, klines in members]) for field in fields}
+        stacked.append((symbols, matrices))
+    return stacked
+
+def classify_trend(ema_short: np.ndarray, ema_long: np.ndarray, lookback: int = 5) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    EMAクロスによるトレンド判定（GeniusMultiTrader._analyze_timeframe と同じ規則）
+    戻り値: (トレンドコード, 強度)
+    """
+    return classify_cross(
+        ema_short[..., -1], ema_long[..., -1],
+        ema_short[..., -lookback], ema_long[..., -lookback]
+    )
+
+def classify_cross(now_short: np.ndarray, now_long: np.ndarray,
+                   past_short: np.ndarray, past_long: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    現在と lookback 本前のEMA値からトレンド判定（任意の形状の配列で要素ごとに判定）
+    戻り値: (トレンドコード, 強度)
+    """
+    above = now_short > now_long
+    below = now_short < now_long
+    golden_cross = above & (past_short <= past_long)
+    dead_cross = below & (past_short >= past_long)
+
+    trend = np.select([above, below], [BULLISH, BEARISH], default=NEUTRAL)
+    strength = np.select([golden_cross | dead_cross, above | below], [0.8, 0.5], default=0.3)
+    return trend, strength
+
+def analyze_timeframe_batch(klines_by_symbol: Dict[str, np.ndarray],
+                            short_period: int = 20, long_period: int = 50) -> Dict[str, Dict]:
+    """1つの時間足について全通貨のトレンド判定を一括計算"""
+    signals = {}
+    for symbols, matrices in stack_columns(klines_by_symbol, ('close',)):
+        closes = matrices['close']
+        if closes.shape[1] < 5:
+            continue
+        trend, strength = classify_trend(
+            indicators.ema(closes, short_period),
+            indicators.ema(closes, long_period)
+        )
+        for i, symbol in enumerate(symbols):
+            signals[symbol] = {'trend': str(TREND_NAMES[trend[i]]), 'strength': float(strength[i])}
+    return signals
+
+def daily_metrics_batch(klines_by_symbol: Dict[str, np.ndarray], atr_period: int = 14,
+                        rsi_period: int = 14, volume_window: int = 20) -> Dict[str, Dict]:
+    """
+    日足から全通貨のATR・RSI・サポート/レジスタンス・平均出来高を一括計算
+    """
+    metrics = {}
+    for symbols, m in stack_columns(klines_by_symbol, ('high', 'low', 'close', 'volume')):
+        atr = np.atleast_1d(indicators.atr(m['high'], m['low'], m['close'], atr_period))
+        rsi = np.atleast_1d(indicators.rsi(m['close'][:, -rsi_period:], rsi_period))
+        avg_volume = m['volume'][:, -volume_window:].mean(axis=1)
+        resistance_mask, support_mask = indicators.pivot_masks(m['high'], m['low'], 2)
+
+        for i, symbol in enumerate(symbols):
+            support = m['low'][i][support_mask[i]].tolist()
+            resistance = m['high'][i][resistance_mask[i]].tolist()
+            metrics[symbol] = {
+                'atr': float(atr[i]),
+                'rsi': float(rsi[i]),
+                'avg_volume': float(avg_volume[i]),
+                'sr_levels': {
+                    'support': sorted(set(support), reverse=True)[:3],  # 上位3つ
+                    'resistance': sorted(set(resistance))[:3]  # 下位3つ
+                }
+            }
+    return metrics
+
+def compute_signals_batch(market_data_by_symbol: Dict[str, Dict]) -> Dict[str, Dict]:
+    """
+    全通貨の市場データ（GeniusMultiTrader._fetch_market_data の戻り値）から
+    分析に必要な指標を時間足ごとに一括計算
+    """
+    timeframes = set()
+    for market_data in market_data_by_symbol.values():
+        timeframes.update(market_data['mtf_klines'].keys())
+
+    mtf_by_tf = {
+        tf: analyze_timeframe_batch({
+            symbol: data['mtf_klines'][tf]
+            for symbol, data in market_data_by_symbol.items()
+            if tf in data['mtf_klines']
+        })
+        for tf in timeframes
+    }
+    daily = daily_metrics_batch({
+        symbol: data['klines_daily'] for symbol, data in market_data_by_symbol.items()
+    })
+
+    signals = {}
+    for symbol in market_data_by_symbol:
+        # 時間足の並びは取得順を維持
+        tf_order = market_data_by_symbol[symbol]['mtf_klines'].keys()
+        signals[symbol] = {
+            'mtf_signals': {tf: mtf_by_tf[tf][symbol] for tf in tf_order if symbol in mtf_by_tf[tf]},
+            **daily.get(symbol, {
+                'atr': None, 'rsi': 50, 'avg_volume': float('nan'),
+                'sr_levels': {'support': [], 'resistance': []}
+            })
+        }
+    return signals
@@ -25,7 +25,7 @@ def check_leverage():
     for symbol in symbols:
         try:
             # ポジション情報を取得（レバレッジ含む）
-            response = bybit.client.get_positions(
+            response = bybit.request("position", "get_positions",
                 category="linear",
                 symbol=symbol
             )
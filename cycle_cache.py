@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+スキャンサイクル単位のメモ化
+同じサイクル内で同じ通貨の市場データ取得・分析を繰り返さないためのキャッシュ
+"""
+
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+class HitStats(dict):
+    """種類別のヒット・ミス回数（{種類: {'hits': n, 'misses': n}}）"""
+
+    def record(self, kind: str, hit: bool):
+        counters = self.setdefault(kind, {'hits': 0, 'misses': 0})
+        counters['hits' if hit else 'misses'] += 1
+
+    def hit_rate(self, kind: Optional[str] = None) -> float:
+        """ヒット率（kind省略時は全種類の合計）"""
+        counters = [self[kind]] if kind else list(self.values())
+        hits = sum(c.get('hits', 0) for c in counters)
+        total = hits + sum(c.get('misses', 0) for c in counters)
+        return hits / total if total else 0.0
+
+    def summary(self) -> str:
+        parts = [f"{kind} {c['hits']}/{c['hits'] + c['misses']}" for kind, c in sorted(self.items())]
+        return ", ".join(parts) + f" (hit rate {self.hit_rate():.0%})" if parts else "no lookups"
+
+class CycleCache:
+    """(通貨, サイクルID) をキーにした種類別のキャッシュ
+
+    new_cycle() を呼ぶまでは無効（常にミスとして扱わず、何も保存しない）。
+    サイクルIDが進むと前のサイクルのエントリは破棄される。
+    """
+
+    def __init__(self):
+        self.cycle_id: Optional[int] = None
+        self._entries: Dict[str, Dict[Tuple[str, int], Any]] = {}
+        self._lock = threading.Lock()
+        self.stats = HitStats()
+
+    def new_cycle(self) -> int:
+        """次のサイクルを開始（前サイクルのエントリを破棄）"""
+        with self._lock:
+            self.cycle_id = 1 if self.cycle_id is None else self.cycle_id + 1
+            self._entries.clear()
+            return self.cycle_id
+
+    @property
+    def enabled(self) -> bool:
+        return self.cycle_id is not None
+
+    def get(self, kind: str, symbol: str) -> Optional[Any]:
+        """現サイクルの値（なければNone）"""
+        if self.cycle_id is None:
+            return None
+        with self._lock:
+            value = self._entries.get(kind, {}).get((symbol, self.cycle_id))
+            self.stats.record(kind, value is not None)
+            return value
+
+    def put(self, kind: str, symbol: str, value: Any) -> Any:
+        """現サイクルの値として保存（Noneは保存しない）"""
+        if self.cycle_id is not None and value is not None:
+            with self._lock:
+                self._entries.setdefault(kind, {})[(symbol, self.cycle_id)] = value
+        return value
+
+    def get_or_compute(self, kind: str, symbol: str, compute: Callable[[], Any]) -> Any:
+        """現サイクルの値、なければ compute() の結果を保存して返す（非同期の取得は get / put を使う）"""
+        value = self.get(kind, symbol)
+        if value is None:
+            value = self.put(kind, symbol, compute())
+        return value
+
+    def hit_rate(self, kind: Optional[str] = None) -> float:
+        """ヒット率（kind省略時は全種類の合計）"""
+        with self._lock:
+            return self.stats.hit_rate(kind)
+
+    def summary(self) -> str:
+        with self._lock:
+            return self.stats.summary()
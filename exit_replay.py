@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Dynamic Exit Matrix のリプレイエンジン
+記録済み・合成の価格パスを多数のポジションに流し、PositionManager と同じ規則で
+段階的利確・損切り・トレーリングストップを執行して損益分布・レベル到達率・保有時間を集計
+"""
+
+import time
+import logging
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from genius_dynamic_exit_strategy import DynamicExitMatrix, ExitPlan, PositionManager
+
+logger = logging.getLogger(__name__)
+
+# トレーリングストップが積極モードでコールバックを半分にする利益率（SmartTrailStrategy と同じ）
+AGGRESSIVE_PROFIT = 0.05
+
+class PlanBatch:
+    """複数の ExitPlan をレベル数で揃えた行列
+
+    利確が4段階のプランは5段階目を発動しない価格（inf）・比率0で埋める。
+    決済プランはロング前提の価格配置（利確が上、損切りが下）なので、
+    ショートは価格パスをエントリー価格で反転させて渡す。
+    """
+
+    def __init__(self, entry_price: np.ndarray, tp_prices: np.ndarray, tp_ratios: np.ndarray,
+                 sl_prices: np.ndarray, sl_ratios: np.ndarray, trailing_enabled: np.ndarray,
+                 activation_profit: np.ndarray, callback_rate: np.ndarray, aggressive_mode: np.ndarray):
+        self.entry_price = entry_price
+        self.tp_prices = tp_prices
+        self.tp_ratios = tp_ratios
+        self.sl_prices = sl_prices
+        self.sl_ratios = sl_ratios
+        self.trailing_enabled = trailing_enabled
+        self.activation_profit = activation_profit
+        self.callback_rate = callback_rate
+        self.aggressive_mode = aggressive_mode
+
+    @classmethod
+    def from_plans(cls, plans: Sequence[ExitPlan]) -> 'PlanBatch':
+        n = len(plans)
+        n_tp = max(len(plan.tp_prices) for plan in plans)
+        n_sl = max(len(plan.sl_prices) for plan in plans)
+        tp_prices, tp_ratios = np.full((n, n_tp), np.inf), np.zeros((n, n_tp))
+        sl_prices, sl_ratios = np.full((n, n_sl), -np.inf), np.zeros((n, n_sl))
+        for i, plan in enumerate(plans):
+            tp_prices[i, :len(plan.tp_prices)] = plan.tp_prices
+            tp_ratios[i, :len(plan.tp_ratios)] = plan.tp_ratios
+            sl_prices[i, :len(plan.sl_prices)] = plan.sl_prices
+            sl_ratios[i, :len(plan.sl_ratios)] = plan.sl_ratios
+        trailing = [plan.trailing_config for plan in plans]
+        return cls(
+            np.array([plan.entry_price for plan in plans]), tp_prices, tp_ratios, sl_prices, sl_ratios,
+            np.array([bool(config.get('enabled')) for config in trailing]),
+            np.array([config.get('activation_profit', np.inf) for config in trailing], dtype=np.float64),
+            np.array([config.get('callback_rate', 0.0) for config in trailing], dtype=np.float64),
+            np.array([bool(config.get('aggressive_mode')) for config in trailing]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.entry_price)
+
+    def __getitem__(self, rows) -> 'PlanBatch':
+        return PlanBatch(**{name: value[rows] for name, value in vars(self).items()})
+
+class ReplayResult:
+    """リプレイ結果（損益はポジション1単位あたりのリターン）"""
+
+    def __init__(self, pnl: np.ndarray, exit_step: np.ndarray, closed: np.ndarray,
+                 tp_hits: np.ndarray, sl_hits: np.ndarray, trailing: np.ndarray,
+                 tp_levels: np.ndarray, sl_levels: np.ndarray, elapsed: float = 0.0):
+        self.pnl = pnl
+        self.exit_step = exit_step  # 全決済したステップ（未決済はパスの最後）
+        self.closed = closed
+        self.tp_hits = tp_hits
+        self.sl_hits = sl_hits
+        self.trailing = trailing
+        self.tp_levels = tp_levels  # レベルが存在するか（利確4段階のプランの5段階目はFalse）
+        self.sl_levels = sl_levels
+        self.elapsed = elapsed
+
+    @property
+    def stats(self) -> Dict:
+        def rates(hits, levels):
+            return [float(hits[:, j].sum() / max(levels[:, j].sum(), 1)) for j in range(hits.shape[1])]
+
+        held = self.exit_step + 1
+        return {
+            'positions': len(self.pnl),
+            'mean_pnl': float(self.pnl.mean()),
+            'win_rate': float((self.pnl > 0).mean()),
+            'pnl_percentiles': dict(zip((1, 5, 25, 50, 75, 95, 99), np.percentile(self.pnl, [1, 5, 25, 50, 75, 95, 99]).tolist())),
+            'tp_hit_rates': rates(self.tp_hits, self.tp_levels),
+            'sl_hit_rates': rates(self.sl_hits, self.sl_levels),
+            'trailing_rate': float(self.trailing.mean()),
+            'closed_rate': float(self.closed.mean()),
+            'mean_steps_held': float(held[self.closed].mean()) if self.closed.any() else None,
+            'median_steps_held': float(np.median(held[self.closed])) if self.closed.any() else None,
+        }
+
+    def summary(self) -> str:
+        stats = self.stats
+        p = stats['pnl_percentiles']
+        return (
+            f"{stats['positions']:,}ポジション: 平均 {stats['mean_pnl']:+.2%}, 勝率 {stats['win_rate']:.1%}, "
+            f"P5/P50/P95 {p[5]:+.2%}/{p[50]:+.2%}/{p[95]:+.2%}\n"
+            f"  TP到達率 {' / '.join(f'{r:.0%}' for r in stats['tp_hit_rates'])}, "
+            f"SL到達率 {' / '.join(f'{r:.0%}' for r in stats['sl_hit_rates'])}, "
+            f"トレーリング {stats['trailing_rate']:.0%}, 全決済 {stats['closed_rate']:.0%}"
+            + (f", 平均保有 {stats['mean_steps_held']:.0f}ステップ" if stats['mean_steps_held'] else "")
+        )
+
+def replay(plans, paths: np.ndarray, chunk_size: int = 64) -> ReplayResult:
+    """
+    価格パス (ポジション数 × ステップ数) を一括リプレイ（PositionManager.check_exits と同じ規則）
+    - 利確は価格がレベル以上、損切りは価格がレベル以下になった最初のティックでその時の価格で執行
+    - トレーリングは最高値（初期値はエントリー価格）から計算したストップ以下で全決済
+    - 決済比率は残りの数量に対する比率（_execute_exit_action と同じ）
+    - 同じティックでは利確（レベル順）→損切り（レベル順）→トレーリングの順に執行
+    """
+    started = time.perf_counter()
+    if not isinstance(plans, PlanBatch):
+        plans = PlanBatch.from_plans(plans)
+    paths = np.asarray(paths, dtype=np.float64)
+    results = [
+        _replay_chunk(plans[i:i + chunk_size], paths[i:i + chunk_size])
+        for i in range(0, len(plans), chunk_size)
+    ]
+    merged = {key: np.concatenate([r[key] for r in results]) for key in results[0]}
+    return ReplayResult(
+        tp_levels=np.isfinite(plans.tp_prices), sl_levels=np.isfinite(plans.sl_prices),
+        elapsed=time.perf_counter() - started, **merged
+    )
+
+def replay_shared(plan: ExitPlan, paths: np.ndarray, highest_price: Optional[float] = None,
+                  chunk_size: int = 8192) -> ReplayResult:
+    """
+    1つの決済プランを多数の価格パス（モンテカルロのシナリオなど）に一括リプレイ（規則は replay と同じ）
+    執行済みの利確・損切りレベル（tp_executed / sl_executed）は発動しない。
+    highest_price はトレーリングの最高値の初期値（省略時はエントリー価格）。
+    内部では時間が先頭の配列で計算するので、(ステップ数 × パス数) の配列の転置（.T）を渡すとコピーが要らない。
+    """
+    started = time.perf_counter()
+    batch = PlanBatch.from_plans([plan])
+    batch.tp_prices[0, :len(plan.tp_executed)][plan.tp_executed] = np.inf
+    batch.tp_ratios[0, :len(plan.tp_executed)][plan.tp_executed] = 0.0
+    batch.sl_prices[0, :len(plan.sl_executed)][plan.sl_executed] = -np.inf
+    batch.sl_ratios[0, :len(plan.sl_executed)][plan.sl_executed] = 0.0
+    highest = max(plan.entry_price, highest_price or plan.entry_price)
+    results = []
+    for i in range(0, len(paths), chunk_size):
+        series = np.ascontiguousarray(paths[i:i + chunk_size].T)
+        results.append(_replay_shared_chunk(batch, series, highest))
+    merged = {key: np.concatenate([r[key] for r in results]) for key in results[0]}
+    return ReplayResult(
+        tp_levels=np.repeat(np.isfinite(batch.tp_prices), len(paths), axis=0),
+        sl_levels=np.repeat(np.isfinite(batch.sl_prices), len(paths), axis=0),
+        elapsed=time.perf_counter() - started, **merged
+    )
+
+def _replay_chunk(plans: PlanBatch, paths: np.ndarray) -> Dict[str, np.ndarray]:
+    n, steps = paths.shape
+    entry = plans.entry_price[:, None]
+
+    # 各レベルに最初に到達したステップ（到達しなければ steps）
+    # 累積最高値・最安値は単調なので、行ごとの二分探索で求まる
+    running_max = np.maximum.accumulate(paths, axis=1)
+    falling_min = -np.minimum.accumulate(paths, axis=1)
+    tp_time = np.stack([np.searchsorted(row, levels) for row, levels in zip(running_max, plans.tp_prices)])
+    sl_time = np.stack([np.searchsorted(row, -levels) for row, levels in zip(falling_min, plans.sl_prices)])
+    del falling_min
+
+    # トレーリングストップ（最高値更新時にのみ再計算されるので最高値の関数）
+    highest = np.maximum(running_max, entry)
+    del running_max
+    profit = highest / entry - 1
+    callback = np.where(plans.aggressive_mode[:, None] & (profit > AGGRESSIVE_PROFIT),
+                        plans.callback_rate[:, None] * 0.5, plans.callback_rate[:, None])
+    fire = (plans.trailing_enabled[:, None] & (profit >= plans.activation_profit[:, None])
+            & (paths <= highest * (1 - callback)))
+    del highest, profit, callback
+    trail_time = np.where(fire.any(axis=1), fire.argmax(axis=1), steps)
+    del fire
+
+    return _settle(paths, plans.entry_price, tp_time, sl_time, trail_time, plans.tp_ratios, plans.sl_ratios)
+
+def _replay_shared_chunk(plan: PlanBatch, series: np.ndarray, highest: float) -> Dict[str, np.ndarray]:
+    """
+    1プラン分の _replay_chunk（plan は1行の PlanBatch、series は時間が先頭の (ステップ数 × パス数)）
+    累積最高値・最安値はステップごとのパス方向のベクトル演算で求め（行方向の accumulate より速い）、
+    中間の配列は使い回して大きな確保を減らす。プランの値はPythonのスカラーにして
+    float32 のパスを float64 に昇格させない
+    """
+    steps, n = series.shape
+    entry = float(plan.entry_price[0])
+    callback_rate = float(plan.callback_rate[0])
+    mask = np.empty(series.shape, dtype=bool)
+
+    # 全パスが同じレベルなので、累積最高値・最安値がレベルに届いていないステップ数がそのまま到達ステップ
+    running_max = _running(np.maximum, series)
+    running_min = _running(np.minimum, series)
+    tp_time = np.full((n, plan.tp_prices.shape[1]), steps)
+    sl_time = np.full((n, plan.sl_prices.shape[1]), steps)
+    for j, level in enumerate(plan.tp_prices[0].tolist()):
+        if running_max[-1].max() >= level:
+            tp_time[:, j] = np.less(running_max, level, out=mask).sum(axis=0, dtype=np.int32)
+    for j, level in enumerate(plan.sl_prices[0].tolist()):
+        if running_min[-1].min() <= level:
+            sl_time[:, j] = np.greater(running_min, level, out=mask).sum(axis=0, dtype=np.int32)
+
+    # トレーリング（最高値の初期値は highest）
+    trail_time = np.full(n, steps)
+    activation_price = entry * (1 + float(plan.activation_profit[0]))
+    highest = np.maximum(running_max, highest, out=running_max)
+    if plan.trailing_enabled[0] and highest[-1].max() >= activation_price:
+        stop = np.multiply(highest, 1 - callback_rate, out=running_min)
+        fire = np.less_equal(series, stop, out=mask)
+        if plan.aggressive_mode[0]:
+            # 積極モードのストップは通常より高いので、通常のストップでの発動を含む（where= の選択は遅い）
+            np.multiply(highest, 1 - callback_rate * 0.5, out=stop)
+            fire |= (series <= stop) & (highest > entry * (1 + AGGRESSIVE_PROFIT))
+        fire &= highest >= activation_price
+        trail_time = steps - _running(np.logical_or, fire, out=fire).sum(axis=0, dtype=np.int32)
+    del highest, running_max, running_min, mask
+
+    return _settle(series.T, np.full(n, entry), tp_time, sl_time, trail_time,
+                   np.broadcast_to(plan.tp_ratios, tp_time.shape), np.broadcast_to(plan.sl_ratios, sl_time.shape))
+
+def _running(op, series: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """先頭の軸に沿った累積（np.maximum / np.minimum / np.logical_or、out=series で上書き可）"""
+    if out is None:
+        out = np.empty_like(series)
+    out[0] = series[0]
+    for t in range(1, len(series)):
+        op(out[t - 1], series[t], out=out[t])
+    return out
+
+def _settle(paths: np.ndarray, entry_price: np.ndarray, tp_time: np.ndarray, sl_time: np.ndarray,
+            trail_time: np.ndarray, tp_ratios: np.ndarray, sl_ratios: np.ndarray) -> Dict[str, np.ndarray]:
+    """各レベル・トレーリングの発動ステップから損益を集計"""
+    n, steps = paths.shape
+    entry = entry_price[:, None]
+
+    # トレーリング以降のレベルは執行されない
+    tp_time = np.where(tp_time <= trail_time[:, None], tp_time, steps)
+    sl_time = np.where(sl_time <= trail_time[:, None], sl_time, steps)
+
+    # 執行順に並べ、残り数量に対する比率を順に適用
+    times = np.concatenate([tp_time, sl_time, trail_time[:, None]], axis=1)
+    ratios = np.concatenate([tp_ratios, sl_ratios, np.ones((n, 1))], axis=1)
+    ratios = np.where(times < steps, ratios, 0.0)
+    order = np.argsort(times * times.shape[1] + np.arange(times.shape[1]), axis=1, kind='stable')
+    times = np.take_along_axis(times, order, axis=1)
+    ratios = np.take_along_axis(ratios, order, axis=1)
+    prices = np.take_along_axis(paths, np.minimum(times, steps - 1), axis=1)
+
+    remaining = np.cumprod(1 - ratios, axis=1)
+    before = np.concatenate([np.ones((n, 1)), remaining[:, :-1]], axis=1)
+    pnl = (before * ratios * (prices / entry - 1)).sum(axis=1) + remaining[:, -1] * (paths[:, -1] / entry_price - 1)
+
+    closed = trail_time < steps
+    return {
+        'pnl': pnl,
+        'exit_step': np.where(closed, trail_time, steps - 1),
+        'closed': closed,
+        'tp_hits': tp_time < steps,
+        'sl_hits': sl_time < steps,
+        'trailing': closed,
+    }
+
+def replay_reference(plans: Sequence[ExitPlan], paths: np.ndarray,
+                     exit_matrix: Optional[DynamicExitMatrix] = None) -> ReplayResult:
+    """
+    PositionManager.check_exits を1ティックずつ呼んでリプレイ（replay の検証用、低速）
+    決済は _execute_exit_action と同じく残り数量 × 決済比率を即時に約定させる
+    """
+    started = time.perf_counter()
+    manager = PositionManager(exit_matrix or DynamicExitMatrix())
+    paths = np.asarray(paths, dtype=np.float64)
+    n, steps = paths.shape
+    n_tp = max(len(plan.tp_prices) for plan in plans)
+    n_sl = max(len(plan.sl_prices) for plan in plans)
+    out = {
+        'pnl': np.zeros(n), 'exit_step': np.full(n, steps - 1), 'closed': np.zeros(n, dtype=bool),
+        'tp_hits': np.zeros((n, n_tp), dtype=bool), 'sl_hits': np.zeros((n, n_sl), dtype=bool),
+        'trailing': np.zeros(n, dtype=bool),
+    }
+
+    for i, source in enumerate(plans):
+        # 執行済みフラグを書き換えるので複製してから登録
+        plan = ExitPlan(
+            source.symbol, source.entry_price, 1.0, source.tp_prices, source.tp_ratios,
+            source.sl_prices, source.sl_ratios, dict(source.trailing_config), source.tp_atr_multiples,
+            source.confidence, source.created_at
+        )
+        symbol = f"REPLAY{i}"
+        manager.active_positions[symbol] = {'exit_plan': plan, 'highest_price': plan.entry_price}
+        pnl = 0.0
+        for t, price in enumerate(paths[i].tolist()):
+            for action in manager.check_exits(symbol, price):
+                exit_size = plan.remaining_size * action['exit_ratio']
+                pnl += exit_size * (price / plan.entry_price - 1)
+                plan.remaining_size -= exit_size
+                if action['type'] == 'trailing_stop':
+                    out['trailing'][i] = True
+            if plan.remaining_size <= 0:
+                out['closed'][i] = True
+                out['exit_step'][i] = t
+                break
+        manager.active_positions.pop(symbol)
+        manager.check_exits(symbol, 0.0)  # トリガー索引を破棄
+        out['pnl'][i] = pnl + plan.remaining_size * (paths[i, -1] / plan.entry_price - 1)
+        out['tp_hits'][i, :len(plan.tp_executed)] = plan.tp_executed
+        out['sl_hits'][i, :len(plan.sl_executed)] = plan.sl_executed
+
+    batch = PlanBatch.from_plans(plans)
+    return ReplayResult(
+        tp_levels=np.isfinite(batch.tp_prices), sl_levels=np.isfinite(batch.sl_prices),
+        elapsed=time.perf_counter() - started, **out
+    )
+
+def gbm_paths(entry_price: np.ndarray, steps: int, volatility: float = 0.002, drift: float = 0.0,
+              seed: Optional[int] = None) -> np.ndarray:
+    """エントリー価格から始まる幾何ブラウン運動の価格パス (ポジション数 × ステップ数)"""
+    rng = np.random.default_rng(seed)
+    entry_price = np.asarray(entry_price, dtype=np.float64)
+    volatility = np.broadcast_to(np.asarray(volatility, dtype=np.float64), entry_price.shape)[:, None]
+    log_returns = rng.standard_normal((len(entry_price), steps)) * volatility + drift - volatility ** 2 / 2
+    return entry_price[:, None] * np.exp(np.cumsum(log_returns, axis=1))
+
+def bar_ticks(open_: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """
+    ローソク足を1本4ティックの価格列に展開（最後の軸が時間）
+    陽線は 始値→安値→高値→終値、陰線は 始値→高値→安値→終値 の順に動いたとみなす
+    """
+    up = close >= open_
+    ticks = np.stack([open_, np.where(up, low, high), np.where(up, high, low), close], axis=-1)
+    return ticks.reshape(ticks.shape[:-2] + (-1,))
+
+def paths_from_history(history, symbol_index: np.ndarray, entry_index: np.ndarray, bars: int) -> np.ndarray:
+    """
+    MarketHistory のエントリー後 bars 本を4ティック/本の価格パスにする
+    履歴の終わりを越える部分は最後の終値で埋める
+    """
+    symbol_index = np.asarray(symbol_index)
+    bar = np.minimum(np.asarray(entry_index)[:, None] + 1 + np.arange(bars), len(history) - 1)
+    fields = [getattr(history, field)[symbol_index[:, None], bar] for field in ('open', 'high', 'low', 'close')]
+    beyond = np.asarray(entry_index)[:, None] + 1 + np.arange(bars) >= len(history)
+    last_close = history.close[symbol_index, -1][:, None]
+    fields = [np.where(beyond, last_close, values) for values in fields]
+    return bar_ticks(*fields)
+
+def mirror_paths(entry_price: np.ndarray, paths: np.ndarray) -> np.ndarray:
+    """ショート用にエントリー価格で価格パスを反転"""
+    return 2 * np.asarray(entry_price, dtype=np.float64)[:, None] - paths
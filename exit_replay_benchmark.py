@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+決済リプレイの整合性チェックとベンチマーク
+一括リプレイ（exit_replay.replay）が PositionManager を1ティックずつ動かした結果と一致するかを確認し、
+合成パスと記録済みパス（バックテストのエントリー）で損益分布・レベル到達率を計測
+"""
+
+import sys
+import time
+import logging
+import numpy as np
+
+from genius_dynamic_exit_strategy import DynamicExitMatrix
+from exit_replay import gbm_paths, mirror_paths, paths_from_history, replay, replay_reference
+from backtest import MarketHistory, compute_signals, simulate_trades
+from backtest_benchmark import synthetic_klines
+from genius_multi_trading_v2_with_trading import GeniusMultiTrader
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def random_plans(n: int, seed: int = 0):
+    """信頼度・ATR・ボラティリティ・トレンド強度をばらつかせた決済プラン"""
+    rng = np.random.default_rng(seed)
+    matrix = DynamicExitMatrix()
+    plans = []
+    for i in range(n):
+        entry = rng.uniform(1, 50000)
+        plans.append(matrix.create_exit_plan(
+            entry_price=entry,
+            atr=entry * rng.uniform(0.002, 0.03),
+            confidence=rng.uniform(0.5, 0.95),
+            market_conditions={
+                'volatility': rng.choice(['normal', 'high']),
+                'trend_strength': rng.uniform(0.3, 1.0),
+            },
+            position_size=0.15,
+            symbol=f"SYM{i}USDT"
+        ))
+    return plans
+
+def check_parity(n: int = 400, steps: int = 2000) -> int:
+    """一括リプレイと PositionManager の逐次リプレイの不一致数"""
+    plans = random_plans(n)
+    entry = np.array([plan.entry_price for plan in plans])
+    paths = gbm_paths(entry, steps, volatility=np.random.default_rng(1).uniform(0.001, 0.006, n), seed=2)
+    batch = replay(plans, paths)
+    reference = replay_reference(plans, paths)
+
+    same = (
+        np.isclose(batch.pnl, reference.pnl, rtol=0, atol=1e-9)
+        & (batch.exit_step == reference.exit_step)
+        & (batch.closed == reference.closed)
+        & (batch.trailing == reference.trailing)
+        & (batch.tp_hits == reference.tp_hits).all(axis=1)
+        & (batch.sl_hits == reference.sl_hits).all(axis=1)
+    )
+    for i in np.flatnonzero(~same)[:5]:
+        logger.info(f"  ❌ #{i}: pnl {batch.pnl[i]:+.6f} vs {reference.pnl[i]:+.6f}, "
+                    f"exit {batch.exit_step[i]} vs {reference.exit_step[i]}")
+    logger.info(f"  逐次 {reference.elapsed * 1000:.0f}ms / 一括 {batch.elapsed * 1000:.0f}ms "
+                f"({n}ポジション × {steps}ステップ)")
+    return int((~same).sum())
+
+def main():
+    failures = 0
+
+    logger.info("=" * 60)
+    logger.info("🔬 一括リプレイと PositionManager の整合性チェック")
+    logger.info("=" * 60)
+    mismatches = check_parity()
+    if mismatches:
+        failures += 1
+        logger.info(f"  ❌ {mismatches}件が PositionManager の結果と不一致")
+    else:
+        logger.info("  ✅ 損益・決済ステップ・到達レベル・トレーリングが一致")
+
+    logger.info("\n" + "=" * 60)
+    logger.info("⏱️  合成パス（1万ポジション × 10日分の5分足4ティック）")
+    logger.info("=" * 60)
+    plans = random_plans(10_000, seed=3)
+    entry = np.array([plan.entry_price for plan in plans])
+    paths = gbm_paths(entry, 2880 * 4, volatility=0.001, seed=4)
+    result = replay(plans, paths)
+    logger.info(f"  {result.elapsed:.1f}秒 ({len(plans) / result.elapsed:,.0f}ポジション/秒)")
+    logger.info(f"  {result.summary()}")
+
+    logger.info("\n" + "=" * 60)
+    logger.info("📼 記録済みパス（バックテストのエントリーを決済マトリクスでリプレイ）")
+    logger.info("=" * 60)
+    trader = GeniusMultiTrader(None)
+    history = MarketHistory.from_klines(synthetic_klines(10, 90, seed=10))
+    signals = compute_signals(history, trader)
+    trades = simulate_trades(signals, trader)
+    plans = [
+        trader.plan_exits(signals.result(trader, int(s), int(t)))['exit_plan']
+        for s, t in zip(trades['symbol'], trades['entry_index'])
+    ]
+    paths = paths_from_history(history, trades['symbol'], trades['entry_index'], bars=288 * 3)
+    short = trades['direction'] < 0
+    paths[short] = mirror_paths(trades['entry_price'][short], paths[short])
+    result = replay(plans, paths)
+    logger.info(f"  {result.summary()}")
+    if not len(plans):
+        failures += 1
+
+    if failures:
+        logger.info(f"\n❌ {failures}件のチェックが失敗しました")
+        sys.exit(1)
+    logger.info("\n✅ すべてのテストが完了しました！")
+
+if __name__ == "__main__":
+    main()
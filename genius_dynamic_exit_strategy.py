@@ -5,12 +5,142 @@ Dynamic Exit Matrix - 天才的段階的決済システム
 """
 
 import numpy as np
-from typing import Dict, List, Tuple, Optional
+import threading
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple, Optional
 from datetime import datetime, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 利確・損切りレベルごとの決済理由（レベル番号 - 1 で参照）
+TP_REASONS = ("心理的安定確保", "元本回収", "利益確定", "トレンド利益", "ムーンショット")
+SL_REASONS = ("早期リスク軽減", "トレンド転換の可能性", "最大損失回避")
+SL_ACTIONS = ("reduce", "reduce", "close_all")
+
+class ExitPlan:
+    """Dynamic Exit Matrixの決済プラン（配列ベース）
+    
+    トリガー価格・決済比率・執行済みフラグをレベル数の固定長NumPy配列で保持する。
+    理由などの表示用の値はレベル番号から引くため保持しない。
+    トリガー価格はロング前提の配置（利確はエントリーより上、損切りは下）で、
+    ショート（side='Sell'）はエントリー価格で反転した価格で判定する（market_price）。
+    ログや旧形式が必要な場合は as_dict() で辞書に展開する。
+    """
+    
+    __slots__ = (
+        'symbol', 'entry_price', 'position_size', 'confidence', 'created_at',
+        'tp_prices', 'tp_ratios', 'tp_atr_multiples', 'tp_executed',
+        'sl_prices', 'sl_ratios', 'sl_executed',
+        'trailing_config', 'remaining_size', 'side'
+    )
+    
+    def __init__(self, symbol: str, entry_price: float, position_size: float,
+                 tp_prices, tp_ratios, sl_prices, sl_ratios,
+                 trailing_config: Optional[Dict] = None, tp_atr_multiples=None,
+                 confidence: float = 0.0, created_at: Optional[datetime] = None, side: str = 'Buy'):
+        self.symbol = symbol
+        self.entry_price = float(entry_price)
+        self.position_size = position_size
+        self.confidence = confidence
+        self.created_at = created_at or datetime.now()
+        self.tp_prices = np.asarray(tp_prices, dtype=np.float64)
+        self.tp_ratios = np.asarray(tp_ratios, dtype=np.float64)
+        self.tp_atr_multiples = np.asarray(
+            tp_atr_multiples if tp_atr_multiples is not None else np.zeros(len(self.tp_prices)), dtype=np.float64
+        )
+        self.tp_executed = np.zeros(len(self.tp_prices), dtype=bool)
+        self.sl_prices = np.asarray(sl_prices, dtype=np.float64)
+        self.sl_ratios = np.asarray(sl_ratios, dtype=np.float64)
+        self.sl_executed = np.zeros(len(self.sl_prices), dtype=bool)
+        self.trailing_config = trailing_config or {'enabled': False}
+        self.remaining_size = position_size  # 未決済の割合（決済ごとに減算）
+        self.side = side  # 'Buy'（ロング）/ 'Sell'（ショート）
+    
+    @classmethod
+    def from_levels(cls, symbol: str, entry_price: float, position_size: float,
+                    take_profits: List[Dict], stop_losses: List[Dict], trailing_config: Dict,
+                    confidence: float = 0.0, side: str = 'Buy') -> 'ExitPlan':
+        """利確・損切りレベルの辞書リストから作成"""
+        return cls(
+            symbol, entry_price, position_size,
+            [tp['target_price'] for tp in take_profits], [tp['exit_ratio'] for tp in take_profits],
+            [sl['trigger_price'] for sl in stop_losses], [sl['exit_ratio'] for sl in stop_losses],
+            trailing_config, tp_atr_multiples=[tp.get('atr_multiple', 0.0) for tp in take_profits],
+            confidence=confidence, side=side
+        )
+    
+    def market_price(self, price: float) -> float:
+        """ロング前提の価格と実際の価格の変換（ショートはエントリー価格で反転、逆変換も同じ式）"""
+        return price if self.side == 'Buy' else 2 * self.entry_price - price
+    
+    def crossed(self, price: float) -> Tuple[np.ndarray, np.ndarray]:
+        """価格で発動する未執行の利確・損切りレベルのインデックス"""
+        return (
+            np.flatnonzero(~self.tp_executed & (self.tp_prices <= price)),
+            np.flatnonzero(~self.sl_executed & (self.sl_prices >= price)),
+        )
+    
+    @staticmethod
+    def tp_reason(i: int) -> str:
+        return TP_REASONS[i] if i < len(TP_REASONS) else "追加利益"
+    
+    @staticmethod
+    def sl_reason(i: int) -> str:
+        return SL_REASONS[i] if i < len(SL_REASONS) else "追加損切り"
+    
+    @property
+    def take_profits(self) -> List[Dict]:
+        """利確レベルの辞書リスト（表示用）"""
+        return [
+            {
+                'level': i + 1,
+                'target_price': float(self.market_price(price)),
+                'exit_ratio': float(self.tp_ratios[i]),
+                'percentage_gain': (price / self.entry_price - 1) * 100,
+                'atr_multiple': float(self.tp_atr_multiples[i]),
+                'reason': self.tp_reason(i),
+                'executed': bool(self.tp_executed[i])
+            }
+            for i, price in enumerate(self.tp_prices.tolist())
+        ]
+    
+    @property
+    def stop_losses(self) -> List[Dict]:
+        """損切りレベルの辞書リスト（表示用）"""
+        return [
+            {
+                'level': i + 1,
+                'trigger_price': float(self.market_price(price)),
+                'exit_ratio': float(self.sl_ratios[i]),
+                'action': SL_ACTIONS[i] if i < len(SL_ACTIONS) else 'reduce',
+                'percentage_loss': (price / self.entry_price - 1) * 100,
+                'reason': self.sl_reason(i),
+                'executed': bool(self.sl_executed[i])
+            }
+            for i, price in enumerate(self.sl_prices.tolist())
+        ]
+    
+    def as_dict(self) -> Dict:
+        """旧形式の辞書（ログ・表示用）"""
+        return {
+            'symbol': self.symbol,
+            'side': self.side,
+            'entry_price': self.entry_price,
+            'position_size': self.position_size,
+            'take_profits': self.take_profits,
+            'stop_losses': self.stop_losses,
+            'trailing_config': self.trailing_config,
+            'execution_status': {
+                'tp_executed': (np.flatnonzero(self.tp_executed) + 1).tolist(),
+                'sl_executed': (np.flatnonzero(self.sl_executed) + 1).tolist(),
+                'remaining_size': self.remaining_size
+            },
+            'created_at': self.created_at,
+            'confidence': self.confidence
+        }
+
 class DynamicExitMatrix:
     """統合的な段階的決済システム"""
     
@@ -23,9 +153,9 @@ class DynamicExitMatrix:
     
     def create_exit_plan(self, entry_price: float, atr: float, 
                         confidence: float, market_conditions: Dict,
-                        position_size: float, symbol: str) -> Dict:
+                        position_size: float, symbol: str, side: str = 'Buy') -> ExitPlan:
         """
-        完全な決済プランを作成
+        完全な決済プランを作成（価格配置はロング前提、ショートは side='Sell' で反転して執行）
         """
         # 1. 段階的利確レベル
         tp_levels = self.profit_cascade.calculate_tp_levels(
@@ -53,27 +183,35 @@ class DynamicExitMatrix:
         )
         
         # 5. 実行プランの作成
-        exit_plan = {
-            'symbol': symbol,
-            'entry_price': entry_price,
-            'position_size': position_size,
-            'take_profits': adjusted_plan['take_profits'],
-            'stop_losses': adjusted_plan['stop_losses'],
-            'trailing_config': adjusted_plan['trailing'],
-            'execution_status': {
-                'tp_executed': [],
-                'sl_executed': [],
-                'remaining_size': position_size
-            },
-            'created_at': datetime.now(),
-            'confidence': confidence
-        }
-        
-        return exit_plan
+        return ExitPlan.from_levels(
+            symbol, entry_price, position_size,
+            adjusted_plan['take_profits'], adjusted_plan['stop_losses'], adjusted_plan['trailing'],
+            confidence=confidence, side=side
+        )
 
 class ProfitCascadeStrategy:
     """利益を最大化する段階的利確戦略"""
     
+    def __init__(self):
+        # 信頼度の区分ごとのATR倍率
+        self.atr_multiples = {
+            'high': [0.5, 1.2, 2.0, 3.5, 5.0],    # 高信頼度：広めの間隔
+            'medium': [0.4, 1.0, 1.8, 3.0, 4.0],  # 中高信頼度
+            'low': [0.3, 0.8, 1.5, 2.5]           # 中信頼度：4段階のみ
+        }
+        # 信頼度の区分ごとのパーセンテージ目標
+        self.percentage_targets = {
+            'high': [0.005, 0.015, 0.03, 0.05, 0.10],    # 0.5%, 1.5%, 3%, 5%, 10%
+            'medium': [0.005, 0.012, 0.025, 0.04, 0.07],  # より保守的
+            'low': [0.005, 0.01, 0.02, 0.035]             # 最も保守的
+        }
+        # 信頼度の区分ごとの決済比率
+        self.exit_ratios = {
+            'high': [0.20, 0.20, 0.25, 0.25, 0.10],    # 高信頼度：後半に重点
+            'medium': [0.25, 0.25, 0.20, 0.20, 0.10],  # 中高信頼度：バランス型
+            'low': [0.30, 0.30, 0.25, 0.15]            # 中信頼度：前半に重点
+        }
+    
     def calculate_tp_levels(self, entry_price: float, atr: float, 
                           confidence: float, market_conditions: Dict) -> List[Dict]:
         """
@@ -109,46 +247,29 @@ class ProfitCascadeStrategy:
         
         return levels
     
-    def _get_atr_multiples(self, confidence: float) -> List[float]:
-        """信頼度に基づくATR倍率"""
+    def _confidence_tier(self, confidence: float) -> str:
+        """信頼度の区分"""
         if confidence > 0.8:
-            return [0.5, 1.2, 2.0, 3.5, 5.0]  # 高信頼度：広めの間隔
+            return 'high'
         elif confidence > 0.65:
-            return [0.4, 1.0, 1.8, 3.0, 4.0]  # 中高信頼度
-        else:
-            return [0.3, 0.8, 1.5, 2.5]        # 中信頼度：4段階のみ
+            return 'medium'
+        return 'low'
+    
+    def _get_atr_multiples(self, confidence: float) -> List[float]:
+        """信頼度に基づくATR倍率"""
+        return self.atr_multiples[self._confidence_tier(confidence)]
     
     def _get_percentage_targets(self, confidence: float) -> List[float]:
         """信頼度に基づくパーセンテージ目標"""
-        if confidence > 0.8:
-            return [0.005, 0.015, 0.03, 0.05, 0.10]  # 0.5%, 1.5%, 3%, 5%, 10%
-        elif confidence > 0.65:
-            return [0.005, 0.012, 0.025, 0.04, 0.07]  # より保守的
-        else:
-            return [0.005, 0.01, 0.02, 0.035]         # 最も保守的
+        return self.percentage_targets[self._confidence_tier(confidence)]
     
     def _get_exit_ratios(self, confidence: float) -> List[float]:
         """信頼度に基づく決済比率"""
-        if confidence > 0.8:
-            # 高信頼度：後半に重点
-            return [0.20, 0.20, 0.25, 0.25, 0.10]
-        elif confidence > 0.65:
-            # 中高信頼度：バランス型
-            return [0.25, 0.25, 0.20, 0.20, 0.10]
-        else:
-            # 中信頼度：前半に重点
-            return [0.30, 0.30, 0.25, 0.15]
+        return self.exit_ratios[self._confidence_tier(confidence)]
     
     def _get_level_reason(self, level: int) -> str:
         """各レベルの決済理由"""
-        reasons = [
-            "心理的安定確保",
-            "元本回収",
-            "利益確定",
-            "トレンド利益",
-            "ムーンショット"
-        ]
-        return reasons[level] if level < len(reasons) else "追加利益"
+        return ExitPlan.tp_reason(level)
 
 class RiskShieldStrategy:
     """段階的にリスクを軽減する損切り戦略"""
@@ -171,7 +292,7 @@ class RiskShieldStrategy:
             'exit_ratio': 0.25,
             'action': 'reduce',
             'percentage_loss': ((first_trigger / entry_price) - 1) * 100,
-            'reason': '早期リスク軽減',
+            'reason': SL_REASONS[0],
             'executed': False
         })
         
@@ -186,7 +307,7 @@ class RiskShieldStrategy:
             'exit_ratio': 0.50,
             'action': 'reduce',
             'percentage_loss': ((second_trigger / entry_price) - 1) * 100,
-            'reason': 'トレンド転換の可能性',
+            'reason': SL_REASONS[1],
             'executed': False
         })
         
@@ -198,7 +319,7 @@ class RiskShieldStrategy:
             'exit_ratio': 0.25,
             'action': 'close_all',
             'percentage_loss': ((final_trigger / entry_price) - 1) * 100,
-            'reason': '最大損失回避',
+            'reason': SL_REASONS[2],
             'executed': False
         })
         
@@ -327,76 +448,217 @@ class MarketAdaptiveExit:
         }
         return factors.get(session, 1.0)
 
+class TriggerIndex:
+    """1ポジションの未執行の決済トリガー（価格順のソート済み配列）
+    
+    利確は価格以上、損切りは価格以下で発動する。ティックごとに bisect で
+    到達したレベルだけを取り出し、発動したレベルは配列から削除する。
+    """
+    
+    def __init__(self, exit_plan: ExitPlan):
+        self.exit_plan = exit_plan
+        tp_order = np.argsort(exit_plan.tp_prices, kind='stable')
+        tp_order = tp_order[~exit_plan.tp_executed[tp_order]]
+        sl_order = np.argsort(exit_plan.sl_prices, kind='stable')
+        sl_order = sl_order[~exit_plan.sl_executed[sl_order]]
+        self._upper = exit_plan.tp_prices[tp_order].tolist()
+        self._upper_levels = tp_order.tolist()
+        self._lower = exit_plan.sl_prices[sl_order].tolist()
+        self._lower_levels = sl_order.tolist()
+        self.trail_stop = None  # 発動中のトレーリングストップ価格
+        self.trail_callback = None
+    
+    def crossed_above(self, price: float) -> List[int]:
+        """価格以下の利確レベル（インデックス）を取り出す"""
+        k = bisect_right(self._upper, price)
+        if not k:
+            return []
+        hit = self._upper_levels[:k]
+        del self._upper[:k], self._upper_levels[:k]
+        return sorted(hit)
+    
+    def crossed_below(self, price: float) -> List[int]:
+        """価格以上の損切りレベル（インデックス）を取り出す"""
+        k = bisect_left(self._lower, price)
+        if k == len(self._lower):
+            return []
+        hit = self._lower_levels[k:]
+        del self._lower[k:], self._lower_levels[k:]
+        return sorted(hit)
+    
+    def __len__(self) -> int:
+        return len(self._upper) + len(self._lower)
+
 class PositionManager:
     """ポジションの実行管理"""
     
     def __init__(self, exit_matrix: DynamicExitMatrix):
         self.exit_matrix = exit_matrix
         self.active_positions = {}
+        self._triggers: Dict[str, TriggerIndex] = {}  # 通貨ごとの未執行トリガー
+        self._last_tick = {}  # 通貨ごとに処理した最新ティックの時刻（ms）
+        self._lock = threading.RLock()
     
-    def check_exits(self, symbol: str, current_price: float) -> List[Dict]:
-        """決済条件のチェックと実行指示"""
+    def on_price(self, symbol: str, price: float, ts: Optional[int] = None) -> List[Dict]:
+        """価格ティックごとの決済判定（保有していない通貨・古いティックは何もしない）"""
         if symbol not in self.active_positions:
             return []
+        with self._lock:
+            if ts is not None:
+                if ts < self._last_tick.get(symbol, 0):
+                    return []
+                self._last_tick[symbol] = ts
+            return self.check_exits(symbol, price)
+    
+    def check_exits(self, symbol: str, current_price: float) -> List[Dict]:
+        """決済条件のチェックと実行指示
+        
+        判定はロング前提の価格（ショートはエントリー価格で反転）で行い、
+        アクションの価格は実際の価格を返す。
+        """
+        position = self.active_positions.get(symbol)
+        if position is None:
+            self._triggers.pop(symbol, None)
+            return []
         
-        position = self.active_positions[symbol]
         exit_plan = position['exit_plan']
+        index = self._trigger_index(symbol, position)
+        price = exit_plan.market_price(current_price)
         actions = []
         
-        # 利確チェック
-        for tp in exit_plan['take_profits']:
-            if not tp['executed'] and current_price >= tp['target_price']:
-                actions.append({
-                    'type': 'take_profit',
-                    'level': tp['level'],
-                    'exit_ratio': tp['exit_ratio'],
-                    'price': current_price,
-                    'reason': tp['reason']
-                })
-                tp['executed'] = True
-        
-        # 損切りチェック
-        for sl in exit_plan['stop_losses']:
-            if not sl['executed'] and current_price <= sl['trigger_price']:
-                actions.append({
-                    'type': 'stop_loss',
-                    'level': sl['level'],
-                    'exit_ratio': sl['exit_ratio'],
-                    'price': current_price,
-                    'reason': sl['reason']
-                })
-                sl['executed'] = True
+        # 利確チェック（到達したレベルのみ）
+        for i in index.crossed_above(price):
+            actions.append({
+                'type': 'take_profit',
+                'level': i + 1,
+                'exit_ratio': float(exit_plan.tp_ratios[i]),
+                'price': current_price,
+                'reason': exit_plan.tp_reason(i)
+            })
+            exit_plan.tp_executed[i] = True
+        
+        # 損切りチェック（到達したレベルのみ）
+        for i in index.crossed_below(price):
+            actions.append({
+                'type': 'stop_loss',
+                'level': i + 1,
+                'exit_ratio': float(exit_plan.sl_ratios[i]),
+                'price': current_price,
+                'reason': exit_plan.sl_reason(i)
+            })
+            exit_plan.sl_executed[i] = True
         
         # トレーリングストップチェック
-        if exit_plan['trailing_config']['enabled']:
-            trailing = self._check_trailing_stop(position, current_price)
+        if exit_plan.trailing_config['enabled']:
+            trailing = self._check_trailing_stop(position, price, index, current_price)
             if trailing:
                 actions.append(trailing)
         
         return actions
     
-    def _check_trailing_stop(self, position: Dict, current_price: float) -> Optional[Dict]:
-        """トレーリングストップのチェック"""
-        entry_price = position['exit_plan']['entry_price']
-        config = position['exit_plan']['trailing_config']
-        
-        # 最高値の更新
-        if 'highest_price' not in position:
-            position['highest_price'] = current_price
-        else:
-            position['highest_price'] = max(position['highest_price'], current_price)
-        
-        # トレーリング計算
+    def _trigger_index(self, symbol: str, position: Dict) -> TriggerIndex:
+        """トリガー索引（決済プランが差し替えられたら作り直す）"""
+        index = self._triggers.get(symbol)
+        if index is None or index.exit_plan is not position['exit_plan']:
+            index = TriggerIndex(position['exit_plan'])
+            if 'highest_price' in position:
+                self._update_trail(position, position['highest_price'], index)
+            self._triggers[symbol] = index
+        return index
+    
+    def _update_trail(self, position: Dict, highest_price: float, index: TriggerIndex):
+        """最高値の更新時のみストップ価格を再計算"""
         result = self.exit_matrix.smart_trail.update_trailing_stop(
-            current_price, entry_price, position['highest_price'], config
+            highest_price, position['exit_plan'].entry_price, highest_price,
+            position['exit_plan'].trailing_config
         )
+        index.trail_stop = result['stop_price'] if result['active'] else None
+        index.trail_callback = result.get('callback_percentage')
+    
+    def _check_trailing_stop(self, position: Dict, price: float,
+                             index: TriggerIndex, current_price: float) -> Optional[Dict]:
+        """トレーリングストップのチェック
         
-        if result['active'] and current_price <= result['stop_price']:
+        price はロング前提の価格。ショートの highest_price は反転した価格の最高値（実際の最安値）を保持する。
+        """
+        # 最高値の更新
+        if 'highest_price' not in position or price > position['highest_price']:
+            position['highest_price'] = price
+            self._update_trail(position, price, index)
+            return None
+        
+        if index.trail_stop is not None and price <= index.trail_stop:
+            index.trail_stop = None
             return {
                 'type': 'trailing_stop',
                 'exit_ratio': 1.0,  # 全決済
                 'price': current_price,
-                'reason': f"トレーリングストップ（最高値から{result['callback_percentage']:.1f}%下落）"
+                'reason': f"トレーリングストップ（最高値から{index.trail_callback:.1f}%下落）"
             }
         
-        return None
\ No newline at end of file
+        return None
+
+class PriceDispatcher:
+    """価格ソースからPositionManagerへティックを配信し、決済アクションを実行
+    
+    ストリーム接続中はティッカー受信ごとに判定し、それ以外はスキャンの
+    サイクルごとに取得したティッカースナップショット（on_tickers）で判定する。
+    判定のためだけにRESTを呼ぶことはない。
+    決済注文は別スレッドで送信し、同じ通貨の決済中は判定を保留する。
+    """
+    
+    def __init__(self, position_manager: PositionManager,
+                 execute: Callable[[str, Dict], None],
+                 max_workers: int = 4):
+        self.position_manager = position_manager
+        self.execute = execute  # (symbol, action) -> 決済注文の送信
+        self.mirror = None
+        self.stats = {'ticks': 0, 'actions': 0, 'snapshots': 0}
+        
+        self._pending = set()  # 決済注文の送信中の通貨
+        self._pending_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='exit')
+    
+    def attach(self, mirror):
+        """MarketDataMirror の価格更新を購読"""
+        self.mirror = mirror
+        mirror.add_price_listener(self.on_tick)
+    
+    def stop(self):
+        if self.mirror is not None:
+            self.mirror.remove_price_listener(self.on_tick)
+        self._executor.shutdown(wait=True)
+    
+    def on_tick(self, symbol: str, price: float, ts: Optional[int] = None):
+        """価格ティック（ストリームのリスナーとしても呼ばれる）"""
+        if symbol not in self.position_manager.active_positions:
+            return
+        with self._pending_lock:
+            if symbol in self._pending:
+                return  # 決済結果の反映後に次のティックで再判定
+        self.stats['ticks'] += 1
+        actions = self.position_manager.on_price(symbol, price, ts)
+        if not actions:
+            return
+        with self._pending_lock:
+            self._pending.add(symbol)
+        self.stats['actions'] += len(actions)
+        self._executor.submit(self._execute, symbol, actions)
+    
+    def on_tickers(self, tickers: Dict[str, Dict]):
+        """ティッカースナップショットを保有中の通貨に配信"""
+        self.stats['snapshots'] += 1
+        for symbol in list(self.position_manager.active_positions):
+            ticker = tickers.get(symbol)
+            if ticker and float(ticker.get('lastPrice') or 0) > 0:
+                self.on_tick(symbol, float(ticker['lastPrice']))
+    
+    def _execute(self, symbol: str, actions: List[Dict]):
+        try:
+            for action in actions:
+                self.execute(symbol, action)
+        except Exception as e:
+            logger.error(f"Exit dispatch error for {symbol}: {e}")
+        finally:
+            with self._pending_lock:
+                self._pending.discard(symbol)
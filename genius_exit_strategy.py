@@ -51,6 +51,43 @@ class GeniusExitStrategy:
             'partial_exit_plan': self._create_partial_exit_plan(confidence)
         }
     
+    def exit_levels_from_plan(self, exit_plan) -> Dict:
+        """
+        Dynamic Exit Matrixのプラン（ExitPlan）から同じ形式の決済レベルを作成
+        価格は再計算せず、プランの利確・最終損切りをそのまま使う
+        """
+        plan_tps = exit_plan.take_profits
+        final_sl = exit_plan.stop_losses[-1]
+        trailing = exit_plan.trailing_config
+        
+        return {
+            'take_profits': [
+                {
+                    'level': tp['level'],
+                    'price': tp['target_price'],
+                    'percentage': tp['percentage_gain'],
+                    'reason': tp['reason']
+                }
+                for tp in plan_tps
+            ],
+            'stop_loss': {
+                'price': final_sl['trigger_price'],
+                'percentage': final_sl['percentage_loss'],
+                'type': 'smart_stop',
+                'reason': final_sl['reason']
+            },
+            'trailing_config': {
+                'enabled': trailing.get('enabled', False),
+                'activation_profit': trailing.get('activation_profit'),
+                'trailing_distance': trailing.get('callback_rate'),
+                'type': 'aggressive' if trailing.get('aggressive_mode') else 'balanced'
+            },
+            'partial_exit_plan': [
+                {'level': tp['level'], 'exit_ratio': tp['exit_ratio'], 'reason': tp['reason']}
+                for tp in plan_tps
+            ]
+        }
+    
     def _calculate_base_tp_levels(self, price: float, atr: float, confidence: float) -> List[Dict]:
         """
         基本的な利確レベルを計算
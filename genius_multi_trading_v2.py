@@ -53,7 +53,6 @@ class GeniusMultiTrader:
                 if klines:
                     signal = self._analyze_timeframe(klines, tf)
                     mtf_signals[tf] = signal
-                time.sleep(0.1)
             
             # 2. 現在価格とボリューム
             ticker = self.bybit.get_ticker(symbol)
@@ -486,8 +485,6 @@ def main():
                         logger.info(f"  Position Size: {result['position_size']:.1%} of balance")
                         
                         opportunities.append(result)
-                
-                time.sleep(1)  # API制限
             
             # 機会のサマリー
             if opportunities:
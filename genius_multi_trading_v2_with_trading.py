@@ -5,7 +5,10 @@
 
 import os
 import time
+import asyncio
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import numpy as np
 from typing import Dict, List, Optional
@@ -13,8 +16,16 @@ import pytz
 
 from dotenv import load_dotenv
 from services.bybit_service import BybitService
+from services.async_bybit_service import AsyncBybitService
+from services.kline_cache import to_kline_array
+from services.market_stream import MarketDataMirror, PublicMarketStream
+from services.private_stream import AccountState, PrivateAccountStream
+import indicators
+from batch_indicators import compute_signals_batch
+from indicator_state import IndicatorState, IndicatorStateStore
+from cycle_cache import CycleCache
 from genius_exit_strategy import GeniusExitStrategy
-from genius_dynamic_exit_strategy import DynamicExitMatrix, PositionManager
+from genius_dynamic_exit_strategy import DynamicExitMatrix, PositionManager, PriceDispatcher
 
 logging.basicConfig(
     level=logging.INFO,
@@ -25,8 +36,42 @@ logger = logging.getLogger(__name__)
 class GeniusMultiTrader:
     """天才トレーダーの取引ロジック"""
     
-    def __init__(self, bybit_client):
+    # 決済注文からポジション照合までの待ち時間（秒）
+    RECONCILE_DELAY = 1.0
+    
+    # マルチタイムフレーム分析の時間足と本数
+    TIMEFRAMES = {
+        '5': 60,    # 5分足60本 = 5時間
+        '15': 96,   # 15分足96本 = 24時間
+        '60': 168,  # 1時間足168本 = 1週間
+        '240': 180  # 4時間足180本 = 1ヶ月
+    }
+    
+    # トレンド判定の時間足ごとの重み（上位時間足を重視）
+    TIMEFRAME_WEIGHTS = {'5': 0.1, '15': 0.2, '60': 0.3, '240': 0.4}
+    
+    # ポジションサイズの基本値（残高に対する割合）
+    BASE_POSITION_SIZE = 0.15  # 基本15%（変更前: 10%）⚡リスク増加V2
+    
+    # 天才の閾値（厳しめ）
+    THRESHOLDS = {
+        'BTCUSDT': 0.60,   # メジャー通貨は慎重に
+        'ETHUSDT': 0.58,
+        'SOLUSDT': 0.55,
+        'default': 0.50    # その他は50%以上
+    }
+    
+    def __init__(self, bybit_client, async_bybit_client: Optional[AsyncBybitService] = None,
+                 streaming_indicators: bool = False, market_mirror: Optional[MarketDataMirror] = None,
+                 account_state: Optional[AccountState] = None):
         self.bybit = bybit_client
+        self.async_bybit = async_bybit_client  # 非同期スキャン用（Noneなら同期版のみ）
+        # WebSocketで受信した最新価格・板・ローソク足（Noneなら REST のみ）
+        self.market_mirror = market_mirror
+        # 確定足ごとにO(1)更新する指標ステート（有効時は全期間の再計算をしない）
+        self.indicator_states = IndicatorStateStore() if streaming_indicators else None
+        # サイクル内の市場データ・分析結果のメモ化（main で new_cycle() するまで無効）
+        self.cycle_cache = CycleCache()
         self.correlations = {
             # 高相関グループ
             'major': ['BTCUSDT', 'ETHUSDT'],
@@ -42,156 +87,298 @@ class GeniusMultiTrader:
         self.exit_strategy = GeniusExitStrategy()  # 天才的な決済戦略
         self.dynamic_exit = DynamicExitMatrix()  # Dynamic Exit Matrix統合
         self.position_manager = PositionManager(self.dynamic_exit)  # ポジション管理
+        # 決済後のポジション照合（決済注文の送信を待たせないようバックグラウンドで実行）
+        self._reconcile_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='reconcile')
+        self._positions_lock = threading.RLock()
+        # 価格ティックごとに決済判定（ストリーム未接続時はサイクルごとのティッカースナップショット）
+        self.price_dispatcher = PriceDispatcher(self.position_manager, self._execute_exit_action)
+        
+        # プライベートストリーム（約定・注文・ポジション）でポジション状態を更新
+        self.account_state = account_state
+        if account_state is not None:
+            account_state.add_listener('position', self._on_position_update)
+            account_state.add_listener('order', self._on_order_update)
+            account_state.add_listener('execution', self._on_execution)
+            account_state.add_listener('connected', self._on_account_stream_connected)
     
     def analyze_genius(self, symbol: str) -> Optional[Dict]:
         """天才レベルの分析"""
         try:
-            # 1. マルチタイムフレーム分析
-            timeframes = {
-                '5': 60,    # 5分足60本 = 5時間
-                '15': 96,   # 15分足96本 = 24時間
-                '60': 168,  # 1時間足168本 = 1週間
-                '240': 180  # 4時間足180本 = 1ヶ月
-            }
-            
-            mtf_signals = {}
-            for tf, limit in timeframes.items():
-                klines = self.bybit.get_klines(symbol, tf, limit)
-                if klines:
-                    signal = self._analyze_timeframe(klines, tf)
-                    mtf_signals[tf] = signal
-                time.sleep(0.1)
-            
-            # 2. 現在価格とボリューム
-            ticker = self.bybit.get_ticker(symbol)
-            current_price = float(ticker.get('lastPrice', 0))
-            volume_24h = float(ticker.get('volume24h', 0))
-            change_24h = float(ticker.get('price24hPcnt', 0))
-            
-            # 3. サポート/レジスタンス
-            klines_daily = self.bybit.get_klines(symbol, 'D', 30)  # 日足30本
-            sr_levels = self._find_sr_levels(klines_daily)
-            
-            # ATR計算（Priority 1改善）
-            atr_14 = self._calculate_atr(klines_daily, 14) if klines_daily else None
-            
-            # 4. 総合判定
-            long_score = 0
-            short_score = 0
-            reasons = []
-            
-            # タイムフレーム分析
-            for tf, signal in mtf_signals.items():
-                if signal['trend'] == 'BULLISH':
-                    weight = {'5': 0.1, '15': 0.2, '60': 0.3, '240': 0.4}.get(tf, 0.1)
-                    long_score += signal['strength'] * weight
-                    if tf in ['60', '240']:  # 上位時間足を重視
-                        reasons.append(f"{tf}分足: 上昇トレンド")
-                elif signal['trend'] == 'BEARISH':
-                    weight = {'5': 0.1, '15': 0.2, '60': 0.3, '240': 0.4}.get(tf, 0.1)
-                    short_score += signal['strength'] * weight
-                    if tf in ['60', '240']:
-                        reasons.append(f"{tf}分足: 下降トレンド")
-            
-            # ボリューム分析
-            avg_volume = np.mean([float(k['volume']) for k in klines_daily[-20:]])
-            if volume_24h > avg_volume * 1.5:
-                reasons.append("高ボリューム")
-                if change_24h > 0:
-                    long_score += 0.1
-                else:
-                    short_score += 0.1
-            
-            # サポート/レジスタンス
-            nearest_support = self._find_nearest_level(current_price, sr_levels['support'])
-            nearest_resistance = self._find_nearest_level(current_price, sr_levels['resistance'])
-            
-            if nearest_support and abs(current_price - nearest_support) / current_price < 0.02:
-                long_score += 0.15
-                reasons.append(f"サポート付近 ${nearest_support:,.2f}")
-            
-            if nearest_resistance and abs(current_price - nearest_resistance) / current_price < 0.02:
-                short_score += 0.15
-                reasons.append(f"レジスタンス付近 ${nearest_resistance:,.2f}")
-            
-            # RSI計算
-            rsi = self._calculate_rsi(klines_daily[-14:])
-            if rsi < 30:
-                long_score += 0.1
-                reasons.append(f"売られすぎ (RSI: {rsi:.0f})")
-            elif rsi > 70:
-                short_score += 0.1
-                reasons.append(f"買われすぎ (RSI: {rsi:.0f})")
-            
-            # 最終判定
-            confidence = max(long_score, short_score)
-            direction = "LONG" if long_score > short_score else "SHORT"
-            
-            # リスク調整
-            risk_adjustment = self._calculate_risk_adjustment(symbol, direction)
-            confidence *= risk_adjustment
-            
-            # ビットコイン相関フィルター（Priority 1改善）
-            if symbol != 'BTCUSDT' and self.btc_trend == 'down' and direction == 'LONG':
-                confidence *= 0.7
-                reasons.append("BTC下降トレンドで調整")
-            
-            # タイムゾーン戦略調整（Priority 1改善）
-            timezone_adjustment = self._get_timezone_adjustment()
-            confidence *= timezone_adjustment['confidence_multiplier']
-            if timezone_adjustment['reason']:
-                reasons.append(timezone_adjustment['reason'])
-            
-            # 市場状況をまとめる
-            market_conditions = {
-                'trend_strength': max(long_score, short_score),
-                'volatility': 'high' if atr_14 and atr_14 / current_price > 0.03 else 'normal',
-                'volume_ratio': volume_24h / avg_volume if avg_volume > 0 else 1,
-                'nearest_support': nearest_support,
-                'nearest_resistance': nearest_resistance
-            }
-            
-            # Dynamic Exit Matrixで決済戦略を計算
-            position_size = self._calculate_position_size(confidence, risk_adjustment)
-            exit_plan = self.dynamic_exit.create_exit_plan(
-                entry_price=current_price,
-                atr=atr_14 or current_price * 0.02,
-                confidence=confidence,
-                market_conditions=market_conditions,
-                position_size=position_size,
-                symbol=symbol
-            )
-            
-            # 旧形式との互換性のため
-            exit_levels = self.exit_strategy.calculate_dynamic_exit_levels(
-                entry_price=current_price,
-                atr=atr_14 or current_price * 0.02,
-                confidence=confidence,
-                market_conditions=market_conditions,
-                symbol=symbol
+            return self.cycle_cache.get_or_compute(
+                'analysis', symbol, lambda: self._evaluate_market_data(symbol, self._fetch_market_data(symbol))
             )
-            
-            return {
-                'symbol': symbol,
-                'price': current_price,
-                'confidence': min(confidence, 0.85),  # 最大85%
-                'direction': direction,
-                'change_24h': change_24h,
-                'volume_ratio': volume_24h / avg_volume if avg_volume > 0 else 1,
-                'reasons': reasons,
-                'stop_loss': exit_levels['stop_loss']['price'],
-                'take_profits': [tp['price'] for tp in exit_levels['take_profits']],
-                'exit_strategy': exit_levels,  # 詳細な決済戦略
-                'exit_plan': exit_plan,  # Dynamic Exit Matrixプラン
-                'position_size': position_size,
-                'atr': atr_14,
-                'market_conditions': market_conditions
-            }
-            
         except Exception as e:
             logger.error(f"Error analyzing {symbol}: {e}")
             return None
     
+    async def analyze_genius_async(self, symbol: str) -> Optional[Dict]:
+        """天才レベルの分析（非同期版：全時間足を同時取得）"""
+        cached = self.cycle_cache.get('analysis', symbol)
+        if cached is not None:
+            return cached
+        try:
+            market_data = await self._fetch_market_data_async(symbol)
+            return self.cycle_cache.put('analysis', symbol, self._evaluate_market_data(symbol, market_data))
+        except Exception as e:
+            logger.error(f"Error analyzing {symbol}: {e}")
+            return None
+    
+    async def scan_async(self, symbols: List[str]) -> Dict[str, Optional[Dict]]:
+        """全通貨を同時に取得し、指標は時間足ごとに全通貨まとめて計算"""
+        # 同じサイクルで分析済みの通貨（BTCトレンド判定など）は再分析しない
+        results = {}
+        for symbol in symbols:
+            cached = self.cycle_cache.get('analysis', symbol)
+            if cached is not None:
+                results[symbol] = cached
+        pending = [symbol for symbol in symbols if symbol not in results]
+        
+        responses = await asyncio.gather(
+            *(self._fetch_market_data_async(symbol) for symbol in pending),
+            return_exceptions=True
+        )
+        
+        market_data_by_symbol = {}
+        for symbol, response in zip(pending, responses):
+            if isinstance(response, Exception):
+                logger.error(f"Error analyzing {symbol}: {response}")
+            else:
+                market_data_by_symbol[symbol] = response
+        
+        if self.indicator_states is not None:
+            signals = {
+                symbol: self._compute_signals(market_data, symbol)
+                for symbol, market_data in market_data_by_symbol.items()
+            }
+        else:
+            signals = compute_signals_batch(market_data_by_symbol)
+        
+        for symbol in pending:
+            if symbol not in market_data_by_symbol:
+                results[symbol] = None
+                continue
+            try:
+                results[symbol] = self.cycle_cache.put('analysis', symbol, self._evaluate_market_data(
+                    symbol, market_data_by_symbol[symbol], signals[symbol]
+                ))
+            except Exception as e:
+                logger.error(f"Error analyzing {symbol}: {e}")
+                results[symbol] = None
+        return results
+    
+    def select_universe(self, tickers: Dict[str, Dict], size: int) -> List[str]:
+        """24h売買代金上位のUSDT無期限をスキャン対象として選択（BTCは常に含める）"""
+        usdt_symbols = [symbol for symbol in tickers if symbol.endswith('USDT')]
+        ranked = sorted(
+            usdt_symbols,
+            key=lambda symbol: float(tickers[symbol].get('turnover24h') or 0),
+            reverse=True
+        )[:size]
+        if 'BTCUSDT' in tickers and 'BTCUSDT' not in ranked:
+            ranked = ['BTCUSDT'] + ranked[:size - 1]
+        return ranked
+    
+    def _fetch_market_data(self, symbol: str) -> Dict:
+        """分析に必要な市場データを取得（サイクル内はキャッシュ）"""
+        return self.cycle_cache.get_or_compute('market_data', symbol, lambda: self._download_market_data(symbol))
+    
+    def _download_market_data(self, symbol: str) -> Dict:
+        """マルチタイムフレームの足・ティッカー・日足を取得"""
+        # 1. マルチタイムフレーム分析
+        mtf_klines = {}
+        for tf, limit in self.TIMEFRAMES.items():
+            mtf_klines[tf] = self.bybit.get_klines_array(symbol, tf, limit)
+        
+        # 2. 現在価格とボリューム（サイクル共有のティッカースナップショット）
+        ticker = self.bybit.get_all_tickers().get(symbol, {})
+        
+        # 3. サポート/レジスタンス用の日足
+        klines_daily = self.bybit.get_klines_array(symbol, 'D', 30)  # 日足30本
+        
+        return {'mtf_klines': mtf_klines, 'ticker': ticker, 'klines_daily': klines_daily}
+    
+    async def _fetch_market_data_async(self, symbol: str) -> Dict:
+        """分析に必要な市場データを同時取得"""
+        if self.async_bybit is None:
+            raise RuntimeError("AsyncBybitService is not configured")
+        cached = self.cycle_cache.get('market_data', symbol)
+        if cached is not None:
+            return cached
+        
+        timeframes = list(self.TIMEFRAMES.items())
+        responses = await asyncio.gather(
+            *(self.async_bybit.get_klines_array(symbol, tf, limit) for tf, limit in timeframes),
+            self.async_bybit.get_all_tickers(),
+            self.async_bybit.get_klines_array(symbol, 'D', 30)
+        )
+        
+        mtf_klines = {tf: klines for (tf, _), klines in zip(timeframes, responses)}
+        ticker = responses[-2].get(symbol, {})
+        return self.cycle_cache.put(
+            'market_data', symbol, {'mtf_klines': mtf_klines, 'ticker': ticker, 'klines_daily': responses[-1]}
+        )
+    
+    def _compute_signals(self, market_data: Dict, symbol: Optional[str] = None) -> Dict:
+        """1通貨分の指標計算（一括計算版は batch_indicators.compute_signals_batch）"""
+        # マルチタイムフレーム分析
+        mtf_signals = {}
+        for tf, klines in market_data['mtf_klines'].items():
+            klines = to_kline_array(klines)
+            if len(klines) > 0:
+                state = self._update_indicator_state(symbol, tf, klines)
+                mtf_signals[tf] = self._analyze_timeframe(klines, tf, state)
+        
+        klines_daily = to_kline_array(market_data['klines_daily'])
+        daily_state = self._update_indicator_state(symbol, 'D', klines_daily)
+        return {
+            'mtf_signals': mtf_signals,
+            'sr_levels': self._find_sr_levels(klines_daily),  # サポート/レジスタンス
+            'atr': self._calculate_atr(klines_daily, 14, daily_state) if len(klines_daily) > 0 else None,  # ATR（Priority 1改善）
+            'rsi': self._calculate_rsi(klines_daily[-14:], 14, daily_state),
+            'avg_volume': np.mean(klines_daily['volume'][-20:])
+        }
+    
+    def _update_indicator_state(self, symbol: Optional[str], timeframe: str,
+                                klines: np.ndarray) -> Optional[IndicatorState]:
+        """ストリーミング指標ステートに新しい確定足を反映（無効時はNone）"""
+        if self.indicator_states is None or symbol is None or len(klines) == 0:
+            return None
+        return self.indicator_states.update_from_klines(symbol, timeframe, klines)
+    
+    def _evaluate_market_data(self, symbol: str, market_data: Dict, signals: Optional[Dict] = None,
+                              as_of: Optional[datetime] = None) -> Dict:
+        """取得済みの市場データと指標から総合判定（as_of: 時間帯判定の基準時刻、省略時は現在）"""
+        # 1. 指標（一括計算済みでなければここで計算）
+        if signals is None:
+            signals = self._compute_signals(market_data, symbol)
+        mtf_signals = signals['mtf_signals']
+        
+        # 2. 現在価格とボリューム
+        ticker = market_data['ticker']
+        current_price = float(ticker.get('lastPrice', 0))
+        volume_24h = float(ticker.get('volume24h', 0))
+        change_24h = float(ticker.get('price24hPcnt', 0))
+        
+        # 3. サポート/レジスタンスとATR
+        sr_levels = signals['sr_levels']
+        atr_14 = signals['atr']
+        
+        # 4. 総合判定
+        long_score = 0
+        short_score = 0
+        reasons = []
+        
+        # タイムフレーム分析
+        for tf, signal in mtf_signals.items():
+            if signal['trend'] == 'BULLISH':
+                weight = self.TIMEFRAME_WEIGHTS.get(tf, 0.1)
+                long_score += signal['strength'] * weight
+                if tf in ['60', '240']:  # 上位時間足を重視
+                    reasons.append(f"{tf}分足: 上昇トレンド")
+            elif signal['trend'] == 'BEARISH':
+                weight = self.TIMEFRAME_WEIGHTS.get(tf, 0.1)
+                short_score += signal['strength'] * weight
+                if tf in ['60', '240']:
+                    reasons.append(f"{tf}分足: 下降トレンド")
+        
+        # ボリューム分析
+        avg_volume = signals['avg_volume']
+        if volume_24h > avg_volume * 1.5:
+            reasons.append("高ボリューム")
+            if change_24h > 0:
+                long_score += 0.1
+            else:
+                short_score += 0.1
+        
+        # サポート/レジスタンス
+        nearest_support = self._find_nearest_level(current_price, sr_levels['support'])
+        nearest_resistance = self._find_nearest_level(current_price, sr_levels['resistance'])
+        
+        if nearest_support and abs(current_price - nearest_support) / current_price < 0.02:
+            long_score += 0.15
+            reasons.append(f"サポート付近 ${nearest_support:,.2f}")
+        
+        if nearest_resistance and abs(current_price - nearest_resistance) / current_price < 0.02:
+            short_score += 0.15
+            reasons.append(f"レジスタンス付近 ${nearest_resistance:,.2f}")
+        
+        # RSI
+        rsi = signals['rsi']
+        if rsi < 30:
+            long_score += 0.1
+            reasons.append(f"売られすぎ (RSI: {rsi:.0f})")
+        elif rsi > 70:
+            short_score += 0.1
+            reasons.append(f"買われすぎ (RSI: {rsi:.0f})")
+        
+        # 最終判定
+        confidence = max(long_score, short_score)
+        direction = "LONG" if long_score > short_score else "SHORT"
+        
+        # リスク調整
+        risk_adjustment = self._calculate_risk_adjustment(symbol, direction)
+        confidence *= risk_adjustment
+        
+        # ビットコイン相関フィルター（Priority 1改善）
+        if symbol != 'BTCUSDT' and self.btc_trend == 'down' and direction == 'LONG':
+            confidence *= 0.7
+            reasons.append("BTC下降トレンドで調整")
+        
+        # タイムゾーン戦略調整（Priority 1改善）
+        timezone_adjustment = self._get_timezone_adjustment(as_of)
+        confidence *= timezone_adjustment['confidence_multiplier']
+        if timezone_adjustment['reason']:
+            reasons.append(timezone_adjustment['reason'])
+        
+        # 市場状況をまとめる
+        market_conditions = {
+            'trend_strength': max(long_score, short_score),
+            'volatility': 'high' if atr_14 and atr_14 / current_price > 0.03 else 'normal',
+            'volume_ratio': volume_24h / avg_volume if avg_volume > 0 else 1,
+            'nearest_support': nearest_support,
+            'nearest_resistance': nearest_resistance
+        }
+        
+        # 決済プランは閾値を超えた候補だけ plan_exits で作成
+        return {
+            'symbol': symbol,
+            'price': current_price,
+            'confidence': min(confidence, 0.85),  # 最大85%
+            'raw_confidence': confidence,  # 決済プラン用（上限なし）
+            'direction': direction,
+            'change_24h': change_24h,
+            'volume_ratio': volume_24h / avg_volume if avg_volume > 0 else 1,
+            'reasons': reasons,
+            'position_size': self._calculate_position_size(confidence, risk_adjustment),
+            'atr': atr_14,
+            'market_conditions': market_conditions
+        }
+    
+    def plan_exits(self, result: Dict) -> Dict:
+        """エントリー候補の決済プランを作成（結果に追加して返す）"""
+        if result.get('exit_plan') is not None:
+            return result
+        
+        # Dynamic Exit Matrixで決済戦略を計算
+        exit_plan = self.dynamic_exit.create_exit_plan(
+            entry_price=result['price'],
+            atr=result['atr'] or result['price'] * 0.02,
+            confidence=result['raw_confidence'],
+            market_conditions=result['market_conditions'],
+            position_size=result['position_size'],
+            symbol=result['symbol'],
+            side='Buy' if result['direction'] == 'LONG' else 'Sell'
+        )
+        
+        # 旧形式との互換性のため（同じプランから作成）
+        exit_levels = self.exit_strategy.exit_levels_from_plan(exit_plan)
+        
+        result['stop_loss'] = exit_levels['stop_loss']['price']
+        result['take_profits'] = [tp['price'] for tp in exit_levels['take_profits']]
+        result['exit_strategy'] = exit_levels  # 詳細な決済戦略
+        result['exit_plan'] = exit_plan  # Dynamic Exit Matrixプラン
+        return result
+        
     def execute_trade(self, opportunity: Dict, usdt_balance: float) -> bool:
         """実際の取引を実行"""
         try:
@@ -212,12 +399,15 @@ class GeniusMultiTrader:
             quantity = position_value / opportunity['price']
             
             # 最小取引単位に調整
-            quantity = self._adjust_quantity(symbol, quantity)
+            quantity = self._adjust_quantity(symbol, quantity, opportunity['price'])
             
             if quantity <= 0:
                 logger.info(f"  ⚠️  {symbol}: 取引数量が小さすぎます")
                 return False
             
+            # 決済プラン（main で作成済みでなければここで作成）
+            self.plan_exits(opportunity)
+            
             # 注文実行
             logger.info(f"\n  🎯 取引実行: {symbol}")
             logger.info(f"     方向: {opportunity['direction']}")
@@ -229,22 +419,23 @@ class GeniusMultiTrader:
             if opportunity.get('exit_plan'):
                 exit_plan = opportunity['exit_plan']
                 logger.info(f"     🎯 Dynamic Exit Matrix戦略:")
-                logger.info(f"     📈 利確レベル: {len(exit_plan['take_profits'])}段階")
-                for tp in exit_plan['take_profits']:
+                logger.info(f"     📈 利確レベル: {len(exit_plan.tp_prices)}段階")
+                for tp in exit_plan.take_profits:
                     logger.info(f"       TP{tp['level']}: ${tp['target_price']:,.2f} ({tp['percentage_gain']:+.1f}%) - {tp['exit_ratio']*100:.0f}%決済")
-                logger.info(f"     🛡️  損切りレベル: {len(exit_plan['stop_losses'])}段階")
-                for sl in exit_plan['stop_losses']:
+                logger.info(f"     🛡️  損切りレベル: {len(exit_plan.sl_prices)}段階")
+                for sl in exit_plan.stop_losses:
                     logger.info(f"       SL{sl['level']}: ${sl['trigger_price']:,.2f} ({sl['percentage_loss']:.1f}%) - {sl['exit_ratio']*100:.0f}%損切り")
                 
                 # トレーリング情報
-                trailing = exit_plan['trailing_config']
+                trailing = exit_plan.trailing_config
                 if trailing['enabled']:
                     logger.info(f"     📈 トレーリング: {trailing['activation_profit']*100:.1f}%で発動, {trailing['callback_rate']*100:.1f}%押し目で決済")
             
             # Dynamic Exit Matrixから最初の利確と最終損切りを取得
             if opportunity.get('exit_plan'):
-                first_tp = opportunity['exit_plan']['take_profits'][0]['target_price']
-                final_sl = opportunity['exit_plan']['stop_losses'][-1]['trigger_price']
+                exit_plan = opportunity['exit_plan']
+                first_tp = float(exit_plan.market_price(exit_plan.tp_prices[0]))
+                final_sl = float(exit_plan.market_price(exit_plan.sl_prices[-1]))
             else:
                 first_tp = opportunity['take_profits'][0] if opportunity.get('take_profits') else None
                 final_sl = opportunity['stop_loss']
@@ -264,8 +455,11 @@ class GeniusMultiTrader:
                     self.position_manager.active_positions[symbol] = {
                         'exit_plan': opportunity['exit_plan'],
                         'order_id': order['result']['orderId'],
+                        'side': 'Buy' if opportunity['direction'] == 'LONG' else 'Sell',
+                        'quantity': quantity,  # 未決済の数量（決済ごとに減算し、照合で補正）
+                        'confirmed': False,  # 取引所のポジションで約定を確認済みか
                         'entry_time': datetime.now(),
-                        'highest_price': opportunity['price']
+                        'highest_price': opportunity['price']  # ロング前提の価格（エントリー価格は反転しても同じ）
                     }
                 
                 self.active_positions[symbol] = {
@@ -277,7 +471,9 @@ class GeniusMultiTrader:
                     'exit_strategy': opportunity.get('exit_strategy'),
                     'exit_plan': opportunity.get('exit_plan'),
                     'entry_time': datetime.now(),
-                    'confidence': opportunity['confidence']
+                    'confidence': opportunity['confidence'],
+                    'order_id': order['result']['orderId'],
+                    'confirmed': False
                 }
                 logger.info(f"  ✅ {symbol}: 注文成功!")
                 return True
@@ -289,28 +485,21 @@ class GeniusMultiTrader:
             logger.error(f"Error executing trade for {symbol}: {e}")
             return False
     
-    def _adjust_quantity(self, symbol: str, quantity: float) -> float:
-        """取引数量を最小単位に調整"""
-        # 通貨ごとの最小取引単位（例）
-        min_quantities = {
-            'BTCUSDT': 0.001,
-            'ETHUSDT': 0.01,
-            'SOLUSDT': 0.1,
-            'BNBUSDT': 0.01,
-            'XRPUSDT': 1,
-            'DOGEUSDT': 1,
-            'AVAXUSDT': 0.1,
-            'LINKUSDT': 0.1,
-            'MATICUSDT': 1,
-            'ARBUSDT': 1
-        }
-        
-        min_qty = min_quantities.get(symbol, 0.01)
-        return max(quantity - (quantity % min_qty), min_qty)
+    def _adjust_quantity(self, symbol: str, quantity: float, price: float) -> float:
+        """取引数量を取引所の数量単位に調整（最小数量・最小注文金額まで引き上げ、銘柄情報が取得できない場合は0）"""
+        instrument = self.bybit.get_instrument(symbol)
+        if instrument is None:
+            logger.warning(f"  ⚠️  {symbol}: 銘柄情報が取得できません")
+            return 0
+        return max(instrument.round_qty(quantity), instrument.min_qty(price))
     
-    def _analyze_timeframe(self, klines: List, timeframe: str) -> Dict:
-        """時間枠ごとの分析"""
-        closes = np.array([float(k['close']) for k in klines])
+    def _analyze_timeframe(self, klines: np.ndarray, timeframe: str,
+                           state: Optional[IndicatorState] = None) -> Dict:
+        """時間枠ごとの分析（指標ステートがあればそのEMAを使用）"""
+        if state is not None and state.ready:
+            return state.trend_signal()
+        
+        closes = to_kline_array(klines)['close']
         
         # EMA計算
         ema_short = self._calculate_ema(closes, 20)
@@ -335,28 +524,16 @@ class GeniusMultiTrader:
             
         return {'trend': trend, 'strength': strength}
     
-    def _find_sr_levels(self, klines: List) -> Dict:
+    def _find_sr_levels(self, klines: np.ndarray) -> Dict:
         """サポート/レジスタンスレベル検出"""
-        if not klines:
+        klines = to_kline_array(klines)
+        if len(klines) == 0:
             return {'support': [], 'resistance': []}
             
-        highs = [float(k['high']) for k in klines]
-        lows = [float(k['low']) for k in klines]
-        
-        # ピボットポイント
-        resistance = []
-        support = []
-        
-        for i in range(2, len(klines) - 2):
-            # レジスタンス（高値のピーク）
-            if highs[i] > highs[i-1] and highs[i] > highs[i-2] and \
-               highs[i] > highs[i+1] and highs[i] > highs[i+2]:
-                resistance.append(highs[i])
-            
-            # サポート（安値の谷）
-            if lows[i] < lows[i-1] and lows[i] < lows[i-2] and \
-               lows[i] < lows[i+1] and lows[i] < lows[i+2]:
-                support.append(lows[i])
+        # ピボットポイント（前後2本より高い高値 / 低い安値）
+        resistance_mask, support_mask = indicators.pivot_masks(klines['high'], klines['low'], 2)
+        resistance = klines['high'][resistance_mask].tolist()
+        support = klines['low'][support_mask].tolist()
         
         return {
             'support': sorted(set(support), reverse=True)[:3],  # 上位3つ
@@ -369,37 +546,19 @@ class GeniusMultiTrader:
             return None
         return min(levels, key=lambda x: abs(x - price))
     
-    def _calculate_rsi(self, klines: List, period: int = 14) -> float:
-        """RSI計算"""
+    def _calculate_rsi(self, klines: np.ndarray, period: int = 14,
+                       state: Optional[IndicatorState] = None) -> float:
+        """RSI計算（指標ステートがあればO(1)で取得）"""
+        if state is not None and state.rsi_period == period and state.candles >= period:
+            return state.rsi
         if len(klines) < period:
             return 50  # デフォルト
             
-        closes = [float(k['close']) for k in klines]
-        deltas = np.diff(closes)
-        gains = deltas[deltas > 0]
-        losses = -deltas[deltas < 0]
-        
-        avg_gain = np.mean(gains) if len(gains) > 0 else 0
-        avg_loss = np.mean(losses) if len(losses) > 0 else 0
-        
-        if avg_loss == 0:
-            return 100
-            
-        rs = avg_gain / avg_loss
-        rsi = 100 - (100 / (1 + rs))
-        
-        return rsi
+        return indicators.rsi(to_kline_array(klines)['close'], period)
     
     def _calculate_ema(self, data: np.ndarray, period: int) -> np.ndarray:
         """指数移動平均計算"""
-        alpha = 2 / (period + 1)
-        ema = np.zeros_like(data)
-        ema[0] = data[0]
-        
-        for i in range(1, len(data)):
-            ema[i] = alpha * data[i] + (1 - alpha) * ema[i-1]
-            
-        return ema
+        return indicators.ema(data, period)
     
     def _calculate_risk_adjustment(self, symbol: str, direction: str) -> float:
         """リスク調整係数"""
@@ -418,28 +577,16 @@ class GeniusMultiTrader:
         
         return 1.0
     
-    def _calculate_atr(self, klines: List, period: int = 14) -> float:
-        """ATR（Average True Range）計算"""
-        if not klines or len(klines) < period + 1:
+    def _calculate_atr(self, klines: np.ndarray, period: int = 14,
+                       state: Optional[IndicatorState] = None) -> float:
+        """ATR（Average True Range）計算（指標ステートがあればO(1)で取得）"""
+        if state is not None and state.atr_period == period and state.candles > period:
+            return state.atr
+        if klines is None or len(klines) < period + 1:
             return 0
         
-        true_ranges = []
-        for i in range(1, len(klines)):
-            high = float(klines[i]['high'])
-            low = float(klines[i]['low'])
-            prev_close = float(klines[i-1]['close'])
-            
-            tr = max([
-                high - low,
-                abs(high - prev_close),
-                abs(low - prev_close)
-            ])
-            true_ranges.append(tr)
-        
-        # 最新のATR値
-        if len(true_ranges) >= period:
-            return np.mean(true_ranges[-period:])
-        return 0
+        klines = to_kline_array(klines)
+        return indicators.atr(klines['high'], klines['low'], klines['close'], period)
     
     def _calculate_stop_loss_with_atr(self, price: float, direction: str, sr_levels: Dict, atr: float) -> float:
         """ATRベースのストップロス計算（Priority 1改善）"""
@@ -465,10 +612,10 @@ class GeniusMultiTrader:
         # ATRが計算できない場合は既存のロジックを使用
         return self._calculate_stop_loss(price, direction, sr_levels)
     
-    def _get_timezone_adjustment(self) -> Dict:
-        """タイムゾーンベースの戦略調整（Priority 1改善）"""
+    def _get_timezone_adjustment(self, utc_now: Optional[datetime] = None) -> Dict:
+        """タイムゾーンベースの戦略調整（Priority 1改善、utc_now省略時は現在時刻）"""
         # 現在時刻（UTC）
-        utc_now = datetime.now(pytz.UTC)
+        utc_now = utc_now or datetime.now(pytz.UTC)
         
         # 各市場の時間帯
         tokyo_tz = pytz.timezone('Asia/Tokyo')
@@ -553,7 +700,7 @@ class GeniusMultiTrader:
     
     def _calculate_position_size(self, confidence: float, risk_adj: float) -> float:
         """ポジションサイズ計算（積極的設定）"""
-        base_size = 0.15  # 基本15%（変更前: 10%）⚡リスク増加V2
+        base_size = self.BASE_POSITION_SIZE
         
         # 信頼度による調整
         if confidence > 0.7:
@@ -566,71 +713,157 @@ class GeniusMultiTrader:
         return base_size * size_multiplier * risk_adj
     
     def monitor_positions(self):
-        """Dynamic Exit Matrixによるポジション監視と段階的決済"""
-        while True:
-            try:
-                for symbol in list(self.position_manager.active_positions.keys()):
-                    # 現在価格の取得
-                    ticker = self.bybit.get_ticker(symbol)
-                    if not ticker:
-                        continue
-                    
-                    current_price = float(ticker.get('lastPrice', 0))
-                    
-                    # 決済条件のチェック
-                    actions = self.position_manager.check_exits(symbol, current_price)
-                    
-                    # 決済アクションの実行
-                    for action in actions:
-                        self._execute_exit_action(symbol, action)
-                
-                time.sleep(5)  # 5秒ごとにチェック
-                
-            except Exception as e:
-                logger.error(f"Position monitoring error: {e}")
-                time.sleep(10)
+        """Dynamic Exit Matrixによるポジション監視と段階的決済（ストリームの価格ティックで判定、未接続時はサイクルごとの on_tickers）"""
+        if self.market_mirror is not None and self.price_dispatcher.mirror is None:
+            self.price_dispatcher.attach(self.market_mirror)
     
     def _execute_exit_action(self, symbol: str, action: Dict):
-        """決済アクションの実行"""
+        """決済アクションの実行（ローカルのポジション情報で即座に決済注文を送信）"""
         try:
             position = self.position_manager.active_positions[symbol]
-            remaining_size = position['exit_plan']['execution_status']['remaining_size']
+            remaining_size = position['exit_plan'].remaining_size
             
             # 決済数量の計算
             exit_size = remaining_size * action['exit_ratio']
+            exit_qty = self._exit_quantity(symbol, position['quantity'], action['exit_ratio'])
             
             logger.info(f"\n  🎯 {action['type'].upper()}: {symbol}")
             logger.info(f"     レベル: {action.get('level', 'N/A')}")
-            logger.info(f"     数量: {exit_size:.6f} ({action['exit_ratio']*100:.0f}%)")
+            logger.info(f"     数量: {exit_qty:.6f} ({action['exit_ratio']*100:.0f}%)")
             logger.info(f"     価格: ${action['price']:,.2f}")
             logger.info(f"     理由: {action['reason']}")
             
-            # 部分決済の実行
+            # 部分決済の実行（ポジション照会を省略）
             close_order = self.bybit.close_position(
                 symbol=symbol,
-                qty=exit_size
+                qty=exit_qty,
+                side=position['side']
             )
             
             if close_order and close_order.get('success'):
-                # 実行状態の更新
-                position['exit_plan']['execution_status']['remaining_size'] -= exit_size
-                
-                if action['type'] == 'take_profit':
-                    position['exit_plan']['execution_status']['tp_executed'].append(action.get('level', 0))
-                elif action['type'] == 'stop_loss':
-                    position['exit_plan']['execution_status']['sl_executed'].append(action.get('level', 0))
-                
-                logger.info(f"  ✅ 部分決済成功!")
-                
-                # 全決済完了の場合
-                if position['exit_plan']['execution_status']['remaining_size'] <= 0:
-                    del self.position_manager.active_positions[symbol]
-                    logger.info(f"  🏁 {symbol}: ポジション完全決済")
+                with self._positions_lock:
+                    # 実行状態の更新
+                    # 執行済みのレベルは check_exits で記録済み
+                    position['exit_plan'].remaining_size -= exit_size
+                    position['quantity'] -= exit_qty
+                    
+                    logger.info(f"  ✅ 部分決済成功!")
+                    
+                    # 全決済完了の場合
+                    if position['exit_plan'].remaining_size <= 0 or position['quantity'] <= 0:
+                        self.position_manager.active_positions.pop(symbol, None)
+                        self.active_positions.pop(symbol, None)
+                        logger.info(f"  🏁 {symbol}: ポジション完全決済")
             else:
                 logger.error(f"  ❌ 部分決済失敗: {close_order}")
+            
+            # 約定結果は取引所のポジションと後から照合（プライベートストリーム受信中はイベントで反映）
+            if not (self.account_state and self.account_state.live):
+                self._reconcile_executor.submit(self._reconcile_position, symbol)
                 
         except Exception as e:
             logger.error(f"Exit action error for {symbol}: {e}")
+    
+    def _exit_quantity(self, symbol: str, quantity: float, exit_ratio: float) -> float:
+        """決済数量（数量単位に丸め、残りが最小数量未満になる場合は全量）"""
+        if exit_ratio >= 1.0:
+            return quantity
+        instrument = self.bybit.get_instrument(symbol)
+        if instrument is None:
+            return quantity * exit_ratio
+        exit_qty = max(instrument.round_qty(quantity * exit_ratio), instrument.min_order_qty)
+        if quantity - exit_qty < instrument.min_order_qty:
+            return quantity
+        return exit_qty
+    
+    def _reconcile_position(self, symbol: str):
+        """取引所のポジションとローカルの追跡状態を照合"""
+        try:
+            time.sleep(self.RECONCILE_DELAY)  # 約定がポジションに反映されるのを待つ
+            positions = self.bybit.get_positions(symbol=symbol)
+            actual = next((p for p in positions if p['symbol'] == symbol), None)
+            
+            with self._positions_lock:
+                position = self.position_manager.active_positions.get(symbol)
+                
+                if actual is None:
+                    # 取引所側で決済済み（IOCの全量約定・SL/TP約定など）
+                    if self.position_manager.active_positions.pop(symbol, None) is not None:
+                        logger.info(f"  🔄 {symbol}: 取引所でポジション決済済みのため追跡を終了")
+                    self.active_positions.pop(symbol, None)
+                    return
+                
+                if position is not None and abs(position['quantity'] - actual['size']) > 1e-12:
+                    logger.info(f"  🔄 {symbol}: 数量を補正 {position['quantity']:.6f} → {actual['size']:.6f}")
+                    position['quantity'] = actual['size']
+                    position['side'] = actual['side']
+                if symbol in self.active_positions:
+                    self.active_positions[symbol]['quantity'] = actual['size']
+                
+        except Exception as e:
+            logger.error(f"Reconcile error for {symbol}: {e}")
+    
+    def _on_position_update(self, records: List[Dict]):
+        """プライベートストリームのポジション更新を反映"""
+        for pos in records:
+            if pos.get('category', 'linear') != 'linear':
+                continue
+            symbol = pos['symbol']
+            size = float(pos.get('size') or 0)
+            with self._positions_lock:
+                managed = self.position_manager.active_positions.get(symbol)
+                tracked = self.active_positions.get(symbol)
+                if managed is None and tracked is None:
+                    continue
+                
+                if size <= 0:
+                    # 約定確認前のサイズ0はレバレッジ変更などによる通知なので無視
+                    if not (tracked or managed).get('confirmed'):
+                        continue
+                    self.position_manager.active_positions.pop(symbol, None)
+                    self.active_positions.pop(symbol, None)
+                    logger.info(f"  🏁 {symbol}: ポジション決済を確認")
+                    continue
+                
+                entry_price = float(pos.get('entryPrice') or pos.get('avgPrice') or 0)
+                if managed is not None:
+                    managed['quantity'] = size
+                    managed['side'] = pos.get('side') or managed['side']
+                    managed['confirmed'] = True
+                if tracked is not None:
+                    tracked['quantity'] = size
+                    if entry_price:
+                        tracked['entry_price'] = entry_price
+                    tracked['confirmed'] = True
+    
+    def _on_order_update(self, records: List[Dict]):
+        """約定せずに終了したエントリー注文のポジションを取り消す"""
+        for order in records:
+            if order.get('orderStatus') not in ('Cancelled', 'Rejected', 'Deactivated', 'PartiallyFilledCanceled'):
+                continue
+            symbol = order.get('symbol')
+            with self._positions_lock:
+                tracked = self.active_positions.get(symbol)
+                if tracked is None or tracked.get('order_id') != order.get('orderId'):
+                    continue
+                if float(order.get('cumExecQty') or 0) == 0:
+                    self.active_positions.pop(symbol, None)
+                    self.position_manager.active_positions.pop(symbol, None)
+                    logger.warning(f"  ⚠️  {symbol}: 注文が約定せず終了 ({order.get('orderStatus')}: {order.get('rejectReason', '')})")
+    
+    def _on_execution(self, records: List[Dict]):
+        """約定の記録"""
+        for execution in records:
+            if execution.get('execType', 'Trade') != 'Trade' or execution.get('symbol') not in self.active_positions:
+                continue
+            logger.info(f"  💱 {execution['symbol']}: {execution.get('side')} {execution.get('execQty')} @ {execution.get('execPrice')} 約定")
+    
+    def _on_account_stream_connected(self, records: List[Dict]):
+        """(再)接続時は切断中のイベントが届かないため、追跡中のポジションをRESTで照合"""
+        with self._positions_lock:
+            symbols = list(dict.fromkeys(list(self.active_positions) + list(self.position_manager.active_positions)))
+        for symbol in symbols:
+            self._reconcile_executor.submit(self._reconcile_position, symbol)
 
 
 def main():
@@ -647,7 +880,42 @@ def main():
         testnet=False
     )
     
-    trader = GeniusMultiTrader(bybit)
+    # KLINE_RESAMPLE_BASEを指定すると上位足をその足から生成（例: 5 → 15/60/240/D）
+    if os.getenv('KLINE_RESAMPLE_BASE'):
+        bybit.enable_resampling(os.getenv('KLINE_RESAMPLE_BASE'))
+    
+    # MARKET_STREAM=1 で価格・板・ローソク足をWebSocketで受信（REST ポーリングを置き換え）
+    market_stream = None
+    if os.getenv('MARKET_STREAM', '0') == '1':
+        mirror = MarketDataMirror()
+        bybit.attach_market_mirror(mirror)
+        # リサンプリング時は基準足だけ購読すれば上位足も最新になる
+        intervals = [bybit.resample_base] if bybit.resample_base else list(GeniusMultiTrader.TIMEFRAMES) + ['D']
+        market_stream = PublicMarketStream(mirror, url=os.getenv('BYBIT_PUBLIC_WS_URL'), intervals=intervals)
+    
+    # ACCOUNT_STREAM=1 で約定・注文・ポジション・残高をプライベートストリームで受信
+    account_state = None
+    account_stream = None
+    if os.getenv('ACCOUNT_STREAM', '0') == '1':
+        account_state = AccountState()
+        account_stream = PrivateAccountStream(
+            account_state, os.getenv('BYBIT_API_KEY'), os.getenv('BYBIT_API_SECRET'),
+            url=os.getenv('BYBIT_PRIVATE_WS_URL')
+        )
+    
+    async_bybit = AsyncBybitService.from_service(bybit, max_concurrency=10)
+    trader = GeniusMultiTrader(
+        bybit, async_bybit,
+        streaming_indicators=os.getenv('STREAMING_INDICATORS', '0') == '1',
+        market_mirror=bybit.market_mirror,
+        account_state=account_state
+    )
+    if account_stream:
+        account_stream.start(timeout=10)
+    
+    # 銘柄情報（数量単位・価格単位・最大レバレッジ）と現在のレバレッジを取得
+    bybit.load_instruments()
+    bybit.load_leverage_cache()
     
     # 残高確認
     balance = bybit.get_balance()
@@ -660,13 +928,16 @@ def main():
         'DOGEUSDT', 'AVAXUSDT', 'LINKUSDT', 'MATICUSDT', 'ARBUSDT'
     ]
     
-    # 天才の閾値（厳しめ）
-    thresholds = {
-        'BTCUSDT': 0.60,   # メジャー通貨は慎重に
-        'ETHUSDT': 0.58,
-        'SOLUSDT': 0.55,
-        'default': 0.50    # その他は50%以上
-    }
+    # SCAN_UNIVERSE_SIZEを指定すると24h売買代金上位のUSDT無期限を毎サイクル自動選択
+    universe_size = int(os.getenv('SCAN_UNIVERSE_SIZE', '0'))
+    
+    if market_stream:
+        market_stream.set_symbols(symbols)
+        market_stream.start(timeout=10)
+    
+    # ポジション監視（Dynamic Exit Matrix）をスキャンと同じプロセスで開始
+    logger.info("🔍 Starting Dynamic Exit Matrix position monitor...")
+    trader.monitor_positions()
     
     # メインループ
     while True:
@@ -675,9 +946,24 @@ def main():
             logger.info(f"🧠 Genius Analysis Started...")
             
             opportunities = []
+            trader.cycle_cache.new_cycle()
+            
+            # 残高はプライベートストリームの最新値を使用
+            if account_state and account_state.available_balance() is not None:
+                usdt_balance = account_state.available_balance()
+            
+            # サイクル開始時にティッカーを一括取得（以降の参照はすべてこのスナップショット）
+            tickers = bybit.refresh_tickers()
+            trader.price_dispatcher.on_tickers(tickers)
+            if universe_size:
+                symbols = trader.select_universe(tickers, universe_size)
+                logger.info(f"🌐 Universe: {len(symbols)} symbols")
+            if market_stream:
+                # 保有中の通貨は決済判定のため購読を続ける
+                market_stream.set_symbols(symbols + list(trader.position_manager.active_positions))
             
-            # ビットコインのトレンドを先に確認（Priority 1改善）
-            btc_result = trader.analyze_genius('BTCUSDT')
+            # ビットコインのトレンドを先に確認（Priority 1改善、結果はスキャンで再利用）
+            btc_result = asyncio.run(trader.analyze_genius_async('BTCUSDT'))
             if btc_result:
                 btc_change = btc_result['change_24h']
                 if btc_change < -0.02:  # -2%以下
@@ -688,10 +974,13 @@ def main():
                     trader.btc_trend = 'neutral'
                 logger.info(f"📊 BTC Trend: {trader.btc_trend} ({btc_change:+.2%})")
             
+            # 全通貨・全時間足を同時に取得して分析
+            scan_results = asyncio.run(trader.scan_async(symbols))
+            
             for symbol in symbols:
-                result = trader.analyze_genius(symbol)
+                result = scan_results.get(symbol)
                 if result:
-                    threshold = thresholds.get(symbol, thresholds['default'])
+                    threshold = trader.THRESHOLDS.get(symbol, trader.THRESHOLDS['default'])
                     
                     logger.info(f"\n{symbol}:")
                     logger.info(f"  Price: ${result['price']:,.2f}")
@@ -703,6 +992,7 @@ def main():
                         logger.info(f"  ATR: ${result['atr']:,.2f}")
                     
                     if result['confidence'] >= threshold:
+                        trader.plan_exits(result)
                         logger.info(f"  ✅ OPPORTUNITY FOUND!")
                         logger.info(f"  Stop Loss: ${result['stop_loss']:,.2f}")
                         logger.info(f"  Take Profits: {[f'${tp:,.2f}' for tp in result['take_profits']]}")
@@ -720,8 +1010,6 @@ def main():
                         # 実際の取引を実行
                         if trader.execute_trade(result, usdt_balance):
                             logger.info(f"  🎯 取引実行完了!")
-                
-                time.sleep(1)  # API制限
             
             # 機会のサマリー
             if opportunities:
@@ -735,9 +1023,11 @@ def main():
             # アクティブポジション表示と管理
             if trader.active_positions:
                 logger.info(f"\n📊 Active Positions: {len(trader.active_positions)}")
+                # サイクル開始時のスナップショット（ストリーム受信中は最新値で上書き）を再利用
+                tickers = bybit.get_all_tickers(max_age=float('inf'))
                 for symbol, pos in trader.active_positions.items():
                     # 現在価格を取得
-                    ticker = bybit.get_ticker(symbol)
+                    ticker = tickers.get(symbol)
                     if ticker:
                         current_price = float(ticker.get('lastPrice', pos['entry_price']))
                         pnl = (current_price / pos['entry_price'] - 1) * 100
@@ -752,31 +1042,23 @@ def main():
                             if recommendations['recommendations']:
                                 logger.info(f"    💡 推奨: {recommendations['recommendations'][0]['reason']}")
             
+            logger.info(f"\n🗂️  Cycle cache: {trader.cycle_cache.summary()}")
+            for name, pool in bybit.get_pool_stats().items():
+                if pool['p50_ms'] is not None:
+                    logger.info(f"🔌 HTTP {name}: {pool['requests']} req, {pool['connections_opened']} conn, "
+                               f"p50 {pool['p50_ms']:.0f}ms / p99 {pool['p99_ms']:.0f}ms, errors {pool['errors']}")
+            
             # 5分待機
             logger.info(f"\n💤 Next analysis in 5 minutes...")
             time.sleep(300)
             
         except KeyboardInterrupt:
             logger.info("\n👋 Shutting down...")
+            trader.price_dispatcher.stop()
             break
         except Exception as e:
             logger.error(f"Error: {e}")
             time.sleep(60)
 
 if __name__ == "__main__":
-    import threading
-    
-    # メインの取引スレッド
-    main_thread = threading.Thread(target=main)
-    main_thread.start()
-    
-    # ポジション監視スレッド（Dynamic Exit Matrix）
-    logger.info("🔍 Starting Dynamic Exit Matrix position monitor...")
-    
-    # メインループが開始してtraderインスタンスが作成されるまで待機
-    time.sleep(10)
-    
-    # 注：実際の実装では、traderインスタンスをグローバルに共有するか、
-    # より適切な方法でポジション監視を統合する必要があります
-    
-    main_thread.join()
\ No newline at end of file
+    main()
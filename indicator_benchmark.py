@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+指標カーネルの整合性チェックとマイクロベンチマーク
+旧実装（Pythonループ版）と indicators モジュールの結果・速度を比較
+"""
+
+import time
+import logging
+import numpy as np
+from typing import Dict, List
+
+import indicators
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 分析1回あたりの時間足と本数（GeniusMultiTrader.TIMEFRAMES と同じ）
+TIMEFRAMES = {'5': 60, '15': 96, '60': 168, '240': 180}
+DAILY_LIMIT = 30
+
+
+# ===== 旧実装（GeniusMultiTraderのPythonループ版） =====
+
+def reference_ema(data: np.ndarray, period: int) -> np.ndarray:
+    alpha = 2 / (period + 1)
+    ema = np.zeros_like(data)
+    ema[0] = data[0]
+    for i in range(1, len(data)):
+        ema[i] = alpha * data[i] + (1 - alpha) * ema[i-1]
+    return ema
+
+def reference_atr(klines: List[Dict], period: int = 14) -> float:
+    if not klines or len(klines) < period + 1:
+        return 0
+    true_ranges = []
+    for i in range(1, len(klines)):
+        high = float(klines[i]['high'])
+        low = float(klines[i]['low'])
+        prev_close = float(klines[i-1]['close'])
+        true_ranges.append(max([high - low, abs(high - prev_close), abs(low - prev_close)]))
+    if len(true_ranges) >= period:
+        return np.mean(true_ranges[-period:])
+    return 0
+
+def reference_rsi(klines: List[Dict], period: int = 14) -> float:
+    if len(klines) < period:
+        return 50
+    closes = [float(k['close']) for k in klines]
+    deltas = np.diff(closes)
+    gains = deltas[deltas > 0]
+    losses = -deltas[deltas < 0]
+    avg_gain = np.mean(gains) if len(gains) > 0 else 0
+    avg_loss = np.mean(losses) if len(losses) > 0 else 0
+    if avg_loss == 0:
+        return 100
+    return 100 - (100 / (1 + avg_gain / avg_loss))
+
+def reference_wilder_rsi(closes: np.ndarray, period: int = 14) -> np.ndarray:
+    out = np.full(len(closes), np.nan)
+    deltas = np.diff(closes)
+    avg_gain = np.mean(np.where(deltas[:period] > 0, deltas[:period], 0))
+    avg_loss = np.mean(np.where(deltas[:period] < 0, -deltas[:period], 0))
+    for i in range(period, len(closes)):
+        if i > period:
+            delta = deltas[i - 1]
+            avg_gain = (avg_gain * (period - 1) + max(delta, 0)) / period
+            avg_loss = (avg_loss * (period - 1) + max(-delta, 0)) / period
+        out[i] = 100.0 if avg_loss == 0 else 100 - 100 / (1 + avg_gain / avg_loss)
+    return out
+
+def reference_pivots(klines: List[Dict]) -> Dict:
+    highs = [float(k['high']) for k in klines]
+    lows = [float(k['low']) for k in klines]
+    resistance, support = [], []
+    for i in range(2, len(klines) - 2):
+        if highs[i] > highs[i-1] and highs[i] > highs[i-2] and \
+           highs[i] > highs[i+1] and highs[i] > highs[i+2]:
+            resistance.append(highs[i])
+        if lows[i] < lows[i-1] and lows[i] < lows[i-2] and \
+           lows[i] < lows[i+1] and lows[i] < lows[i+2]:
+            support.append(lows[i])
+    return {'support': support, 'resistance': resistance}
+
+
+# ===== テストデータ =====
+
+def generate_klines(count: int, base_price: float = 100.0, seed: int = 0) -> List[Dict]:
+    """ランダムウォークのローソク足"""
+    rng = np.random.default_rng(seed)
+    closes = base_price * np.exp(np.cumsum(rng.normal(0, 0.01, count)))
+    opens = np.concatenate([[base_price], closes[:-1]])
+    highs = np.maximum(opens, closes) * (1 + rng.uniform(0, 0.005, count))
+    lows = np.minimum(opens, closes) * (1 - rng.uniform(0, 0.005, count))
+    volumes = rng.uniform(1000, 2000, count)
+    return [
+        {'open': o, 'high': h, 'low': l, 'close': c, 'volume': v}
+        for o, h, l, c, v in zip(opens, highs, lows, closes, volumes)
+    ]
+
+def columns(klines: List[Dict]) -> Dict[str, np.ndarray]:
+    return {key: np.array([k[key] for k in klines]) for key in ('high', 'low', 'close')}
+
+
+# ===== 整合性チェック =====
+
+def check_parity(trials: int = 200) -> bool:
+    """旧実装との数値一致を確認"""
+    logger.info("🔍 整合性チェック")
+    failures = 0
+
+    for seed in range(trials):
+        klines = generate_klines(50 + seed * 5, seed=seed)
+        cols = columns(klines)
+
+        for period in (2, 14, 20, 50):
+            if not np.allclose(indicators.ema(cols['close'], period),
+                               reference_ema(cols['close'], period), rtol=1e-10, atol=0):
+                failures += 1
+                logger.error(f"  ❌ EMA mismatch (seed={seed}, period={period})")
+
+        if not np.isclose(indicators.atr(cols['high'], cols['low'], cols['close'], 14),
+                          reference_atr(klines, 14), rtol=1e-10):
+            failures += 1
+            logger.error(f"  ❌ ATR mismatch (seed={seed})")
+
+        if not np.isclose(indicators.rsi(cols['close'][-14:]), reference_rsi(klines[-14:]), rtol=1e-10):
+            failures += 1
+            logger.error(f"  ❌ RSI mismatch (seed={seed})")
+
+        if not np.allclose(indicators.wilder_rsi(cols['close']), reference_wilder_rsi(cols['close']),
+                           rtol=1e-9, equal_nan=True):
+            failures += 1
+            logger.error(f"  ❌ Wilder RSI mismatch (seed={seed})")
+
+        resistance, support = indicators.pivot_masks(cols['high'], cols['low'], 2)
+        expected = reference_pivots(klines)
+        if cols['high'][resistance].tolist() != expected['resistance'] or \
+           cols['low'][support].tolist() != expected['support']:
+            failures += 1
+            logger.error(f"  ❌ Pivot mismatch (seed={seed})")
+
+    # 2次元入力は各行を個別に計算した結果と一致する
+    matrix = np.array([columns(generate_klines(180, seed=s))['close'] for s in range(8)])
+    if not np.allclose(indicators.ema(matrix, 20), np.array([reference_ema(row, 20) for row in matrix]), rtol=1e-10):
+        failures += 1
+        logger.error("  ❌ 2-D EMA mismatch")
+
+    if failures:
+        logger.error(f"  ❌ {failures}件の不一致")
+        return False
+    logger.info(f"  ✅ {trials}ケースすべて一致")
+    return True
+
+
+# ===== ベンチマーク =====
+
+def analyze_reference(mtf: Dict[str, List[Dict]], daily: List[Dict]):
+    """旧実装での1通貨分の指標計算"""
+    for klines in mtf.values():
+        closes = np.array([float(k['close']) for k in klines])
+        reference_ema(closes, 20)
+        reference_ema(closes, 50)
+    reference_pivots(daily)
+    reference_atr(daily, 14)
+    reference_rsi(daily[-14:])
+
+def analyze_vectorized(mtf: Dict[str, Dict[str, np.ndarray]], daily: Dict[str, np.ndarray]):
+    """indicatorsモジュールでの1通貨分の指標計算"""
+    for cols in mtf.values():
+        indicators.ema(cols['close'], 20)
+        indicators.ema(cols['close'], 50)
+    indicators.pivot_masks(daily['high'], daily['low'], 2)
+    indicators.atr(daily['high'], daily['low'], daily['close'], 14)
+    indicators.rsi(daily['close'][-14:])
+
+def benchmark(iterations: int = 2000, lookback_scale: int = 1):
+    """1通貨あたりの分析コストを比較"""
+    mtf = {tf: generate_klines(limit * lookback_scale, seed=i) for i, (tf, limit) in enumerate(TIMEFRAMES.items())}
+    daily = generate_klines(DAILY_LIMIT * lookback_scale, seed=99)
+    mtf_cols = {tf: columns(k) for tf, k in mtf.items()}
+    daily_cols = columns(daily)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        analyze_reference(mtf, daily)
+    reference_time = (time.perf_counter() - start) / iterations
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        analyze_vectorized(mtf_cols, daily_cols)
+    vectorized_time = (time.perf_counter() - start) / iterations
+
+    logger.info(f"\n⏱️  1通貨あたりの指標計算（ルックバック×{lookback_scale}）")
+    logger.info(f"  旧実装:       {reference_time * 1e6:8.1f} µs")
+    logger.info(f"  ベクトル化版: {vectorized_time * 1e6:8.1f} µs")
+    logger.info(f"  高速化:       {reference_time / vectorized_time:8.1f}x")
+
+
+def main():
+    logger.info("="*60)
+    logger.info("📐 Indicator kernel parity & benchmark")
+    logger.info("="*60)
+    check_parity()
+    benchmark(iterations=2000, lookback_scale=1)
+    benchmark(iterations=200, lookback_scale=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+ストリーミング指標ステート
+確定足ごとに EMA・ATR・RSI を O(1) で更新し、ルックバック長に依存しない分析を可能にする
+"""
+
+import threading
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+import indicators
+from services.kline_cache import to_kline_array
+
+class IndicatorState:
+    """1通貨・1時間足分の指標ステート"""
+
+    def __init__(self, ema_short_period: int = 20, ema_long_period: int = 50,
+                 atr_period: int = 14, rsi_period: int = 14, trend_lookback: int = 5):
+        self.ema_short_period = ema_short_period
+        self.ema_long_period = ema_long_period
+        self.atr_period = atr_period
+        self.rsi_period = rsi_period
+        self.trend_lookback = trend_lookback
+
+        self._alpha_short = 2 / (ema_short_period + 1)
+        self._alpha_long = 2 / (ema_long_period + 1)
+
+        self.last_timestamp: Optional[int] = None
+        self.last_close: Optional[float] = None
+        self.candles = 0
+
+        # トレンド判定用に直近のEMA値を保持
+        self.ema_short_history = deque(maxlen=trend_lookback)
+        self.ema_long_history = deque(maxlen=trend_lookback)
+
+        # ATR: 直近atr_period本のTrue Rangeとその合計
+        self._true_ranges = deque(maxlen=atr_period)
+        self._tr_sum = 0.0
+
+        # RSI（既存仕様）: 直近rsi_period本の終値に含まれる値幅の上昇/下落の合計と本数
+        self._deltas = deque(maxlen=rsi_period - 1)
+        self._gain_sum = 0.0
+        self._gain_count = 0
+        self._loss_sum = 0.0
+        self._loss_count = 0
+
+        # Wilder平滑化の平均上昇幅/下落幅
+        self.avg_gain: Optional[float] = None
+        self.avg_loss: Optional[float] = None
+        self._seed_gains = []
+        self._seed_losses = []
+
+    @classmethod
+    def from_klines(cls, klines, **kwargs) -> "IndicatorState":
+        """過去の確定足からステートを初期化"""
+        state = cls(**kwargs)
+        state.seed(klines)
+        return state
+
+    def seed(self, klines):
+        """確定足の履歴でステートを初期化（EMAはベクトル化計算の最終値を採用）"""
+        klines = to_kline_array(klines)
+        if len(klines) == 0:
+            return
+
+        closes = klines['close']
+        ema_short = indicators.ema(closes, self.ema_short_period)
+        ema_long = indicators.ema(closes, self.ema_long_period)
+        self.ema_short_history.extend(ema_short[-self.trend_lookback:].tolist())
+        self.ema_long_history.extend(ema_long[-self.trend_lookback:].tolist())
+
+        # ATR・RSIは末尾の窓だけを逐次投入
+        tail = max(self.atr_period, self.rsi_period) + 1
+        highs, lows = klines['high'].tolist(), klines['low'].tolist()
+        closes_list = closes.tolist()
+        start = max(len(closes_list) - tail, 0)
+        prev_close = closes_list[start]
+        for i in range(start + 1, len(closes_list)):
+            self._push_true_range(highs[i], lows[i], prev_close)
+            self._push_delta(closes_list[i] - prev_close)
+            prev_close = closes_list[i]
+
+        # Wilder RSIは全履歴の平滑化値を引き継ぐ
+        if len(closes) > self.rsi_period:
+            deltas = np.diff(closes)
+            gains = np.where(deltas > 0, deltas, 0.0)
+            losses = np.where(deltas < 0, -deltas, 0.0)
+            seed_gain = gains[:self.rsi_period].mean()
+            seed_loss = losses[:self.rsi_period].mean()
+            wilder_period = 2 * self.rsi_period - 1
+            self.avg_gain = float(indicators.ema(np.concatenate([[seed_gain], gains[self.rsi_period:]]), wilder_period)[-1])
+            self.avg_loss = float(indicators.ema(np.concatenate([[seed_loss], losses[self.rsi_period:]]), wilder_period)[-1])
+        else:
+            deltas = np.diff(closes)
+            self._seed_gains = np.where(deltas > 0, deltas, 0.0).tolist()
+            self._seed_losses = np.where(deltas < 0, -deltas, 0.0).tolist()
+
+        self.last_timestamp = int(klines['timestamp'][-1])
+        self.last_close = closes_list[-1]
+        self.candles = len(closes_list)
+
+    def update(self, timestamp: int, high: float, low: float, close: float) -> bool:
+        """確定足1本でステートを更新（既に反映済みの足は無視して False を返す）"""
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            return False
+
+        if self.last_close is None:
+            # 最初の1本: EMAの初期値
+            self.ema_short_history.append(close)
+            self.ema_long_history.append(close)
+        else:
+            prev_short = self.ema_short_history[-1]
+            prev_long = self.ema_long_history[-1]
+            self.ema_short_history.append(self._alpha_short * close + (1 - self._alpha_short) * prev_short)
+            self.ema_long_history.append(self._alpha_long * close + (1 - self._alpha_long) * prev_long)
+
+            delta = close - self.last_close
+            self._push_true_range(high, low, self.last_close)
+            self._push_delta(delta)
+            self._update_wilder(delta)
+
+        self.last_timestamp = timestamp
+        self.last_close = close
+        self.candles += 1
+        return True
+
+    def _push_true_range(self, high: float, low: float, prev_close: float):
+        tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        if len(self._true_ranges) == self._true_ranges.maxlen:
+            self._tr_sum -= self._true_ranges[0]
+        self._true_ranges.append(tr)
+        self._tr_sum += tr
+
+    def _push_delta(self, delta: float):
+        if len(self._deltas) == self._deltas.maxlen:
+            old = self._deltas[0]
+            if old > 0:
+                self._gain_sum -= old
+                self._gain_count -= 1
+            elif old < 0:
+                self._loss_sum += old
+                self._loss_count -= 1
+        self._deltas.append(delta)
+        if delta > 0:
+            self._gain_sum += delta
+            self._gain_count += 1
+        elif delta < 0:
+            self._loss_sum -= delta
+            self._loss_count += 1
+
+    def _update_wilder(self, delta: float):
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        if self.avg_gain is None:
+            self._seed_gains.append(gain)
+            self._seed_losses.append(loss)
+            if len(self._seed_gains) == self.rsi_period:
+                self.avg_gain = sum(self._seed_gains) / self.rsi_period
+                self.avg_loss = sum(self._seed_losses) / self.rsi_period
+                self._seed_gains, self._seed_losses = [], []
+        else:
+            self.avg_gain = (self.avg_gain * (self.rsi_period - 1) + gain) / self.rsi_period
+            self.avg_loss = (self.avg_loss * (self.rsi_period - 1) + loss) / self.rsi_period
+
+    @property
+    def ready(self) -> bool:
+        """トレンド判定に必要な本数が揃っているか"""
+        return len(self.ema_short_history) >= self.trend_lookback
+
+    @property
+    def ema_short(self) -> Optional[float]:
+        return self.ema_short_history[-1] if self.ema_short_history else None
+
+    @property
+    def ema_long(self) -> Optional[float]:
+        return self.ema_long_history[-1] if self.ema_long_history else None
+
+    @property
+    def atr(self) -> float:
+        """直近atr_period本のTrue Rangeの平均（本数不足なら0）"""
+        if len(self._true_ranges) < self.atr_period:
+            return 0
+        return self._tr_sum / self.atr_period
+
+    @property
+    def rsi(self) -> float:
+        """直近rsi_period本の終値によるRSI（GeniusMultiTrader._calculate_rsiと同じ仕様）"""
+        if len(self._deltas) < self._deltas.maxlen:
+            return 50
+        avg_gain = self._gain_sum / self._gain_count if self._gain_count else 0
+        avg_loss = self._loss_sum / self._loss_count if self._loss_count else 0
+        if avg_loss == 0:
+            return 100
+        return 100 - (100 / (1 + avg_gain / avg_loss))
+
+    @property
+    def wilder_rsi(self) -> Optional[float]:
+        """Wilder平滑化RSI（初期化前はNone）"""
+        if self.avg_gain is None:
+            return None
+        if self.avg_loss == 0:
+            return 100.0
+        return 100 - 100 / (1 + self.avg_gain / self.avg_loss)
+
+    def trend_signal(self) -> Dict:
+        """EMAクロスによるトレンド判定（_analyze_timeframeと同じ規則）"""
+        short_now, long_now = self.ema_short_history[-1], self.ema_long_history[-1]
+        short_past, long_past = self.ema_short_history[0], self.ema_long_history[0]
+
+        if short_now > long_now and short_past <= long_past:
+            return {'trend': 'BULLISH', 'strength': 0.8}
+        elif short_now < long_now and short_past >= long_past:
+            return {'trend': 'BEARISH', 'strength': 0.8}
+        elif short_now > long_now:
+            return {'trend': 'BULLISH', 'strength': 0.5}
+        elif short_now < long_now:
+            return {'trend': 'BEARISH', 'strength': 0.5}
+        return {'trend': 'NEUTRAL', 'strength': 0.3}
+
+class IndicatorStateStore:
+    """(通貨, 時間足) ごとの指標ステート管理"""
+
+    def __init__(self, **state_kwargs):
+        self.state_kwargs = state_kwargs
+        self._states: Dict[Tuple[str, str], IndicatorState] = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbol: str, timeframe: str) -> Optional[IndicatorState]:
+        return self._states.get((symbol, timeframe))
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def update_from_klines(self, symbol: str, timeframe: str, klines,
+                           last_is_forming: bool = True) -> IndicatorState:
+        """
+        ローソク足配列から未反映の確定足だけをステートに投入
+        last_is_forming=True の場合、末尾の足は形成中とみなして除外する
+        """
+        klines = to_kline_array(klines)
+        if last_is_forming and len(klines) > 0:
+            klines = klines[:-1]
+
+        with self._lock:
+            state = self._states.get((symbol, timeframe))
+            if state is None:
+                state = IndicatorState.from_klines(klines, **self.state_kwargs)
+                self._states[(symbol, timeframe)] = state
+                return state
+
+        if state.last_timestamp is not None and len(klines) > 0:
+            klines = klines[klines['timestamp'] > state.last_timestamp]
+        for row in klines:
+            state.update(int(row['timestamp']), float(row['high']), float(row['low']), float(row['close']))
+        return state
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+テクニカル指標カーネル（NumPyベクトル化版）
+EMA・ATR・RSI・ピボット検出を Python ループなしで計算
+すべての関数は最後の軸を時間軸として扱うため、(通貨数 × 本数) の2次元配列もそのまま渡せる
+"""
+
+import numpy as np
+from typing import Tuple
+
+# EMAのブロック長の上限（ブロック内は閉形式、ブロック間のみ逐次）
+_EMA_MAX_BLOCK = 256
+
+def ema(values: np.ndarray, period: int) -> np.ndarray:
+    """
+    指数移動平均（ema[0] = values[0] から開始）
+    ema[i] = alpha * x[i] + (1 - alpha) * ema[i-1] をブロック単位の累積和で計算
+    """
+    x = np.asarray(values, dtype=np.float64)
+    out = np.empty_like(x)
+    n = x.shape[-1] if x.ndim else 0
+    if n == 0:
+        return out
+
+    alpha = 2 / (period + 1)
+    decay = 1 - alpha
+    if decay <= 0:
+        out[...] = x
+        return out
+
+    # decay^-block がオーバーフローしない範囲でブロック長を決める
+    block = int(max(1, min(_EMA_MAX_BLOCK, 600 / -np.log(decay))))
+    powers = decay ** np.arange(block + 1)
+    inverse_powers = 1 / powers[:block]
+
+    out[..., 0] = x[..., 0]
+    prev = x[..., 0]
+    start = 1
+    while start < n:
+        stop = min(start + block, n)
+        m = stop - start
+        weighted = np.cumsum(x[..., start:stop] * inverse_powers[:m], axis=-1)
+        out[..., start:stop] = (
+            powers[1:m + 1] * prev[..., None] + alpha * powers[:m] * weighted
+        )
+        prev = out[..., stop - 1]
+        start = stop
+
+    return out
+
+def true_range(highs: np.ndarray, lows: np.ndarray, closes: np.ndarray) -> np.ndarray:
+    """True Range（2本目以降、長さ n-1）"""
+    highs = np.asarray(highs, dtype=np.float64)
+    lows = np.asarray(lows, dtype=np.float64)
+    prev_close = np.asarray(closes, dtype=np.float64)[..., :-1]
+    high = highs[..., 1:]
+    low = lows[..., 1:]
+    return np.maximum(
+        high - low,
+        np.maximum(np.abs(high - prev_close), np.abs(low - prev_close))
+    )
+
+def atr(highs: np.ndarray, lows: np.ndarray, closes: np.ndarray, period: int = 14):
+    """最新のATR（直近period本のTrue Rangeの単純平均、本数不足なら0）"""
+    highs = np.asarray(highs, dtype=np.float64)
+    if highs.shape[-1] < period + 1:
+        return 0 if highs.ndim <= 1 else np.zeros(highs.shape[:-1])
+    tr = true_range(highs, lows, closes)
+    return tr[..., -period:].mean(axis=-1)
+
+def atr_series(highs: np.ndarray, lows: np.ndarray, closes: np.ndarray, period: int = 14) -> np.ndarray:
+    """各時点のATR系列（元の本数と同じ長さ、計算できない先頭はNaN）"""
+    tr = true_range(highs, lows, closes)
+    out = np.full(tr.shape[:-1] + (tr.shape[-1] + 1,), np.nan)
+    if tr.shape[-1] < period:
+        return out
+    csum = np.cumsum(tr, axis=-1)
+    window = csum[..., period - 1:].copy()
+    window[..., 1:] -= csum[..., :-period]
+    out[..., period:] = window / period
+    return out
+
+def rsi(closes: np.ndarray, period: int = 14):
+    """
+    RSI（分析ロジック既存仕様）
+    渡された終値全体の上昇幅平均・下落幅平均から計算（本数不足なら50）
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    if closes.shape[-1] < period:
+        return 50 if closes.ndim <= 1 else np.full(closes.shape[:-1], 50.0)
+
+    deltas = np.diff(closes, axis=-1)
+    gains = deltas > 0
+    losses = deltas < 0
+    gain_count = gains.sum(axis=-1)
+    loss_count = losses.sum(axis=-1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_gain = np.where(gain_count > 0, np.where(gains, deltas, 0).sum(axis=-1) / np.maximum(gain_count, 1), 0)
+        avg_loss = np.where(loss_count > 0, np.where(losses, -deltas, 0).sum(axis=-1) / np.maximum(loss_count, 1), 0)
+        result = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + avg_gain / np.where(avg_loss == 0, 1, avg_loss)))
+
+    return float(result) if result.ndim == 0 else result
+
+def wilder_rsi(closes: np.ndarray, period: int = 14) -> np.ndarray:
+    """
+    Wilder平滑化RSI系列（元の本数と同じ長さ、先頭period本はNaN）
+    平均上昇幅・下落幅は period本の単純平均で初期化し、以降 1/period で平滑化
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    out = np.full(closes.shape, np.nan)
+    if closes.shape[-1] <= period:
+        return out
+
+    deltas = np.diff(closes, axis=-1)
+    gains = np.where(deltas > 0, deltas, 0.0)
+    losses = np.where(deltas < 0, -deltas, 0.0)
+
+    # Wilder平滑化は alpha = 1/period のEMAなので、初期値を先頭に置いてemaを流用
+    wilder_period = 2 * period - 1
+    seed_gain = gains[..., :period].mean(axis=-1, keepdims=True)
+    seed_loss = losses[..., :period].mean(axis=-1, keepdims=True)
+    avg_gain = ema(np.concatenate([seed_gain, gains[..., period:]], axis=-1), wilder_period)
+    avg_loss = ema(np.concatenate([seed_loss, losses[..., period:]], axis=-1), wilder_period)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = avg_gain / avg_loss
+        values = np.where(avg_loss == 0, 100.0, 100 - 100 / (1 + rs))
+    out[..., period:] = values
+    return out
+
+def pivot_masks(highs: np.ndarray, lows: np.ndarray, window: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ピボット検出
+    前後window本の高値より厳密に高い点をレジスタンス、安値より厳密に低い点をサポートとする
+    戻り値は (resistance_mask, support_mask)
+    """
+    highs = np.asarray(highs, dtype=np.float64)
+    lows = np.asarray(lows, dtype=np.float64)
+    n = highs.shape[-1]
+    resistance = np.zeros(highs.shape, dtype=bool)
+    support = np.zeros(lows.shape, dtype=bool)
+    if n < 2 * window + 1:
+        return resistance, support
+
+    center_high = highs[..., window:n - window]
+    center_low = lows[..., window:n - window]
+    is_high = np.ones(center_high.shape, dtype=bool)
+    is_low = np.ones(center_low.shape, dtype=bool)
+    for offset in range(1, window + 1):
+        is_high &= center_high > highs[..., window - offset:n - window - offset]
+        is_high &= center_high > highs[..., window + offset:n - window + offset]
+        is_low &= center_low < lows[..., window - offset:n - window - offset]
+        is_low &= center_low < lows[..., window + offset:n - window + offset]
+
+    resistance[..., window:n - window] = is_high
+    support[..., window:n - window] = is_low
+    return resistance, support
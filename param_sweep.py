@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+パラメータスイープ
+閾値・決済マトリクスの倍率/比率・基本ポジションサイズ・ImprovedConfidenceCalculator の重みを
+グリッドまたはランダムサーチで振り、バックテストをプロセスプールで並列実行する。
+履歴と指標は一時ディレクトリ（/dev/shm があればメモリ上）の .npy に一度だけ書き出し、
+各ワーカーは mmap で読み取り専用に共有する（ワーカーごとの pickle やコピーなし）。
+結果は1実行1行のJSONLで逐次書き出す。
+
+パラメータ名は 'trader.' / 'calculator.' から始まる属性・辞書キーのドット区切り:
+    'trader.THRESHOLDS.default'                                   エントリー閾値
+    'trader.TIMEFRAME_WEIGHTS.60'                                 時間足の重み
+    'trader.BASE_POSITION_SIZE'                                   基本ポジションサイズ
+    'trader.dynamic_exit.profit_cascade.atr_multiples.high'       利確のATR倍率（信頼度区分ごと）
+    'trader.dynamic_exit.profit_cascade.exit_ratios.low'          利確の決済比率
+    'calculator.mtf_weights.240' / 'calculator.volume_weight'     ImprovedConfidenceCalculator の重み
+"""
+
+import os
+import copy
+import json
+import time
+import shutil
+import logging
+import tempfile
+import itertools
+import multiprocessing
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+from backtest import BacktestResult, FeatureSeries, MarketHistory, compute_features, compute_signals, simulate_trades
+
+logger = logging.getLogger(__name__)
+
+# 採点（信頼度の行列）に影響するパラメータ。これ以外だけが変わる実行では信頼度を再計算しない
+SCORING_PREFIXES = ('trader.TIMEFRAME_WEIGHTS', 'calculator.')
+
+# ワーカーに渡すトレーダーの設定（採点・閾値・ポジションサイズ・決済プランに使う属性）。
+# トレーダー自体はロックやスレッドプールを持つので pickle できない
+TRADER_SETTINGS = (
+    'TIMEFRAMES', 'TIMEFRAME_WEIGHTS', 'BASE_POSITION_SIZE', 'THRESHOLDS',
+    'max_positions', 'correlations', 'btc_trend', 'exit_strategy', 'dynamic_exit'
+)
+
+def grid(space: Dict[str, Sequence]) -> Iterator[Dict[str, Any]]:
+    """全組み合わせ（最後のパラメータが最も速く変わる）"""
+    names = list(space)
+    for values in itertools.product(*(space[name] for name in names)):
+        yield dict(zip(names, values))
+
+def random_search(space: Dict[str, Any], n: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """
+    ランダムサーチ
+    値がリストなら一様に選択、(下限, 上限) のタプルなら一様乱数
+    """
+    rng = np.random.default_rng(seed)
+    for _ in range(n):
+        params = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                params[name] = float(rng.uniform(*values))
+            else:
+                params[name] = values[int(rng.integers(len(values)))]
+        yield params
+
+def apply_params(params: Dict[str, Any], targets: Dict[str, Any]):
+    """
+    ドット区切りのパラメータを対象オブジェクトに設定
+    途中の辞書・リストは複製してから書き換える（クラス定数や他インスタンスとの共有を避ける）
+    """
+    for path, value in params.items():
+        parts = path.split('.')
+        if parts[0] not in targets:
+            raise KeyError(f"unknown parameter target: {path}")
+        obj = targets[parts[0]]
+        for name in parts[1:-1]:
+            child = _get(obj, name)
+            if isinstance(child, (dict, list)):
+                child = copy.deepcopy(child)
+                _set(obj, name, child)
+            obj = child
+        if isinstance(obj, (dict, list)) or hasattr(obj, parts[-1]):
+            _set(obj, parts[-1], copy.deepcopy(value))
+        else:
+            raise KeyError(f"unknown parameter: {path}")
+
+def _get(obj, name: str):
+    if isinstance(obj, list):
+        return obj[int(name)]
+    if isinstance(obj, dict):
+        return obj[name]
+    return getattr(obj, name)
+
+def _set(obj, name: str, value):
+    if isinstance(obj, list):
+        obj[int(name)] = value
+    elif isinstance(obj, dict):
+        obj[name] = value
+    else:
+        setattr(obj, name, value)
+
+def trader_settings(trader) -> Dict[str, Any]:
+    """ワーカーで同じ設定のトレーダーを作るための (クラス, 属性) """
+    return {'class': type(trader), 'attributes': {name: getattr(trader, name) for name in TRADER_SETTINGS}}
+
+def build_trader(settings: Dict[str, Any]):
+    """設定からトレーダーを作成（属性は複製するので、パラメータの適用が他のトレーダーに漏れない）"""
+    trader = settings['class'](None)
+    for name, value in copy.deepcopy(settings['attributes']).items():
+        setattr(trader, name, value)
+    return trader
+
+class SharedData:
+    """履歴と指標の .npy 書き出し・mmap での読み込み"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @classmethod
+    def export(cls, history: MarketHistory, features: FeatureSeries, directory: Optional[str] = None) -> 'SharedData':
+        if directory is None:
+            base = '/dev/shm' if os.path.isdir('/dev/shm') else None
+            directory = tempfile.mkdtemp(prefix='param_sweep_', dir=base)
+        arrays = {
+            'history.symbols': np.array(history.symbols),
+            'history.timestamps': history.timestamps,
+            'history.first_index': history.first_index,
+            **{f'history.{field}': getattr(history, field) for field in MarketHistory.FIELDS},
+            **{f'features.{name}': values for name, values in features.to_arrays().items()},
+        }
+        for name, values in arrays.items():
+            np.save(os.path.join(directory, f'{name}.npy'), values)
+        return cls(directory)
+
+    def attach(self):
+        """(MarketHistory, FeatureSeries) を読み取り専用の mmap で開く"""
+        arrays = {'history': {}, 'features': {}}
+        for filename in os.listdir(self.directory):
+            group, name = filename[:-len('.npy')].split('.', 1)
+            arrays[group][name] = np.load(os.path.join(self.directory, filename), mmap_mode='r')
+        fields = arrays['history']
+        history = MarketHistory(
+            fields.pop('symbols').tolist(), fields.pop('timestamps'), first_index=fields.pop('first_index'), **fields
+        )
+        return history, FeatureSeries.from_arrays(arrays['features'])
+
+    def cleanup(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+# ワーカープロセスの状態（initializer で設定）
+_worker = {}
+
+def _init_worker(directory: str, settings: Dict[str, Any], model: str, simulation: Dict[str, Any]):
+    history, features = SharedData(directory).attach()
+    _worker.update(
+        history=history, features=features, settings=settings, model=model, simulation=simulation,
+        signals=(None, None)
+    )
+
+def _run(job):
+    """1実行分のバックテスト（ワーカー内、呼び出し元のトレーダーの設定にパラメータを適用）"""
+    from confidence_improvement_v2 import ImprovedConfidenceCalculator
+
+    run_id, params = job
+    started = time.perf_counter()
+    trader = build_trader(_worker['settings'])
+    calculator = ImprovedConfidenceCalculator()
+    apply_params(params, {'trader': trader, 'calculator': calculator})
+
+    # 採点パラメータが直前の実行と同じなら信頼度の行列を使い回す
+    scoring_key = json.dumps(
+        {name: value for name, value in params.items() if name.startswith(SCORING_PREFIXES)}, sort_keys=True
+    )
+    cached_key, signals = _worker['signals']
+    if cached_key != scoring_key:
+        signals = None
+        _worker['signals'] = (None, None)  # 再計算中は旧行列を解放
+        signals = compute_signals(
+            _worker['history'], trader, features=_worker['features'], model=_worker['model'], calculator=calculator
+        )
+        _worker['signals'] = (scoring_key, signals)
+
+    trades = simulate_trades(signals, trader, **_worker['simulation'])
+    return {
+        'run_id': run_id,
+        'params': params,
+        'stats': BacktestResult(_worker['history'], trades).stats,
+        'elapsed': round(time.perf_counter() - started, 4),
+    }
+
+def run_sweep(history: MarketHistory, runs: Iterable[Dict[str, Any]], output_path: str,
+              workers: Optional[int] = None, model: str = 'genius', features: Optional[FeatureSeries] = None,
+              trader=None, chunksize: int = 4, **simulation_kwargs) -> Dict[str, Any]:
+    """
+    パラメータの組み合わせごとにバックテストを並列実行し、結果を output_path にJSONLで書き出す
+    simulation_kwargs は simulate_trades に渡す（exits='matrix' など）。
+    各実行は trader と同じクラス・設定（TRADER_SETTINGS）のトレーダーにパラメータを適用して評価する。
+    戻り値: 実行数・所要時間・スループットと最良の実行（total_return 最大）
+    """
+    if trader is None:
+        from genius_multi_trading_v2_with_trading import GeniusMultiTrader
+        trader = GeniusMultiTrader(None)
+    if features is None:
+        features = compute_features(history, trader)
+    workers = workers or os.cpu_count() or 1
+    jobs = list(enumerate(runs))
+
+    started = time.perf_counter()
+    shared = SharedData.export(history, features)
+    best = None
+    try:
+        with open(output_path, 'w') as f, multiprocessing.Pool(
+            workers, initializer=_init_worker, initargs=(shared.directory, trader_settings(trader), model, simulation_kwargs)
+        ) as pool:
+            for record in pool.imap_unordered(_run, jobs, chunksize=chunksize):
+                f.write(json.dumps(record, separators=(',', ':'), default=float) + '\n')
+                total_return = record['stats'].get('total_return')
+                if total_return is not None and (best is None or total_return > best['stats']['total_return']):
+                    best = record
+    finally:
+        shared.cleanup()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"🧪 Sweep: {len(jobs)} runs on {workers} workers in {elapsed:.1f}s → {output_path}")
+    return {
+        'runs': len(jobs),
+        'workers': workers,
+        'elapsed': elapsed,
+        'runs_per_second': len(jobs) / elapsed if elapsed > 0 else None,
+        'best': best,
+    }
+
+def load_results(path: str) -> List[Dict[str, Any]]:
+    """結果ファイルを run_id 順に読み込む"""
+    with open(path) as f:
+        return sorted((json.loads(line) for line in f if line.strip()), key=lambda record: record['run_id'])
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+パラメータスイープの整合性チェックとベンチマーク
+ベクトル化した ImprovedConfidenceCalculator の採点が1バーずつの計算と一致するか、
+スイープ結果がワーカー数によらず（ワーカーでも渡したトレーダーの設定で）同じかを確認し、
+ワーカー数ごとのスループットを計測
+"""
+
+import os
+import sys
+import json
+import logging
+import tempfile
+import numpy as np
+
+from backtest import STRENGTH_VALUES, MarketHistory, compute_features, compute_signals
+from batch_indicators import BULLISH, BEARISH
+from backtest_benchmark import synthetic_klines
+from param_sweep import apply_params, build_trader, grid, load_results, random_search, run_sweep, trader_settings
+from confidence_improvement_v2 import ImprovedConfidenceCalculator
+from genius_multi_trading_v2_with_trading import GeniusMultiTrader
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+TREND_NAMES = {BULLISH: 'BULLISH', BEARISH: 'BEARISH'}
+
+SWEEP_SPACE = {
+    'trader.THRESHOLDS.default': [0.45, 0.5, 0.55, 0.6],
+    'trader.TIMEFRAME_WEIGHTS.240': [0.3, 0.4],
+    'trader.BASE_POSITION_SIZE': [0.1, 0.15, 0.2],
+    'trader.dynamic_exit.profit_cascade.exit_ratios.low': [[0.30, 0.30, 0.25, 0.15], [0.50, 0.20, 0.20, 0.10]],
+}
+
+def check_improved_parity(history: MarketHistory, trader: GeniusMultiTrader, samples: int = 300, seed: int = 0) -> int:
+    """ランダムなバーで calculate_improved_confidence と比較（不一致数を返す）"""
+    calculator = ImprovedConfidenceCalculator()
+    calculator.mtf_weights['60'] = 0.25  # 既定値以外の重みでも一致すること
+    features = compute_features(history, trader)
+    signals = compute_signals(history, trader, features=features, model='improved', calculator=calculator)
+    rng = np.random.default_rng(seed)
+    ready = np.argwhere(signals.ready)
+    mismatches = 0
+
+    for s, t in ready[rng.choice(len(ready), size=min(samples, len(ready)), replace=False)]:
+        expected = calculator.calculate_improved_confidence(
+            mtf_signals={
+                tf: {
+                    'trend': TREND_NAMES.get(int(features.trend[tf][s, t]), 'NEUTRAL'),
+                    'strength': float(STRENGTH_VALUES[features.strength[tf][s, t]]),
+                }
+                for tf in features.timeframes
+            },
+            volume_ratio=float(features.volume_ratio[s, t]),
+            price_to_support=float(features.support_gap[s, t]),
+            price_to_resistance=float(features.resistance_gap[s, t]),
+            rsi=float(features.rsi[s, t]),
+            btc_trend='down' if features.btc_down[t] else 'neutral',
+            timezone_factor=float(features.session[t]),
+            symbol=history.symbols[s]
+        )
+        actual = signals.result(trader, s, t)
+        if abs(expected['confidence'] - actual['confidence']) > 1e-9 or expected['direction'] != actual['direction']:
+            mismatches += 1
+            logger.info(
+                f"  ❌ {history.symbols[s]} bar {t}: {expected['direction']} {expected['confidence']:.6f} "
+                f"vs {actual['direction']} {actual['confidence']:.6f}"
+            )
+    return mismatches
+
+def sweep_stats(history: MarketHistory, runs, directory: str, workers: int, **kwargs):
+    path = os.path.join(directory, f'check_{workers}.jsonl')
+    run_sweep(history, runs, path, workers=workers, exits='matrix', **kwargs)
+    return [json.dumps(record['stats'], sort_keys=True) for record in load_results(path)]
+
+def check_trader(history: MarketHistory) -> int:
+    """設定を変えたトレーダーが結果に反映され、1ワーカーと2ワーカーで一致するか（失敗数を返す）"""
+    failures = 0
+    trader = GeniusMultiTrader(None)
+    trader.THRESHOLDS = {symbol: threshold - 0.2 for symbol, threshold in trader.THRESHOLDS.items()}
+    trader.BASE_POSITION_SIZE = 0.3
+    trader.dynamic_exit.profit_cascade.atr_multiples = {
+        tier: [m * 0.5 for m in multiples] for tier, multiples in trader.dynamic_exit.profit_cascade.atr_multiples.items()
+    }
+    # 同じワーカーで続けて実行されても前の実行のパラメータが残らないこと
+    runs = [{}, {'trader.THRESHOLDS.default': 0.45}, {}]
+    with tempfile.TemporaryDirectory() as directory:
+        default = sweep_stats(history, runs, directory, 1)
+        stats = {workers: sweep_stats(history, runs, directory, workers, trader=trader) for workers in (1, 2)}
+    if stats[1][0] == default[0]:
+        failures += 1
+        logger.info("  ❌ 設定を変えたトレーダーでも既定と同じ結果（トレーダーの設定が使われていない）")
+    if stats[1] != stats[2] or stats[1][0] != stats[1][2]:
+        failures += 1
+        logger.info("  ❌ ワーカー数・実行順によって結果が異なる")
+    return failures
+
+def main():
+    trader = GeniusMultiTrader(None)
+    failures = 0
+
+    logger.info("=" * 60)
+    logger.info("🔬 ImprovedConfidenceCalculator の一括採点の整合性チェック")
+    logger.info("=" * 60)
+    history = MarketHistory.from_klines(synthetic_klines(5, 45))
+    mismatches = check_improved_parity(history, trader)
+    if mismatches:
+        failures += 1
+        logger.info(f"  ❌ {mismatches}件が1バーずつの計算と不一致")
+    else:
+        logger.info("  ✅ 信頼度・方向が1バーずつの計算と一致")
+
+    logger.info("\n" + "=" * 60)
+    logger.info("🧩 パラメータの適用")
+    logger.info("=" * 60)
+    params = next(random_search({'trader.THRESHOLDS.default': (0.4, 0.7),
+                                 'trader.dynamic_exit.profit_cascade.atr_multiples.high': [[1, 2, 3, 4, 5]]}, 1))
+    # スイープの各実行と同じく、同じ設定から作ったトレーダーに適用
+    settings = trader_settings(GeniusMultiTrader(None))
+    tuned = build_trader(settings)
+    apply_params(params, {'trader': tuned})
+    untouched = build_trader(settings)
+    if (tuned.THRESHOLDS['default'] == params['trader.THRESHOLDS.default']
+            and tuned.dynamic_exit.profit_cascade.atr_multiples['high'] == [1, 2, 3, 4, 5]
+            and untouched.THRESHOLDS['default'] == GeniusMultiTrader.THRESHOLDS['default'] != tuned.THRESHOLDS['default']
+            and untouched.dynamic_exit.profit_cascade.atr_multiples['high'] != [1, 2, 3, 4, 5]):
+        logger.info("  ✅ 対象インスタンスだけに適用（クラス定数・他インスタンスは不変）")
+    else:
+        failures += 1
+        logger.info("  ❌ パラメータが他のインスタンスに漏れている")
+    if check_trader(history):
+        failures += 1
+    else:
+        logger.info("  ✅ 渡したトレーダーの設定で1ワーカーと2ワーカーの結果が一致")
+
+    logger.info("\n" + "=" * 60)
+    logger.info("⏱️  スイープ（10通貨 × 90日、決済マトリクスのリプレイ）")
+    logger.info("=" * 60)
+    history = MarketHistory.from_klines(synthetic_klines(10, 90, seed=10))
+    features = compute_features(history, trader)
+    runs = list(grid(SWEEP_SPACE))
+    worker_counts = sorted({1, 2, os.cpu_count() or 1})
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for workers in worker_counts:
+            path = os.path.join(directory, f'sweep_{workers}.jsonl')
+            summary = run_sweep(history, runs, path, workers=workers, features=features, exits='matrix')
+            results[workers] = load_results(path)
+            logger.info(f"  {workers}ワーカー: {summary['runs']}回 {summary['elapsed']:.1f}秒 "
+                        f"({summary['runs_per_second']:.1f}回/秒), 結果 {os.path.getsize(path) / 1024:.0f}KB")
+            best = summary['best']
+            logger.info(f"    最良: 累計 {best['stats']['total_return']:+.1%} {json.dumps(best['params'])}")
+
+    stats = [[json.dumps(record['stats'], sort_keys=True) for record in records] for records in results.values()]
+    if len(results[1]) != len(runs) or any(other != stats[0] for other in stats[1:]):
+        failures += 1
+        logger.info("  ❌ ワーカー数によって結果が異なる")
+    elif len({record['stats']['total_return'] for record in results[1]}) < 2:
+        failures += 1
+        logger.info("  ❌ パラメータを変えても結果が変わらない")
+    else:
+        logger.info(f"  ✅ {len(runs)}通りの結果がワーカー数 {worker_counts} で一致")
+
+    if failures:
+        logger.info(f"\n❌ {failures}件のチェックが失敗しました")
+        sys.exit(1)
+    logger.info("\n✅ すべてのテストが完了しました！")
+
+if __name__ == "__main__":
+    main()
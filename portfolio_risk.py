@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+ポートフォリオのモンテカルロ・リスクシミュレーション
+キャッシュ済みの5分足から対数リターンの共分散を推定し、保有中の全通貨の相関した価格パスを
+(パス数 × ステップ数 × 通貨数) のテンソルとして一括生成する。
+各ポジションに決済プラン（段階的利確・損切り・トレーリング）を exit_replay.replay_shared で執行し、
+損益分布・VaR・期待ショートフォール（ES）を求める
+"""
+
+import os
+import time
+import logging
+import multiprocessing
+from functools import reduce
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import indicators
+from exit_replay import replay_shared
+from genius_dynamic_exit_strategy import DynamicExitMatrix, ExitPlan
+from services.kline_cache import INTERVAL_MS, to_kline_array
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = '5'
+DEFAULT_LOOKBACK = 1000  # 共分散の推定に使う足の本数（5分足で約3.5日）
+DEFAULT_HORIZON_HOURS = 24
+CONFIDENCE_LEVELS = (0.95, 0.99)
+
+def log_returns(klines_by_symbol: Dict[str, np.ndarray], lookback: int = DEFAULT_LOOKBACK) -> Tuple[List[str], np.ndarray]:
+    """全通貨に共通するタイムスタンプの直近 lookback 本の対数リターン (本数 × 通貨数)"""
+    arrays = {symbol: to_kline_array(klines) for symbol, klines in klines_by_symbol.items()}
+    common = reduce(np.intersect1d, (klines['timestamp'] for klines in arrays.values()))[-(lookback + 1):]
+    if len(common) < 3:
+        raise ValueError(f"not enough common candles to estimate covariance: {len(common)}")
+    closes = np.column_stack([
+        klines['close'][np.searchsorted(klines['timestamp'], common)] for klines in arrays.values()
+    ])
+    return list(arrays), np.diff(np.log(closes), axis=0)
+
+def estimate_covariance(klines_by_symbol: Dict[str, np.ndarray],
+                        lookback: int = DEFAULT_LOOKBACK) -> Tuple[List[str], np.ndarray]:
+    """1本あたりの対数リターンの共分散行列 (通貨数 × 通貨数)"""
+    symbols, returns = log_returns(klines_by_symbol, lookback)
+    return symbols, np.atleast_2d(np.cov(returns, rowvar=False))
+
+def _cholesky(covariance: np.ndarray) -> np.ndarray:
+    """共分散の下三角因子（半正定値で分解できない場合は固有値を0で切って平方根を取る）"""
+    try:
+        return np.linalg.cholesky(covariance)
+    except np.linalg.LinAlgError:
+        values, vectors = np.linalg.eigh(covariance)
+        return vectors * np.sqrt(np.clip(values, 0, None))
+
+def correlated_paths(prices: np.ndarray, covariance: np.ndarray, n_paths: int, steps: int,
+                     rng: np.random.Generator, dtype=np.float32, antithetic: bool = True) -> np.ndarray:
+    """
+    相関した幾何ブラウン運動の価格パス (パス数 × ステップ数 × 通貨数)
+    ドリフトは0（価格の期待値が現在値のまま）とし、1ステップの分散は共分散行列の対角成分。
+    antithetic=True は乱数の符号を反転したパスを対にして、正規乱数の生成（計算時間の大半）を半分にする。
+    メモリは (通貨数 × ステップ数 × パス数) の順に確保するので、[:, :, j] はそのまま replay_shared に渡せる
+    """
+    n_symbols = len(prices)
+    half = (n_paths + 1) // 2 if antithetic else n_paths
+    factor = _cholesky(covariance).astype(dtype)
+    shocks = factor @ rng.standard_normal((n_symbols, steps * half), dtype=dtype)
+    log_prices = np.empty((n_symbols, steps, n_paths), dtype=dtype)
+    log_prices[:, :, :half] = shocks.reshape(n_symbols, steps, half)
+    del shocks
+    np.negative(log_prices[:, :, :n_paths - half], out=log_prices[:, :, half:])
+    log_prices -= (np.diag(covariance) / 2).astype(dtype)[:, None, None]
+    # 中間の軸の np.cumsum は遅いので、ステップごとにパス方向のベクトルで足し込む
+    for t in range(1, steps):
+        log_prices[:, t] += log_prices[:, t - 1]
+    np.exp(log_prices, out=log_prices)
+    log_prices *= np.asarray(prices, dtype=dtype)[:, None, None]
+    return log_prices.transpose(2, 1, 0)
+
+class PortfolioRiskResult:
+    """シミュレーション結果（損益はUSDT、ポジションを建てた時点からの確定損益）"""
+
+    def __init__(self, positions: List[Dict], position_pnl: np.ndarray, steps: int, elapsed: float = 0.0):
+        self.positions = positions
+        self.position_pnl = position_pnl  # (パス数 × ポジション数)
+        self.pnl = position_pnl.sum(axis=1)
+        self.steps = steps
+        self.elapsed = elapsed
+        # 現在価格で全決済した場合の損益（VaR・ESはここからの変化で測る）
+        self.baseline = float(sum(position.get('unrealized_pnl', 0.0) for position in positions))
+
+    def value_at_risk(self, level: float = 0.95) -> float:
+        """現在価格で決済した場合と比べた損失のVaR（損失を正の値で返す）"""
+        return float(np.quantile(self.baseline - self.pnl, level))
+
+    def expected_shortfall(self, level: float = 0.95) -> float:
+        """VaRを超える損失の平均"""
+        losses = self.baseline - self.pnl
+        return float(losses[losses >= np.quantile(losses, level)].mean())
+
+    def contributions(self, level: float = 0.95) -> np.ndarray:
+        """ESへのポジション別寄与（裾のパスでの各ポジションの平均損失）"""
+        losses = self.baseline - self.pnl
+        tail = losses >= np.quantile(losses, level)
+        unrealized = np.array([position.get('unrealized_pnl', 0.0) for position in self.positions])
+        return unrealized - self.position_pnl[tail].mean(axis=0)
+
+    @property
+    def stats(self) -> Dict:
+        return {
+            'paths': len(self.pnl),
+            'steps': self.steps,
+            'mean_pnl': float(self.pnl.mean()),
+            'std_pnl': float(self.pnl.std()),
+            'loss_probability': float((self.pnl < 0).mean()),
+            'pnl_percentiles': dict(zip((1, 5, 25, 50, 75, 95, 99), np.percentile(self.pnl, [1, 5, 25, 50, 75, 95, 99]).tolist())),
+            'var': {level: self.value_at_risk(level) for level in CONFIDENCE_LEVELS},
+            'expected_shortfall': {level: self.expected_shortfall(level) for level in CONFIDENCE_LEVELS},
+        }
+
+    def histogram(self, bins: int = 20) -> Tuple[np.ndarray, np.ndarray]:
+        return np.histogram(self.pnl, bins=bins)
+
+    def summary(self) -> str:
+        stats = self.stats
+        p = stats['pnl_percentiles']
+        return (
+            f"{stats['paths']:,}パス: 平均 ${stats['mean_pnl']:+,.2f}, 損失確率 {stats['loss_probability']:.1%}, "
+            f"P5/P50/P95 ${p[5]:+,.2f}/${p[50]:+,.2f}/${p[95]:+,.2f}\n"
+            + "\n".join(
+                f"  VaR{level:.0%} ${stats['var'][level]:,.2f}, ES{level:.0%} ${stats['expected_shortfall'][level]:,.2f}"
+                for level in CONFIDENCE_LEVELS
+            )
+        )
+
+def build_exit_plan(position: Dict, daily_klines: np.ndarray, confidence: float = 0.7,
+                    exit_matrix: Optional[DynamicExitMatrix] = None) -> ExitPlan:
+    """
+    取引所のポジションに Dynamic Exit Matrix の決済プランを作成
+    ATR は日足から求める（analyze_genius と同じ）。エントリー時の信頼度は分からないので confidence を使う
+    """
+    daily_klines = to_kline_array(daily_klines)
+    entry = position['entry_price']
+    atr = float(indicators.atr(daily_klines['high'], daily_klines['low'], daily_klines['close'], 14)) \
+        if len(daily_klines) else 0.0
+    return (exit_matrix or DynamicExitMatrix()).create_exit_plan(
+        entry_price=entry,
+        atr=atr,
+        confidence=confidence,
+        market_conditions={
+            'volatility': 'high' if atr and atr / entry > 0.03 else 'normal',
+            'trend_strength': 0.5,
+        },
+        position_size=position.get('position_size', 0.15),
+        symbol=position['symbol']
+    )
+
+def _simulate_chunk(positions: List[Dict], columns: List[int], prices: np.ndarray, covariance: np.ndarray,
+                    steps: int, n: int, seed: np.random.SeedSequence) -> np.ndarray:
+    """n本のパスを生成して全ポジションの決済をリプレイ（損益 (n × ポジション数)）"""
+    tensor = correlated_paths(prices, covariance, n, steps, np.random.default_rng(seed))
+    pnl = np.empty((n, len(positions)))
+    for j, (position, column) in enumerate(zip(positions, columns)):
+        plan = position['exit_plan']
+        paths = tensor[:, :, column]
+        current = position['current_price']
+        if position['side'] != 'Buy':
+            paths = 2 * plan.entry_price - paths
+            current = 2 * plan.entry_price - current
+        result = replay_shared(plan, paths, highest_price=current, chunk_size=n)
+        pnl[:, j] = result.pnl * position['size'] * plan.entry_price
+    return pnl
+
+# ワーカープロセスの状態（initializer で設定）
+_worker = {}
+
+def _init_worker(*args):
+    _worker['args'] = args
+
+def _run_chunk(job):
+    n, seed = job
+    return _simulate_chunk(*_worker['args'], n, seed)
+
+def simulate_portfolio(positions: Sequence[Dict], symbols: Sequence[str], covariance: np.ndarray,
+                       n_paths: int = 100_000, steps: int = DEFAULT_HORIZON_HOURS * 12,
+                       chunk_size: int = 8192, seed: Optional[int] = None,
+                       workers: Optional[int] = None) -> PortfolioRiskResult:
+    """
+    保有ポジションのモンテカルロ・シミュレーション
+    positions: get_positions() の形式に 'exit_plan'（ExitPlan）を加えたもの。
+    決済プランはロング前提の価格配置なので、ショートは価格パスをエントリー価格で反転させて執行する。
+    トレーリングの最高値は現在価格から始める（建ててからの最高値は取引所のポジションからは分からない）。
+    パスは chunk_size 本ずつ、チャンクごとに seed から分岐した乱数で生成するので、
+    結果はワーカー数によらない。workers=1 はプロセスプールを使わずにこのプロセスで実行する。
+    """
+    started = time.perf_counter()
+    positions = list(positions)
+    symbols = list(symbols)
+    columns = [symbols.index(position['symbol']) for position in positions]
+    current_prices = {position['symbol']: position['current_price'] for position in positions}
+    prices = np.array([current_prices.get(symbol, 1.0) for symbol in symbols])
+    sizes = [min(chunk_size, n_paths - first) for first in range(0, n_paths, chunk_size)]
+    jobs = list(zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))))
+    args = (positions, columns, prices, covariance, steps)
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+
+    if workers == 1:
+        chunks = [_simulate_chunk(*args, n, chunk_seed) for n, chunk_seed in jobs]
+    else:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=args) as pool:
+            chunks = pool.map(_run_chunk, jobs)
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"🎲 Portfolio Monte Carlo: {n_paths:,} paths × {steps} steps × {len(positions)} positions "
+        f"on {workers} workers in {elapsed:.1f}s"
+    )
+    return PortfolioRiskResult(positions, np.concatenate(chunks), steps, elapsed)
+
+def horizon_steps(hours: float, interval: str = DEFAULT_INTERVAL) -> int:
+    return max(1, int(hours * 3_600_000 // INTERVAL_MS[interval]))
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+ポートフォリオのモンテカルロ・リスクシミュレーションの整合性チェックとベンチマーク
+1プラン×多数パスのリプレイ（replay_shared）が replay と一致するか、共分散の推定と相関パスの生成が
+既知の相関を再現するかを確認し、10ポジション × 10万パスの所要時間を計測
+"""
+
+import os
+import sys
+import logging
+import numpy as np
+
+from exit_replay import gbm_paths, replay, replay_shared
+from exit_replay_benchmark import random_plans
+from genius_dynamic_exit_strategy import ExitPlan
+from portfolio_risk import build_exit_plan, correlated_paths, estimate_covariance, simulate_portfolio
+from services.kline_cache import INTERVAL_MS, KLINE_DTYPE
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def correlated_klines(covariance: np.ndarray, n_bars: int, seed: int = 0, interval: str = '5'):
+    """既知の共分散で動く5分足（通貨ごとに先頭を少しずらしてタイムスタンプの揃え込みも確認）"""
+    rng = np.random.default_rng(seed)
+    returns = rng.multivariate_normal(np.zeros(len(covariance)), covariance, n_bars)
+    close = rng.uniform(1, 50000, len(covariance)) * np.exp(np.cumsum(returns, axis=0))
+    timestamps = 1_704_067_200_000 + np.arange(n_bars, dtype=np.int64) * INTERVAL_MS[interval]
+    klines = {}
+    for j in range(len(covariance)):
+        rows = np.empty(n_bars, dtype=KLINE_DTYPE)
+        rows['timestamp'] = timestamps
+        rows['open'] = np.r_[close[0, j], close[:-1, j]]
+        rows['high'] = np.maximum(rows['open'], close[:, j]) * 1.001
+        rows['low'] = np.minimum(rows['open'], close[:, j]) * 0.999
+        rows['close'] = close[:, j]
+        rows['volume'] = 1.0
+        klines[f"SYM{j}USDT"] = rows[j * 3:]
+    return klines
+
+def random_covariance(n: int, seed: int = 0) -> np.ndarray:
+    """ランダムな相関（0.2〜0.8程度）と5分足のボラティリティ 0.1%〜0.6%"""
+    rng = np.random.default_rng(seed)
+    loadings = rng.uniform(0.4, 0.9, n)
+    correlation = np.outer(loadings, loadings)
+    np.fill_diagonal(correlation, 1.0)
+    volatility = rng.uniform(0.001, 0.006, n)
+    return correlation * np.outer(volatility, volatility)
+
+def correlation(covariance: np.ndarray) -> np.ndarray:
+    volatility = np.sqrt(np.diag(covariance))
+    return covariance / np.outer(volatility, volatility)
+
+def check_shared_parity(n_plans: int = 20, n_paths: int = 2000, steps: int = 288) -> int:
+    """replay_shared と replay([plan] * n) の不一致数（トレーリングなし・執行済みレベルありのプランを含む）"""
+    mismatches = 0
+    for k, plan in enumerate(random_plans(n_plans, seed=7)):
+        if k % 4 == 1:
+            plan.trailing_config['enabled'] = False
+        reference = plan
+        if k % 4 == 2:
+            # 執行済みレベルは replay 側ではレベルごと外したプランと比べる
+            plan.tp_executed[0] = plan.sl_executed[0] = True
+            reference = ExitPlan(
+                plan.symbol, plan.entry_price, 1.0, plan.tp_prices[1:], plan.tp_ratios[1:],
+                plan.sl_prices[1:], plan.sl_ratios[1:], dict(plan.trailing_config), plan.tp_atr_multiples[1:]
+            )
+        paths = gbm_paths(np.full(n_paths, plan.entry_price), steps, volatility=0.004, seed=k)
+        expected = replay([reference] * n_paths, paths)
+        actual = replay_shared(plan, paths, chunk_size=512)
+        same = (
+            np.isclose(actual.pnl, expected.pnl, rtol=0, atol=1e-9)
+            & (actual.exit_step == expected.exit_step)
+            & (actual.closed == expected.closed)
+            & (actual.trailing == expected.trailing)
+        )
+        for i in np.flatnonzero(~same)[:3]:
+            logger.info(f"  ❌ プラン{k} #{i}: pnl {actual.pnl[i]:+.6f} vs {expected.pnl[i]:+.6f}, "
+                        f"exit {actual.exit_step[i]} vs {expected.exit_step[i]}")
+        mismatches += int((~same).sum())
+    return mismatches
+
+def check_covariance(n_symbols: int = 5, n_bars: int = 20000) -> float:
+    """推定した相関と既知の相関の最大誤差"""
+    covariance = random_covariance(n_symbols, seed=3)
+    symbols, estimated = estimate_covariance(correlated_klines(covariance, n_bars), lookback=n_bars)
+    error = np.abs(correlation(estimated) - correlation(covariance)).max()
+    logger.info(f"  推定相関の最大誤差: {error:.3f} ({len(symbols)}通貨 × {n_bars}本)")
+    return error
+
+def check_paths(n_symbols: int = 5, n_paths: int = 20000, steps: int = 288) -> float:
+    """生成したパスの対数リターンの相関と既知の相関の最大誤差"""
+    covariance = random_covariance(n_symbols, seed=4)
+    paths = correlated_paths(np.ones(n_symbols), covariance, n_paths, steps, np.random.default_rng(0))
+    log_returns = np.diff(np.log(paths.astype(np.float64)), axis=1).reshape(-1, n_symbols)
+    error = np.abs(np.corrcoef(log_returns, rowvar=False) - correlation(covariance)).max()
+    drift = abs(paths[:, -1].mean(axis=0) - 1).max()
+    logger.info(f"  生成パスの相関の最大誤差: {error:.3f}, 最終価格の平均の偏り: {drift:.4f}")
+    return max(error, drift)
+
+def daily_klines(klines: np.ndarray, bars_per_day: int = 288) -> np.ndarray:
+    """5分足を日足にまとめる（端数の足は捨てる）"""
+    days = klines[len(klines) % bars_per_day:].reshape(-1, bars_per_day)
+    rows = np.empty(len(days), dtype=KLINE_DTYPE)
+    rows['timestamp'] = days['timestamp'][:, 0]
+    rows['open'] = days['open'][:, 0]
+    rows['high'] = days['high'].max(axis=1)
+    rows['low'] = days['low'].min(axis=1)
+    rows['close'] = days['close'][:, -1]
+    rows['volume'] = days['volume'].sum(axis=1)
+    return rows
+
+def sample_positions(klines_by_symbol, seed: int = 0):
+    """ロング・ショートを混ぜた保有ポジション（get_positions の形式＋決済プラン）"""
+    rng = np.random.default_rng(seed)
+    positions = []
+    for symbol, klines in klines_by_symbol.items():
+        current = float(klines['close'][-1])
+        entry = current * rng.uniform(0.98, 1.02)
+        side = 'Buy' if rng.random() < 0.6 else 'Sell'
+        size = 1000 / entry
+        position = {
+            'symbol': symbol,
+            'side': side,
+            'size': size,
+            'entry_price': entry,
+            'current_price': current,
+            'unrealized_pnl': (current - entry) * size * (1 if side == 'Buy' else -1),
+            'leverage': 10,
+        }
+        position['exit_plan'] = build_exit_plan(position, daily_klines(klines))
+        positions.append(position)
+    return positions
+
+def main():
+    failures = 0
+
+    logger.info("=" * 60)
+    logger.info("🔬 1プラン×多数パスのリプレイと replay の整合性チェック")
+    logger.info("=" * 60)
+    mismatches = check_shared_parity()
+    if mismatches:
+        failures += 1
+        logger.info(f"  ❌ {mismatches}件が replay と不一致")
+    else:
+        logger.info("  ✅ 損益・決済ステップ・トレーリングが replay と一致")
+
+    logger.info("\n" + "=" * 60)
+    logger.info("🔗 共分散の推定と相関パス")
+    logger.info("=" * 60)
+    if check_covariance() > 0.05:
+        failures += 1
+        logger.info("  ❌ 推定した相関が既知の相関と合わない")
+    else:
+        logger.info("  ✅ キャッシュ形式の足から既知の相関を推定")
+    if check_paths() > 0.02:
+        failures += 1
+        logger.info("  ❌ 生成パスが共分散どおりに動いていない")
+    else:
+        logger.info("  ✅ 生成パスの相関と期待値が共分散どおり")
+
+    logger.info("\n" + "=" * 60)
+    logger.info("⏱️  10ポジション × 10万パス × 288ステップ（24時間）")
+    logger.info("=" * 60)
+    covariance = random_covariance(10, seed=5)
+    klines = correlated_klines(covariance, 30 * 288, seed=5)
+    symbols, estimated = estimate_covariance(klines)
+    positions = sample_positions(klines)
+    for workers in sorted({1, os.cpu_count() or 1}):
+        result = simulate_portfolio(positions, symbols, estimated, n_paths=100_000, seed=0, workers=workers)
+        logger.info(f"  {workers}ワーカー: {result.elapsed:.1f}秒")
+    for line in result.summary().split("\n"):
+        logger.info(f"    {line}")
+    stats = result.stats
+    if not all(stats['expected_shortfall'][level] >= stats['var'][level] > 0 for level in stats['var']):
+        failures += 1
+        logger.info("  ❌ ESがVaRより小さい（または損失がない）")
+    if not np.isclose(result.contributions(0.95).sum(), stats['expected_shortfall'][0.95], rtol=0.01):
+        failures += 1
+        logger.info("  ❌ ポジション別の寄与の合計がESと一致しない")
+    runs = [simulate_portfolio(positions, symbols, estimated, n_paths=20_000, seed=1, workers=workers).pnl
+            for workers in (1, 2)]
+    if not np.array_equal(*runs):
+        failures += 1
+        logger.info("  ❌ ワーカー数によって結果が異なる")
+    else:
+        logger.info("  ✅ 同じシードならワーカー数によらず同じ損益分布")
+
+    if failures:
+        logger.info(f"\n❌ {failures}件のチェックが失敗しました")
+        sys.exit(1)
+    logger.info("\n✅ すべてのテストが完了しました！")
+
+if __name__ == "__main__":
+    main()
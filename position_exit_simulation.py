@@ -2,204 +2,139 @@
 """
 現在のポジションの決済シミュレーション
 Dynamic Exit Matrixに基づく段階的決済の収支予測
+キャッシュ済みの5分足から推定した共分散で全ポジションの相関した価格パスをモンテカルロ生成し、
+実際の利確・損切り・トレーリングのプランで決済して損益分布・VaR・ESを求める
 """
 
 import os
 from datetime import datetime
+import numpy as np
 from dotenv import load_dotenv
 from services.bybit_service import BybitService
+from portfolio_risk import (
+    CONFIDENCE_LEVELS, DEFAULT_HORIZON_HOURS, DEFAULT_INTERVAL, DEFAULT_LOOKBACK,
+    build_exit_plan, estimate_covariance, horizon_steps, simulate_portfolio
+)
 
-def simulate_exits():
+N_PATHS = 100_000
+PERCENTILE_EMOJI = {1: '❌', 5: '❌', 25: '⚠️', 50: '➖', 75: '✅', 95: '✅', 99: '🎯'}
+
+def simulate_exits(n_paths: int = N_PATHS, horizon_hours: float = DEFAULT_HORIZON_HOURS, seed=None):
     """現在のポジションの決済シミュレーション"""
     load_dotenv()
-    
+
     # Bybit接続
     bybit = BybitService(
         api_key=os.getenv('BYBIT_API_KEY'),
         api_secret=os.getenv('BYBIT_API_SECRET'),
         testnet=False
     )
-    
+
     print("="*70)
     print("💰 ポジション決済シミュレーション")
     print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("="*70)
-    
+
     # 現在のポジション取得
     positions = bybit.get_positions()
     balance = bybit.get_balance()
     current_balance = balance['USDT']['available_balance']
-    
+
     print(f"\n💵 現在の残高: ${current_balance:,.2f}")
     print(f"📊 ポジション数: {len(positions)}")
-    
-    # 各ポジションのシミュレーション
-    total_scenarios = {
-        'worst_case': 0,      # 最悪（全て最終SL）
-        'bad_case': 0,        # 悪い（第2SL）
-        'break_even': 0,      # トントン（第1TP）
-        'good_case': 0,       # 良い（第3TP）
-        'best_case': 0,       # 最高（第5TP）
-        'current': 0          # 現在価格で決済
-    }
-    
+    if not positions:
+        return
+
     print("\n" + "="*70)
     print("📋 個別ポジション分析")
     print("="*70)
-    
-    for i, pos in enumerate(positions, 1):
+
+    # 共分散の推定用の5分足（KlineCache 経由なので2回目以降は差分のみ取得）
+    klines = {}
+    for pos in positions:
+        if pos['symbol'] not in klines:
+            klines[pos['symbol']] = bybit.get_klines_array(pos['symbol'], DEFAULT_INTERVAL, DEFAULT_LOOKBACK)
+
+    for pos in positions:
         print(f"\n🪙 {pos['symbol']}")
         print(f"   方向: {'ロング' if pos['side'] == 'Buy' else 'ショート'}")
         print(f"   エントリー: ${pos['entry_price']:,.2f}")
         print(f"   現在価格: ${pos['current_price']:,.2f}")
         print(f"   数量: {pos['size']}")
         print(f"   レバレッジ: {pos['leverage']}x")
-        
-        # ポジション価値
-        position_value = pos['size'] * pos['entry_price']
-        current_pnl = pos['unrealized_pnl']
-        
-        # Dynamic Exit Matrixに基づくシナリオ
-        # ロングの場合
-        if pos['side'] == 'Buy':
-            # 利確レベル（エントリーからの%）
-            tp_levels = [
-                {'name': 'TP1', 'pct': 0.005, 'exit_ratio': 0.20},  # 0.5%で20%決済
-                {'name': 'TP2', 'pct': 0.015, 'exit_ratio': 0.20},  # 1.5%で20%決済
-                {'name': 'TP3', 'pct': 0.030, 'exit_ratio': 0.25},  # 3.0%で25%決済
-                {'name': 'TP4', 'pct': 0.050, 'exit_ratio': 0.25},  # 5.0%で25%決済
-                {'name': 'TP5', 'pct': 0.100, 'exit_ratio': 0.10},  # 10%で10%決済
-            ]
-            
-            # 損切りレベル
-            sl_levels = [
-                {'name': 'SL1', 'pct': -0.005, 'exit_ratio': 0.25},  # -0.5%で25%損切り
-                {'name': 'SL2', 'pct': -0.015, 'exit_ratio': 0.50},  # -1.5%で50%損切り
-                {'name': 'SL3', 'pct': -0.040, 'exit_ratio': 0.25},  # -4.0%で25%損切り
-            ]
-        else:
-            # ショートの場合は逆
-            tp_levels = [
-                {'name': 'TP1', 'pct': -0.005, 'exit_ratio': 0.20},
-                {'name': 'TP2', 'pct': -0.015, 'exit_ratio': 0.20},
-                {'name': 'TP3', 'pct': -0.030, 'exit_ratio': 0.25},
-                {'name': 'TP4', 'pct': -0.050, 'exit_ratio': 0.25},
-                {'name': 'TP5', 'pct': -0.100, 'exit_ratio': 0.10},
-            ]
-            sl_levels = [
-                {'name': 'SL1', 'pct': 0.005, 'exit_ratio': 0.25},
-                {'name': 'SL2', 'pct': 0.015, 'exit_ratio': 0.50},
-                {'name': 'SL3', 'pct': 0.040, 'exit_ratio': 0.25},
-            ]
-        
-        print("\n   📊 決済シナリオ:")
-        
-        # 1. 最悪のケース（全てSL3で決済）
-        worst_pnl = position_value * sl_levels[2]['pct']
-        print(f"   ❌ 最悪: ${worst_pnl:,.2f} (SL3: {sl_levels[2]['pct']*100:.1f}%)")
-        total_scenarios['worst_case'] += worst_pnl
-        
-        # 2. 悪いケース（SL2で決済）
-        bad_pnl = 0
-        bad_pnl += position_value * sl_levels[0]['pct'] * sl_levels[0]['exit_ratio']  # SL1
-        bad_pnl += position_value * sl_levels[1]['pct'] * sl_levels[1]['exit_ratio']  # SL2
-        print(f"   ⚠️  悪い: ${bad_pnl:,.2f} (段階的損切り)")
-        total_scenarios['bad_case'] += bad_pnl
-        
-        # 3. トントン（TP1で全決済）
-        break_even_pnl = position_value * tp_levels[0]['pct']
-        print(f"   ➖ トントン: ${break_even_pnl:,.2f} (TP1: {tp_levels[0]['pct']*100:.1f}%)")
-        total_scenarios['break_even'] += break_even_pnl
-        
-        # 4. 良いケース（TP3まで到達）
-        good_pnl = 0
-        for tp in tp_levels[:3]:
-            good_pnl += position_value * tp['pct'] * tp['exit_ratio']
-        print(f"   ✅ 良い: ${good_pnl:,.2f} (TP3まで)")
-        total_scenarios['good_case'] += good_pnl
-        
-        # 5. 最高のケース（全TP達成）
-        best_pnl = 0
-        for tp in tp_levels:
-            best_pnl += position_value * tp['pct'] * tp['exit_ratio']
-        print(f"   🎯 最高: ${best_pnl:,.2f} (全TP達成)")
-        total_scenarios['best_case'] += best_pnl
-        
-        # 6. 現在価格で決済
-        print(f"   📍 現在: ${current_pnl:,.2f} (即決済)")
-        total_scenarios['current'] += current_pnl
-    
-    # サマリー
+        print(f"   📍 現在: ${pos['unrealized_pnl']:,.2f} (即決済)")
+
+        # Dynamic Exit Matrixの決済プラン（ATRは日足から）
+        plan = build_exit_plan(pos, bybit.get_klines_array(pos['symbol'], 'D', 30))
+        pos['exit_plan'] = plan
+        entry = plan.entry_price
+        # プランはロング前提の価格配置なので、ショートはエントリー価格で反転して表示
+        shown = (lambda price: price) if pos['side'] == 'Buy' else (lambda price: 2 * entry - price)
+        print("\n   📊 決済プラン:")
+        for i, (price, ratio) in enumerate(zip(plan.tp_prices.tolist(), plan.tp_ratios.tolist()), 1):
+            print(f"   ✅ TP{i}: ${shown(price):,.2f} ({(price / entry - 1) * 100:+.1f}%) で{ratio:.0%}決済")
+        for i, (price, ratio) in enumerate(zip(plan.sl_prices.tolist(), plan.sl_ratios.tolist()), 1):
+            print(f"   ❌ SL{i}: ${shown(price):,.2f} ({(price / entry - 1) * 100:+.1f}%) で{ratio:.0%}損切り")
+        trailing = plan.trailing_config
+        if trailing.get('enabled'):
+            print(f"   🎯 トレーリング: +{trailing['activation_profit']:.1%}で発動、"
+                  f"最高値から{trailing['callback_rate']:.1%}下落で全決済")
+
+    # モンテカルロ
+    symbols, covariance = estimate_covariance(klines)
+    steps = horizon_steps(horizon_hours)
+    result = simulate_portfolio(positions, symbols, covariance, n_paths=n_paths, steps=steps, seed=seed)
+    stats = result.stats
+
+    print("\n" + "="*70)
+    print(f"🎲 モンテカルロ（{stats['paths']:,}パス × {horizon_hours:g}時間、{result.elapsed:.1f}秒）")
+    print("="*70)
+
+    contributions = result.contributions(CONFIDENCE_LEVELS[0])
+    for j, pos in enumerate(positions):
+        pnl = result.position_pnl[:, j]
+        print(f"\n🪙 {pos['symbol']}:")
+        print(f"   予想損益: ${pnl.mean():+,.2f} (損失確率 {(pnl < 0).mean():.1%})")
+        print(f"   P5/P95: ${np.percentile(pnl, 5):+,.2f} / ${np.percentile(pnl, 95):+,.2f}")
+        print(f"   ES{CONFIDENCE_LEVELS[0]:.0%}への寄与: ${contributions[j]:,.2f}")
+
+    # 損益分布（全ポジション合計）
     print("\n" + "="*70)
     print("💰 収支シミュレーション（全ポジション合計）")
     print("="*70)
-    
-    for scenario, pnl in total_scenarios.items():
-        final_balance = current_balance + pnl
-        pct_change = (pnl / current_balance) * 100
-        
-        emoji = {
-            'worst_case': '❌',
-            'bad_case': '⚠️',
-            'break_even': '➖',
-            'good_case': '✅',
-            'best_case': '🎯',
-            'current': '📍'
-        }
-        
-        name = {
-            'worst_case': '最悪シナリオ',
-            'bad_case': '悪いシナリオ',
-            'break_even': 'トントン',
-            'good_case': '良いシナリオ',
-            'best_case': '最高シナリオ',
-            'current': '現在価格決済'
-        }
-        
-        print(f"\n{emoji[scenario]} {name[scenario]}:")
-        print(f"   損益: ${pnl:+,.2f} ({pct_change:+.2f}%)")
-        print(f"   最終残高: ${final_balance:,.2f}")
-    
-    # 期待値（確率加重平均）
+
+    for percentile, pnl in stats['pnl_percentiles'].items():
+        print(f"\n{PERCENTILE_EMOJI[percentile]} {percentile}パーセンタイル:")
+        print(f"   損益: ${pnl:+,.2f} ({pnl / current_balance * 100:+.2f}%)")
+        print(f"   最終残高: ${current_balance + pnl:,.2f}")
+
+    # 期待値
     print("\n" + "="*70)
-    print("📊 期待値計算（確率ベース）")
+    print("📊 期待値計算（シミュレーション平均）")
     print("="*70)
-    
-    probabilities = {
-        'worst_case': 0.05,   # 5%
-        'bad_case': 0.15,     # 15%
-        'break_even': 0.30,   # 30%
-        'good_case': 0.35,    # 35%
-        'best_case': 0.15,    # 15%
-    }
-    
-    expected_pnl = sum(total_scenarios[k] * v for k, v in probabilities.items() if k != 'current')
-    expected_balance = current_balance + expected_pnl
-    expected_pct = (expected_pnl / current_balance) * 100
-    
+
+    expected_pnl = stats['mean_pnl']
     print(f"\n💡 期待値:")
-    print(f"   予想損益: ${expected_pnl:+,.2f} ({expected_pct:+.2f}%)")
-    print(f"   予想残高: ${expected_balance:,.2f}")
-    
+    print(f"   予想損益: ${expected_pnl:+,.2f} ({expected_pnl / current_balance * 100:+.2f}%)")
+    print(f"   予想残高: ${current_balance + expected_pnl:,.2f}")
+    print(f"   損失確率: {stats['loss_probability']:.1%}")
+
     # リスク評価
     print("\n" + "="*70)
-    print("⚠️  リスク評価")
+    print("⚠️  リスク評価（現在価格で決済した場合との差）")
     print("="*70)
-    
-    max_loss = total_scenarios['worst_case']
-    max_loss_pct = (max_loss / current_balance) * 100
-    
-    print(f"最大損失リスク: ${max_loss:,.2f} ({max_loss_pct:.1f}%)")
-    print(f"最大利益可能性: ${total_scenarios['best_case']:,.2f} ({(total_scenarios['best_case']/current_balance)*100:.1f}%)")
-    
+
+    for level in CONFIDENCE_LEVELS:
+        var, es = stats['var'][level], stats['expected_shortfall'][level]
+        print(f"VaR{level:.0%}: ${var:,.2f} ({var / current_balance * 100:.1f}%)  "
+              f"ES{level:.0%}: ${es:,.2f} ({es / current_balance * 100:.1f}%)")
+
     # Dynamic Exit Matrixの効果
     print("\n💎 Dynamic Exit Matrixの効果:")
     simple_sl = sum(pos['size'] * pos['entry_price'] * -0.04 for pos in positions)  # 単純な4%SL
-    matrix_worst = total_scenarios['worst_case']
-    saved = simple_sl - matrix_worst
-    print(f"   段階的損切りによる損失軽減: ${saved:,.2f}")
-    print(f"   利益の段階的確保による安定性向上")
-    
+    print(f"   単純な4%損切りの損失: ${simple_sl:,.2f}")
+    print(f"   最悪1%の平均損益: ${result.pnl[result.pnl <= stats['pnl_percentiles'][1]].mean():+,.2f}")
+
     print("\n" + "="*70)
 
 if __name__ == "__main__":
@@ -208,4 +143,4 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"❌ エラー: {e}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
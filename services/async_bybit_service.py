@@ -0,0 +1,131 @@
+"""Asyncio counterpart of BybitService for concurrent market scans"""
+import asyncio
+import weakref
+from typing import Dict, List, Optional, Any
+import logging
+
+import numpy as np
+
+from services.bybit_service import BybitService
+from services.instrument_cache import InstrumentInfo
+
+logger = logging.getLogger(__name__)
+
+class AsyncBybitService:
+    """Expose BybitService methods as coroutines.
+
+    pybit only ships a blocking HTTP client, so each call runs in a worker
+    thread. All calls share one concurrency limit so a fan-out over many
+    symbols and timeframes cannot exceed the configured number of in-flight
+    requests. Request rate is governed by the wrapped service's RateLimiter,
+    which the synchronous callers share.
+    """
+
+    def __init__(self, api_key: str, api_secret: str, testnet: bool = True,
+                 max_concurrency: int = 10, service: Optional[BybitService] = None):
+        """Initialize async service, optionally wrapping an existing BybitService"""
+        self.service = service or BybitService(api_key, api_secret, testnet)
+        self.testnet = getattr(self.service, "testnet", testnet)
+        self.max_concurrency = max_concurrency
+        # asyncio primitives are bound to a single event loop
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def from_service(cls, service: BybitService, max_concurrency: int = 10) -> "AsyncBybitService":
+        """Wrap an existing BybitService so both share the same HTTP client"""
+        return cls("", "", getattr(service, "testnet", True), max_concurrency=max_concurrency, service=service)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    async def _call(self, method: str, *args, **kwargs) -> Any:
+        """Run a BybitService method in a worker thread under the shared limit"""
+        async with self._get_semaphore():
+            return await asyncio.to_thread(getattr(self.service, method), *args, **kwargs)
+
+    async def request(self, endpoint: str, method: str, **params) -> Dict[str, Any]:
+        """Call a pybit endpoint under the rate limit of its endpoint class"""
+        return await self._call("request", endpoint, method, **params)
+
+    async def test_connection(self) -> Dict[str, Any]:
+        """Test API connection and return account info"""
+        return await self._call("test_connection")
+
+    async def get_positions(self, symbol: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get current positions"""
+        return await self._call("get_positions", symbol=symbol)
+
+    async def get_balance(self) -> Dict[str, Any]:
+        """Get account balance information"""
+        return await self._call("get_balance")
+
+    async def get_ticker(self, symbol: str) -> Dict[str, Any]:
+        """Get ticker information for a symbol"""
+        return await self._call("get_ticker", symbol)
+
+    async def get_all_tickers(self, max_age: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """Get tickers for every linear symbol in one request, keyed by symbol"""
+        return await self._call("get_all_tickers", max_age=max_age)
+
+    async def refresh_tickers(self) -> Dict[str, Dict[str, Any]]:
+        """Force a new ticker snapshot"""
+        return await self._call("refresh_tickers")
+
+    async def get_orders(self, symbol: Optional[str] = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get orders"""
+        return await self._call("get_orders", symbol=symbol, status=status)
+
+    async def get_trade_history(self, symbol: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get trade history"""
+        return await self._call("get_trade_history", symbol=symbol, limit=limit)
+
+    async def get_klines(self, symbol: str, interval: str = "60", limit: int = 200) -> List[Dict[str, Any]]:
+        """Get kline/candlestick data"""
+        return await self._call("get_klines", symbol, interval, limit)
+
+    async def get_klines_array(self, symbol: str, interval: str = "60", limit: int = 200) -> np.ndarray:
+        """Get kline data as a structured array"""
+        return await self._call("get_klines_array", symbol, interval, limit)
+
+    async def load_instruments(self, force: bool = False) -> int:
+        """Load instrument rules from disk, or from the API once the file is stale"""
+        return await self._call("load_instruments", force=force)
+
+    async def get_instrument(self, symbol: str) -> Optional[InstrumentInfo]:
+        """Trading rules for a symbol"""
+        return await self._call("get_instrument", symbol)
+
+    async def load_leverage_cache(self) -> Dict[str, int]:
+        """Seed the leverage cache from every USDT position"""
+        return await self._call("load_leverage_cache")
+
+    async def set_leverage(self, symbol: str, leverage: int = 10) -> Dict[str, Any]:
+        """Set leverage for a symbol"""
+        return await self._call("set_leverage", symbol, leverage)
+
+    async def place_order(self, symbol: str, side: str, qty: float, order_type: str = "Market",
+                          price: Optional[float] = None, stop_loss: Optional[float] = None,
+                          take_profit: Optional[float] = None, leverage: int = 10) -> Dict[str, Any]:
+        """Place a new order"""
+        return await self._call(
+            "place_order", symbol, side, qty, order_type=order_type, price=price,
+            stop_loss=stop_loss, take_profit=take_profit, leverage=leverage
+        )
+
+    async def cancel_order(self, symbol: str, order_id: str) -> Dict[str, Any]:
+        """Cancel an order"""
+        return await self._call("cancel_order", symbol, order_id)
+
+    async def close_position(self, symbol: str, qty: Optional[float] = None, position_idx: int = 0,
+                             side: Optional[str] = None) -> Dict[str, Any]:
+        """Close a specific position, skipping the lookup when side and qty are given"""
+        return await self._call("close_position", symbol, qty=qty, position_idx=position_idx, side=side)
+
+    async def get_account_performance(self, days: int = 30) -> Dict[str, Any]:
+        """Calculate account performance metrics"""
+        return await self._call("get_account_performance", days=days)
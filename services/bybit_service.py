@@ -2,20 +2,119 @@
 from pybit.unified_trading import HTTP
 from typing import Dict, List, Optional, Any
 import os
+import time
+import threading
 from datetime import datetime, timedelta
 import logging
 
+import numpy as np
+
+from services.kline_cache import KlineCache, KlineRow, to_kline_array
+from services.kline_resampler import can_resample, resample_factor, resample_klines
+from services.rate_limiter import RateLimiter
+from services.instrument_cache import InstrumentCache, InstrumentInfo
+from services.market_stream import MarketDataMirror
+from services.http_pool import HTTPPool
+
 logger = logging.getLogger(__name__)
 
 class BybitService:
+    # Seconds a bulk ticker snapshot is reused before it is refetched
+    TICKER_SNAPSHOT_TTL = 5.0
+    
+    # retCode returned when the requested leverage is already set
+    LEVERAGE_NOT_MODIFIED = 110043
+    
+    # Seconds before a failed instrument download is retried
+    INSTRUMENT_RETRY_INTERVAL = 60.0
+    
+    # Endpoint classes served by the unauthenticated public client
+    PUBLIC_ENDPOINTS = frozenset({"market"})
+
     def __init__(self, api_key: str, api_secret: str, testnet: bool = True):
         """Initialize Bybit service with API credentials"""
         self.testnet = testnet
+        
+        # Separate keep-alive pools so orders never wait behind kline downloads
+        self.pools = {
+            "public": HTTPPool("public", size=int(os.getenv("BYBIT_PUBLIC_POOL_SIZE", 16))),
+            "private": HTTPPool("private", size=int(os.getenv("BYBIT_PRIVATE_POOL_SIZE", 4))),
+        }
         self.client = HTTP(
             testnet=testnet,
             api_key=api_key,
-            api_secret=api_secret
+            api_secret=api_secret,
+            return_response_headers=True
+        )
+        self.public_client = HTTP(testnet=testnet, return_response_headers=True)
+        self.pools["private"].mount(self.client.client)
+        self.pools["public"].mount(self.public_client.client)
+        
+        # Token buckets per endpoint class, shared by every thread and coroutine
+        self.rate_limiter = RateLimiter()
+        
+        # Last known leverage per symbol, so orders skip redundant set_leverage calls
+        self._leverage: Dict[str, int] = {}
+        self._leverage_lock = threading.Lock()
+        
+        # Bulk ticker snapshot shared by every consumer within a cycle
+        self._ticker_snapshot: Dict[str, Dict[str, Any]] = {}
+        self._ticker_snapshot_at = 0.0
+        self._ticker_lock = threading.Lock()
+        
+        # Kline history, extended with only the candles that changed
+        self.kline_cache = KlineCache()
+        self._kline_locks: Dict[tuple, threading.Lock] = {}
+        self._kline_locks_guard = threading.Lock()
+        
+        # Local multi-timeframe resampling (disabled until enable_resampling)
+        self.resample_base: Optional[str] = None
+        self.resample_history = 0
+        self.kline_refresh_interval = 0.0
+        
+        # Lot size / tick size / max leverage per symbol, persisted between runs
+        self.instruments = InstrumentCache(
+            path=os.getenv("INSTRUMENT_CACHE_PATH", os.path.join(".cache", "instruments.json")),
+            refresh_interval=float(os.getenv("INSTRUMENT_REFRESH_INTERVAL", 24 * 3600))
         )
+        self._instruments_lock = threading.Lock()
+        self._instruments_attempted_at = 0.0
+        
+        # Public stream mirror (see attach_market_mirror) and when each kline
+        # series was last synced over REST, to know the streamed tail has no gaps
+        self.market_mirror = None
+        self._kline_synced_at: Dict[tuple, float] = {}
+    
+    def request(self, endpoint: str, method: str, **params) -> Dict[str, Any]:
+        """Call a pybit endpoint under the rate limit of its endpoint class"""
+        self.rate_limiter.acquire(endpoint)
+        public = endpoint in self.PUBLIC_ENDPOINTS
+        pool = self.pools["public" if public else "private"]
+        started = time.monotonic()
+        try:
+            response = getattr(self.public_client if public else self.client, method)(**params)
+        except Exception:
+            pool.record(time.monotonic() - started, error=True)
+            raise
+        pool.record(time.monotonic() - started)
+        if isinstance(response, tuple):
+            response, _elapsed, headers = response
+            self.rate_limiter.update_from_headers(endpoint, headers)
+        return response
+    
+    def set_credentials(self, api_key: str, api_secret: str):
+        """Switch API keys without recreating the clients"""
+        if (api_key, api_secret) == (self.client.api_key, self.client.api_secret):
+            return
+        self.client.api_key = api_key
+        self.client.api_secret = api_secret
+        # Cached leverage belongs to the previous account
+        with self._leverage_lock:
+            self._leverage.clear()
+    
+    def get_pool_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Requests, errors, connections opened and p50/p99 latency per pool"""
+        return {name: pool.get_stats() for name, pool in self.pools.items()}
     
     def test_connection(self) -> Dict[str, Any]:
         """Test API connection and return account info"""
@@ -23,12 +122,12 @@ class BybitService:
             logger.info(f"Testing connection with testnet={self.testnet}")
             
             # Get server time to test basic connectivity
-            server_time = self.client.get_server_time()
+            server_time = self.request("market", "get_server_time")
             logger.info(f"Server time response: {server_time}")
             
             # Get account info
             logger.info("Getting wallet balance...")
-            account_info = self.client.get_wallet_balance(accountType="UNIFIED")
+            account_info = self.request("account", "get_wallet_balance", accountType="UNIFIED")
             logger.info(f"Wallet balance response status: {account_info.get('retCode')}")
             
             if account_info["retCode"] == 0:
@@ -96,9 +195,10 @@ class BybitService:
             if symbol:
                 params["symbol"] = symbol
             
-            response = self.client.get_positions(**params)
+            response = self.request("position", "get_positions", **params)
             
             if response["retCode"] == 0:
+                self._remember_leverage(response["result"]["list"])
                 positions = []
                 for pos in response["result"]["list"]:
                     if float(pos["size"]) > 0:  # Only include open positions
@@ -130,7 +230,7 @@ class BybitService:
     def get_balance(self) -> Dict[str, Any]:
         """Get account balance information"""
         try:
-            response = self.client.get_wallet_balance(accountType="UNIFIED")
+            response = self.request("account", "get_wallet_balance", accountType="UNIFIED")
             
             if response["retCode"] == 0:
                 balances = {}
@@ -171,28 +271,50 @@ class BybitService:
             logger.error(f"Error getting balance: {str(e)}")
             return {}
     
+    @staticmethod
+    def _format_ticker(ticker: Dict[str, Any]) -> Dict[str, Any]:
+        """Pick the ticker fields used by the trading logic"""
+        return {
+            "symbol": ticker["symbol"],
+            "lastPrice": ticker["lastPrice"],
+            "bid1Price": ticker["bid1Price"],
+            "ask1Price": ticker["ask1Price"],
+            "volume24h": ticker["volume24h"],
+            "turnover24h": ticker["turnover24h"],
+            "highPrice24h": ticker["highPrice24h"],
+            "lowPrice24h": ticker["lowPrice24h"],
+            "prevPrice24h": ticker["prevPrice24h"],
+            "price24hPcnt": ticker["price24hPcnt"]
+        }
+    
+    def attach_market_mirror(self, mirror: MarketDataMirror):
+        """Serve tickers and klines from a public stream mirror while it is live.
+        
+        The mirror is switched to this service's kline cache so streamed
+        candles extend the REST history in place (both are linear klines).
+        """
+        mirror.kline_cache = self.kline_cache
+        self.market_mirror = mirror
+    
+    def _with_stream_tickers(self, snapshot: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Overlay fresh streamed tickers on a REST snapshot"""
+        streamed = self.market_mirror.get_all_tickers() if self.market_mirror else {}
+        return {**snapshot, **streamed} if streamed else snapshot
+    
     def get_ticker(self, symbol: str) -> Dict[str, Any]:
         """Get ticker information for a symbol"""
+        if self.market_mirror:
+            ticker = self.market_mirror.get_ticker(symbol)
+            if ticker:
+                return self._format_ticker(ticker)
         try:
-            response = self.client.get_tickers(
+            response = self.request("market", "get_tickers",
                 category="linear",
                 symbol=symbol
             )
             
             if response["retCode"] == 0 and response["result"]["list"]:
-                ticker = response["result"]["list"][0]
-                return {
-                    "symbol": ticker["symbol"],
-                    "lastPrice": ticker["lastPrice"],
-                    "bid1Price": ticker["bid1Price"],
-                    "ask1Price": ticker["ask1Price"],
-                    "volume24h": ticker["volume24h"],
-                    "turnover24h": ticker["turnover24h"],
-                    "highPrice24h": ticker["highPrice24h"],
-                    "lowPrice24h": ticker["lowPrice24h"],
-                    "prevPrice24h": ticker["prevPrice24h"],
-                    "price24hPcnt": ticker["price24hPcnt"]
-                }
+                return self._format_ticker(response["result"]["list"][0])
             else:
                 logger.error(f"Failed to get ticker: {response.get('retMsg', 'Unknown error')}")
                 return {}
@@ -201,6 +323,42 @@ class BybitService:
             logger.error(f"Error getting ticker for {symbol}: {str(e)}")
             return {}
     
+    def get_all_tickers(self, max_age: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """Get tickers for every linear symbol in one request, keyed by symbol.
+        
+        The snapshot is cached and reused until it is older than ``max_age``
+        seconds (TICKER_SNAPSHOT_TTL by default), so all consumers in a scan
+        cycle share a single request. Pass ``max_age=0`` to force a refresh.
+        """
+        if max_age is None:
+            max_age = self.TICKER_SNAPSHOT_TTL
+        
+        with self._ticker_lock:
+            if self._ticker_snapshot and time.monotonic() - self._ticker_snapshot_at <= max_age:
+                return self._with_stream_tickers(self._ticker_snapshot)
+            
+            try:
+                response = self.request("market", "get_tickers", category="linear")
+                
+                if response["retCode"] == 0:
+                    self._ticker_snapshot = {
+                        ticker["symbol"]: self._format_ticker(ticker)
+                        for ticker in response["result"]["list"]
+                    }
+                    self._ticker_snapshot_at = time.monotonic()
+                    return self._with_stream_tickers(self._ticker_snapshot)
+                else:
+                    logger.error(f"Failed to get tickers: {response.get('retMsg', 'Unknown error')}")
+                    return {}
+                    
+            except Exception as e:
+                logger.error(f"Error getting tickers: {str(e)}")
+                return {}
+    
+    def refresh_tickers(self) -> Dict[str, Dict[str, Any]]:
+        """Force a new ticker snapshot (call once at the start of each scan cycle)"""
+        return self.get_all_tickers(max_age=0)
+    
     def get_orders(self, symbol: Optional[str] = None, status: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get orders"""
         try:
@@ -210,7 +368,7 @@ class BybitService:
             if status:
                 params["orderStatus"] = status
             
-            response = self.client.get_open_orders(**params)
+            response = self.request("account", "get_open_orders", **params)
             
             if response["retCode"] == 0:
                 orders = []
@@ -248,7 +406,7 @@ class BybitService:
             if symbol:
                 params["symbol"] = symbol
             
-            response = self.client.get_executions(**params)
+            response = self.request("account", "get_executions", **params)
             
             if response["retCode"] == 0:
                 trades = []
@@ -274,62 +432,166 @@ class BybitService:
             logger.error(f"Error getting trade history: {str(e)}")
             return []
     
+    # Convert interval to Bybit format (numeric minutes)
+    INTERVAL_MAP = {
+        "1m": "1",
+        "3m": "3", 
+        "5m": "5",
+        "15m": "15",
+        "30m": "30",
+        "1h": "60",
+        "2h": "120",
+        "4h": "240",
+        "6h": "360",
+        "12h": "720",
+        "1d": "D",
+        "1w": "W",
+        "1M": "M"
+    }
+    
+    # Maximum candles Bybit returns per kline request
+    MAX_KLINE_LIMIT = 1000
+    
+    def enable_resampling(self, base_interval: str = "5", history: int = 9000,
+                          refresh_interval: float = 10.0):
+        """Build higher timeframes locally from one cached base-interval series.
+        
+        Requests for intervals that are whole multiples of the base (up to
+        daily) are served by resampling the base series, so a multi-timeframe
+        scan costs one kline request per symbol. The base series is reused for
+        ``refresh_interval`` seconds after each refresh, which keeps every
+        timeframe in a scan built from the same data. ``history`` is the
+        minimum number of base candles kept (9000 x 5m covers 30 daily bars).
+        """
+        self.resample_base = self.INTERVAL_MAP.get(base_interval, base_interval)
+        self.resample_history = history
+        self.kline_refresh_interval = refresh_interval
+    
+    def _kline_lock(self, symbol: str, interval: str) -> threading.Lock:
+        """Per-series lock so concurrent callers share one download"""
+        with self._kline_locks_guard:
+            return self._kline_locks.setdefault((symbol, interval), threading.Lock())
+    
+    def _fetch_kline_rows(self, symbol: str, interval: str, limit: int,
+                          start: Optional[int] = None, end: Optional[int] = None) -> Optional[List[KlineRow]]:
+        """Download klines as chronological rows, or None on failure"""
+        # Linear perpetuals, like tickers, orders and the public stream, so
+        # streamed candles extend the same series in the kline cache
+        params = {
+            "category": "linear",
+            "symbol": symbol,
+            "interval": interval,
+            "limit": limit
+        }
+        if start is not None:
+            params["start"] = start
+        if end is not None:
+            params["end"] = end
+        
+        response = self.request("market", "get_kline", **params)
+        
+        logger.info(f"Kline response retCode: {response.get('retCode')}, retMsg: {response.get('retMsg')}")
+        
+        if response["retCode"] != 0:
+            logger.error(f"Failed to get klines: {response.get('retMsg', 'Unknown error')}")
+            return None
+        
+        kline_list = response.get("result", {}).get("list", [])
+        logger.info(f"Got {len(kline_list)} klines from API")
+        
+        # Bybit returns newest first; reverse to get chronological order
+        return [
+            (int(k[0]), float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]))
+            for k in reversed(kline_list)
+        ]
+    
+    def _fetch_kline_history(self, symbol: str, interval: str, limit: int) -> Optional[List[KlineRow]]:
+        """Download the latest ``limit`` klines, paging backwards past the per-request cap"""
+        rows: List[KlineRow] = []
+        end = None
+        while len(rows) < limit:
+            page_limit = min(limit - len(rows), self.MAX_KLINE_LIMIT)
+            page = self._fetch_kline_rows(symbol, interval, page_limit, end=end)
+            if page is None:
+                return None
+            rows = page + rows
+            if len(page) < page_limit:
+                break  # reached the start of the symbol's history
+            end = page[0][0] - 1
+        return rows
+    
+    def _get_kline_rows(self, symbol: str, interval: str, limit: int) -> np.ndarray:
+        """Get klines through the cache, downloading only candles newer than the cached ones"""
+        bybit_interval = self.INTERVAL_MAP.get(interval, interval)
+        logger.info(f"Getting klines for {symbol}, interval={bybit_interval}, limit={limit}")
+        
+        if self.resample_base and can_resample(self.resample_base, bybit_interval):
+            # One extra bucket of base candles covers a partial leading bucket
+            factor = resample_factor(self.resample_base, bybit_interval)
+            base = self._get_kline_rows(symbol, self.resample_base, (limit + 1) * factor)
+            return resample_klines(base, self.resample_base, bybit_interval, limit)
+        
+        with self._kline_lock(symbol, bybit_interval):
+            return self._refresh_kline_series(symbol, bybit_interval, limit)
+    
+    def _refresh_kline_series(self, symbol: str, interval: str, limit: int) -> np.ndarray:
+        """Bring one cached series up to date and return its last ``limit`` candles"""
+        cache = self.kline_cache
+        now = time.monotonic()
+        cached_count = cache.count(symbol, interval)
+        
+        age = cache.age(symbol, interval, now)
+        if age is not None and age < self.kline_refresh_interval and cached_count >= limit:
+            return cache.get(symbol, interval, limit)
+        
+        if cached_count >= limit and self._kline_streamed(symbol, interval):
+            return cache.get(symbol, interval, limit)
+        
+        missing = cache.missing_candles(symbol, interval, int(time.time() * 1000))
+        
+        if missing is None or missing > self.MAX_KLINE_LIMIT or cached_count < limit:
+            depth = max(limit, self.resample_history) if interval == self.resample_base else limit
+            rows = self._fetch_kline_history(symbol, interval, depth)
+            if rows is None:
+                return to_kline_array([])
+            cache.replace(symbol, interval, rows, fetched_at=now)
+            self._kline_synced_at[(symbol, interval)] = now
+        else:
+            # Re-request from the last cached candle so the forming bar is replaced
+            # (one extra candle of headroom absorbs local clock skew)
+            rows = self._fetch_kline_rows(
+                symbol, interval, min(missing + 1, self.MAX_KLINE_LIMIT),
+                start=cache.last_timestamp(symbol, interval)
+            )
+            if rows is None:
+                return to_kline_array([])
+            cache.merge(symbol, interval, rows, fetched_at=now)
+            self._kline_synced_at[(symbol, interval)] = now
+        
+        return cache.get(symbol, interval, limit)
+    
+    def _kline_streamed(self, symbol: str, interval: str) -> bool:
+        """True if the stream has kept this series current since its last REST sync"""
+        if self.market_mirror is None:
+            return False
+        subscribed_at = self.market_mirror.kline_subscribed_at(symbol, interval)
+        synced_at = self._kline_synced_at.get((symbol, interval))
+        return subscribed_at is not None and synced_at is not None and synced_at >= subscribed_at
+    
     def get_klines(self, symbol: str, interval: str = "60", limit: int = 200) -> List[Dict[str, Any]]:
         """Get kline/candlestick data"""
         try:
-            # Convert interval to Bybit format (numeric minutes)
-            interval_map = {
-                "1m": "1",
-                "3m": "3", 
-                "5m": "5",
-                "15m": "15",
-                "30m": "30",
-                "1h": "60",
-                "2h": "120",
-                "4h": "240",
-                "6h": "360",
-                "12h": "720",
-                "1d": "D",
-                "1w": "W",
-                "1M": "M"
-            }
-            
-            bybit_interval = interval_map.get(interval, interval)
-            logger.info(f"Getting klines for {symbol}, interval={bybit_interval}, limit={limit}")
-            
-            # For spot pairs, use 'spot' category
-            category = "spot" if not self.testnet else "linear"
-            
-            response = self.client.get_kline(
-                category=category,
-                symbol=symbol,
-                interval=bybit_interval,
-                limit=limit
-            )
-            
-            logger.info(f"Kline response retCode: {response.get('retCode')}, retMsg: {response.get('retMsg')}")
-            
-            if response["retCode"] == 0:
-                klines = []
-                kline_list = response.get("result", {}).get("list", [])
-                logger.info(f"Got {len(kline_list)} klines from API")
-                
-                for kline in kline_list:
-                    klines.append({
-                        "timestamp": datetime.fromtimestamp(int(kline[0]) / 1000).isoformat() + "Z",
-                        "open": float(kline[1]),
-                        "high": float(kline[2]),
-                        "low": float(kline[3]),
-                        "close": float(kline[4]),
-                        "volume": float(kline[5])
-                    })
-                
-                # Reverse to get chronological order
-                klines.reverse()
-                return klines
-            else:
-                logger.error(f"Failed to get klines: {response.get('retMsg', 'Unknown error')}")
-                return []
+            return [
+                {
+                    "timestamp": datetime.fromtimestamp(row[0] / 1000).isoformat() + "Z",
+                    "open": row[1],
+                    "high": row[2],
+                    "low": row[3],
+                    "close": row[4],
+                    "volume": row[5]
+                }
+                for row in self._get_kline_rows(symbol, interval, limit).tolist()
+            ]
                 
         except Exception as e:
             logger.error(f"Error getting klines: {str(e)}")
@@ -337,10 +599,97 @@ class BybitService:
             logger.error(f"Traceback: {traceback.format_exc()}")
             return []
     
+    def get_klines_array(self, symbol: str, interval: str = "60", limit: int = 200) -> np.ndarray:
+        """Get kline data as a structured array (see KLINE_DTYPE).
+        
+        Columns are read with ``klines["close"]`` etc.; timestamps are epoch ms.
+        Returns an empty array on failure.
+        """
+        try:
+            return to_kline_array(self._get_kline_rows(symbol, interval, limit))
+                
+        except Exception as e:
+            logger.error(f"Error getting klines: {str(e)}")
+            return to_kline_array([])
+    
+    def _fetch_instruments(self) -> Optional[List[Dict[str, Any]]]:
+        """Download rules for every linear instrument, following the page cursor"""
+        items: List[Dict[str, Any]] = []
+        cursor = None
+        while True:
+            params = {"category": "linear", "limit": 1000}
+            if cursor:
+                params["cursor"] = cursor
+            response = self.request("market", "get_instruments_info", **params)
+            if response["retCode"] != 0:
+                logger.error(f"Failed to get instruments: {response.get('retMsg', 'Unknown error')}")
+                return None
+            items.extend(response["result"]["list"])
+            cursor = response["result"].get("nextPageCursor")
+            if not cursor:
+                return items
+    
+    def load_instruments(self, force: bool = False) -> int:
+        """Load instrument rules from disk, or from the API once the file is stale"""
+        with self._instruments_lock:
+            if not force and not self.instruments.is_stale():
+                return len(self.instruments)
+            if not force and self.instruments.load() and not self.instruments.is_stale():
+                logger.info(f"Loaded {len(self.instruments)} instruments from {self.instruments.path}")
+                return len(self.instruments)
+            
+            self._instruments_attempted_at = time.time()
+            try:
+                items = self._fetch_instruments()
+            except Exception as e:
+                logger.error(f"Error getting instruments: {str(e)}")
+                items = None
+            if items:
+                self.instruments.replace(items)
+                try:
+                    self.instruments.save()
+                except OSError as e:
+                    logger.warning(f"Could not save instrument cache: {str(e)}")
+                logger.info(f"Fetched {len(self.instruments)} instruments")
+            return len(self.instruments)
+    
+    def get_instrument(self, symbol: str) -> Optional[InstrumentInfo]:
+        """Trading rules for a symbol, refreshing the cache when it is stale"""
+        if self.instruments.is_stale() and \
+                time.time() - self._instruments_attempted_at >= self.INSTRUMENT_RETRY_INTERVAL:
+            self.load_instruments()
+        return self.instruments.get(symbol)
+    
+    def _remember_leverage(self, raw_positions: List[Dict[str, Any]]):
+        """Record leverage reported by the position list"""
+        with self._leverage_lock:
+            for pos in raw_positions:
+                if pos.get("leverage"):
+                    self._leverage[pos["symbol"]] = int(float(pos["leverage"]))
+    
+    def load_leverage_cache(self) -> Dict[str, int]:
+        """Seed the leverage cache from every USDT position"""
+        try:
+            response = self.request("position", "get_positions", category="linear", settleCoin="USDT")
+            if response["retCode"] == 0:
+                self._remember_leverage(response["result"]["list"])
+            else:
+                logger.error(f"Failed to load leverage: {response.get('retMsg', 'Unknown error')}")
+        except Exception as e:
+            logger.error(f"Error loading leverage: {str(e)}")
+        return self.get_cached_leverage()
+    
+    def get_cached_leverage(self, symbol: Optional[str] = None):
+        """Cached leverage for a symbol (None if unknown), or all symbols"""
+        with self._leverage_lock:
+            if symbol is None:
+                return dict(self._leverage)
+            return self._leverage.get(symbol)
+    
     def set_leverage(self, symbol: str, leverage: int = 10) -> Dict[str, Any]:
         """Set leverage for a symbol"""
         try:
-            response = self.client.set_leverage(
+            response = self.request("leverage", "set_leverage",
                 category="linear",
                 symbol=symbol,
                 buyLeverage=str(leverage),
@@ -349,13 +698,23 @@ class BybitService:
             
             if response["retCode"] == 0:
                 logger.info(f"Leverage set to {leverage}x for {symbol}")
+                with self._leverage_lock:
+                    self._leverage[symbol] = leverage
                 return {"success": True, "leverage": leverage}
             else:
                 logger.error(f"Failed to set leverage: {response.get('retMsg', 'Unknown error')}")
+                with self._leverage_lock:
+                    self._leverage.pop(symbol, None)
                 return {"success": False, "error": response.get('retMsg')}
                 
         except Exception as e:
+            if getattr(e, "status_code", None) == self.LEVERAGE_NOT_MODIFIED:
+                with self._leverage_lock:
+                    self._leverage[symbol] = leverage
+                return {"success": True, "leverage": leverage}
             logger.error(f"Error setting leverage: {str(e)}")
+            with self._leverage_lock:
+                self._leverage.pop(symbol, None)
             return {"success": False, "error": str(e)}
     
     def place_order(self, symbol: str, side: str, qty: float, order_type: str = "Market", 
@@ -363,30 +722,35 @@ class BybitService:
                    take_profit: Optional[float] = None, leverage: int = 10) -> Dict[str, Any]:
         """Place a new order"""
         try:
-            # レバレッジを設定（10倍）
-            leverage_result = self.set_leverage(symbol, leverage)
-            if not leverage_result.get("success"):
-                logger.warning(f"Could not set leverage for {symbol}, continuing with current leverage")
+            instrument = self.get_instrument(symbol)
+            if instrument:
+                leverage = min(leverage, int(instrument.max_leverage))
+            
+            # レバレッジを設定（既に同じ倍率ならスキップ）
+            if self.get_cached_leverage(symbol) != leverage:
+                leverage_result = self.set_leverage(symbol, leverage)
+                if not leverage_result.get("success"):
+                    logger.warning(f"Could not set leverage for {symbol}, continuing with current leverage")
             
             params = {
                 "category": "linear",
                 "symbol": symbol,
                 "side": side,
                 "orderType": order_type,
-                "qty": str(qty),
+                "qty": instrument.format_qty(qty) if instrument else str(qty),
                 "timeInForce": "IOC" if order_type == "Market" else "GTC"
             }
             
             if order_type == "Limit" and price:
-                params["price"] = str(price)
+                params["price"] = instrument.format_price(price) if instrument else str(price)
             
             if stop_loss:
-                params["stopLoss"] = str(stop_loss)
+                params["stopLoss"] = instrument.format_price(stop_loss) if instrument else str(stop_loss)
             
             if take_profit:
-                params["takeProfit"] = str(take_profit)
+                params["takeProfit"] = instrument.format_price(take_profit) if instrument else str(take_profit)
             
-            response = self.client.place_order(**params)
+            response = self.request("order", "place_order", **params)
             
             if response["retCode"] == 0:
                 return {
@@ -416,7 +780,7 @@ class BybitService:
     def cancel_order(self, symbol: str, order_id: str) -> Dict[str, Any]:
         """Cancel an order"""
         try:
-            response = self.client.cancel_order(
+            response = self.request("order", "cancel_order",
                 category="linear",
                 symbol=symbol,
                 orderId=order_id
@@ -437,29 +801,39 @@ class BybitService:
                 "error": str(e)
             }
     
-    def close_position(self, symbol: str, qty: Optional[float] = None, position_idx: int = 0) -> Dict[str, Any]:
-        """Close a specific position"""
+    def close_position(self, symbol: str, qty: Optional[float] = None, position_idx: int = 0,
+                       side: Optional[str] = None) -> Dict[str, Any]:
+        """Close a specific position.
+        
+        When the caller tracks the position locally and passes its side and
+        qty, the reduce-only order is sent immediately without looking the
+        position up first.
+        """
         try:
-            # Get current position details
-            positions = self.get_positions(symbol=symbol)
-            position = next((p for p in positions if p["symbol"] == symbol), None)
-            
-            if not position:
-                return {
-                    "success": False,
-                    "error": "Position not found"
-                }
-            
-            # Use provided qty for partial close, or position size for full close
-            close_qty = qty if qty is not None else position["size"]
+            if side is None or qty is None:
+                # Get current position details
+                positions = self.get_positions(symbol=symbol)
+                position = next((p for p in positions if p["symbol"] == symbol), None)
+                
+                if not position:
+                    return {
+                        "success": False,
+                        "error": "Position not found"
+                    }
+                
+                side = position["side"]
+                # Use provided qty for partial close, or position size for full close
+                if qty is None:
+                    qty = position["size"]
             
             # Place a market order in the opposite direction to close the position
-            response = self.client.place_order(
+            instrument = self.get_instrument(symbol)
+            response = self.request("order", "place_order",
                 category="linear",
                 symbol=symbol,
-                side="Sell" if position["side"] == "Buy" else "Buy",
+                side="Sell" if side == "Buy" else "Buy",
                 orderType="Market",
-                qty=str(close_qty),
+                qty=instrument.format_qty(qty) if instrument else str(qty),
                 timeInForce="IOC",
                 reduceOnly=True,
                 positionIdx=position_idx
@@ -487,7 +861,7 @@ class BybitService:
         """Calculate account performance metrics"""
         try:
             # Get current balance
-            wallet = self.client.get_wallet_balance(accountType="UNIFIED")
+            wallet = self.request("account", "get_wallet_balance", accountType="UNIFIED")
             if wallet["retCode"] != 0:
                 return {}
             
@@ -500,7 +874,7 @@ class BybitService:
             start_time = end_time - timedelta(days=actual_days)
             
             # Use closed P&L endpoint for trade history
-            pnl_response = self.client.get_closed_pnl(
+            pnl_response = self.request("account", "get_closed_pnl",
                 category="linear",
                 startTime=int(start_time.timestamp() * 1000),
                 endTime=int(end_time.timestamp() * 1000),
@@ -544,12 +918,11 @@ def get_bybit_service(api_key: str, api_secret: str, testnet: bool = True) -> By
     """Get or create Bybit service instance"""
     global _bybit_service
     
-    # Always create a new instance when credentials are provided
-    # This ensures the service uses the latest credentials
-    if api_key and api_secret:
-        _bybit_service = BybitService(api_key, api_secret, testnet)
-    elif _bybit_service is None:
-        # Create with empty credentials if no service exists
-        _bybit_service = BybitService("", "", testnet)
+    # Reuse the instance (and its warm connection pools) across calls;
+    # new credentials are applied in place
+    if _bybit_service is None or _bybit_service.testnet != testnet:
+        _bybit_service = BybitService(api_key or "", api_secret or "", testnet)
+    elif api_key and api_secret:
+        _bybit_service.set_credentials(api_key, api_secret)
     
-    return _bybit_service
\ No newline at end of file
+    return _bybit_service
@@ -0,0 +1,211 @@
+"""WebSocket connection handling shared by the Bybit v5 public and private streams"""
+import json
+import itertools
+import socket
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+import logging
+
+import websocket
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_LINEAR_WS_URL = "wss://stream.bybit.com/v5/public/linear"
+PUBLIC_LINEAR_WS_URL_TESTNET = "wss://stream-testnet.bybit.com/v5/public/linear"
+PRIVATE_WS_URL = "wss://stream.bybit.com/v5/private"
+PRIVATE_WS_URL_TESTNET = "wss://stream-testnet.bybit.com/v5/private"
+
+class BybitStream:
+    """Self-reconnecting WebSocket connection to one Bybit v5 endpoint.
+
+    Runs websocket-client in a daemon thread, sends the application-level
+    ping Bybit expects every 20 seconds and replays the current topic set
+    after every reconnect. Subclasses implement ``_handle_message``.
+    """
+
+    # Bybit accepts at most 10 topics per subscribe request
+    SUBSCRIBE_BATCH = 10
+
+    def __init__(self, url: str, ping_interval: float = 20.0,
+                 reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0):
+        self.url = url
+        self.ping_interval = ping_interval
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self.topics: Set[str] = set()
+        self.connected = threading.Event()
+        self.stats = {"connects": 0, "messages": 0, "errors": 0}
+
+        self._ws: Optional[websocket.WebSocketApp] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._heartbeat: Optional[threading.Thread] = None
+        self._send_lock = threading.Lock()
+        self._topics_lock = threading.Lock()
+        self._req_ids = itertools.count(1)
+
+    # ----- lifecycle -----
+
+    def start(self, timeout: Optional[float] = None) -> bool:
+        """Start the connection thread; optionally wait until it is connected"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"{type(self).__name__}", daemon=True)
+            self._thread.start()
+            self._heartbeat = threading.Thread(target=self._ping_loop, name=f"{type(self).__name__}-ping", daemon=True)
+            self._heartbeat.start()
+        return self.connected.wait(timeout) if timeout else self.connected.is_set()
+
+    def stop(self):
+        """Close the connection and stop reconnecting"""
+        self._stop.set()
+        self._disconnect()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.connected.clear()
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            self._ws = websocket.WebSocketApp(
+                self.url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+                on_close=self._on_close,
+            )
+            started = time.monotonic()
+            self._ws.run_forever()
+            self.connected.clear()
+            if self._stop.is_set():
+                break
+            # Back off only when connections keep failing quickly
+            delay = self.reconnect_delay if time.monotonic() - started > self.max_reconnect_delay else min(delay * 2, self.max_reconnect_delay)
+            logger.warning(f"{type(self).__name__} disconnected, reconnecting in {delay:.1f}s")
+            self._stop.wait(delay)
+
+    def _disconnect(self):
+        """Send a close frame and shut the socket down from any thread.
+
+        The socket is deliberately not closed here: closing it under the
+        connection thread's poll can leave that thread waiting forever, so
+        it is left to notice the shutdown and tear the connection down.
+        """
+        ws = self._ws
+        sock = ws.sock if ws is not None else None
+        if sock is None or sock.sock is None:
+            return
+        try:
+            sock.send_close()
+            sock.sock.shutdown(socket.SHUT_RDWR)
+        except (OSError, websocket.WebSocketException) as e:
+            logger.debug(f"Disconnect failed: {str(e)}")
+
+    def _ping_loop(self):
+        while not self._stop.wait(self.ping_interval):
+            if self.connected.is_set():
+                self._send({"op": "ping"})
+
+    # ----- websocket-client callbacks -----
+
+    def _on_open(self, ws):
+        self.stats["connects"] += 1
+        logger.info(f"{type(self).__name__} connected to {self.url}")
+        if self._after_connect():
+            self._resubscribe()
+
+    def _on_message(self, ws, message: str):
+        self.stats["messages"] += 1
+        try:
+            payload = json.loads(message)
+        except ValueError:
+            logger.debug(f"Ignoring non-JSON message: {message[:100]}")
+            return
+        if "topic" in payload:
+            try:
+                self._handle_message(payload)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Error handling {payload.get('topic')}: {str(e)}")
+        else:
+            self._handle_response(payload)
+
+    def _on_error(self, ws, error):
+        if self._stop.is_set():
+            logger.debug(f"{type(self).__name__} error while stopping: {error}")
+            return
+        if isinstance(error, websocket.WebSocketConnectionClosedException):
+            logger.warning(f"{type(self).__name__} connection closed: {error}")
+            return
+        self.stats["errors"] += 1
+        logger.error(f"{type(self).__name__} error: {error}")
+
+    def _on_close(self, ws, status_code, message):
+        self.connected.clear()
+
+    # ----- hooks -----
+
+    def _after_connect(self) -> bool:
+        """Called on every (re)connect; return True once topics may be subscribed"""
+        self.connected.set()
+        return True
+
+    def _handle_response(self, payload: Dict[str, Any]):
+        """Handle op responses (subscribe, ping, auth)"""
+        if payload.get("success") is False:
+            logger.error(f"{type(self).__name__} request failed: {payload}")
+
+    def _handle_message(self, payload: Dict[str, Any]):
+        raise NotImplementedError
+
+    # ----- subscriptions -----
+
+    def _send(self, message: Dict[str, Any]) -> bool:
+        message.setdefault("req_id", str(next(self._req_ids)))
+        with self._send_lock:
+            try:
+                self._ws.send(json.dumps(message))
+                return True
+            except Exception as e:
+                logger.debug(f"Send failed: {str(e)}")
+                return False
+
+    def _send_topics(self, op: str, topics: List[str]):
+        for i in range(0, len(topics), self.SUBSCRIBE_BATCH):
+            self._send({"op": op, "args": topics[i:i + self.SUBSCRIBE_BATCH]})
+
+    def _resubscribe(self):
+        with self._topics_lock:
+            topics = sorted(self.topics)
+        self._on_subscribed(topics)
+        self._send_topics("subscribe", topics)
+
+    def _on_subscribed(self, topics: Iterable[str]):
+        """Called before topics are (re)subscribed"""
+
+    def subscribe(self, topics: Iterable[str]):
+        """Add topics; sent now if connected, otherwise on connect"""
+        with self._topics_lock:
+            new = sorted(set(topics) - self.topics)
+            self.topics.update(new)
+        if new and self.connected.is_set():
+            self._on_subscribed(new)
+            self._send_topics("subscribe", new)
+
+    def unsubscribe(self, topics: Iterable[str]):
+        """Remove topics"""
+        with self._topics_lock:
+            gone = sorted(set(topics) & self.topics)
+            self.topics.difference_update(gone)
+        if gone and self.connected.is_set():
+            self._send_topics("unsubscribe", gone)
+
+    def set_topics(self, topics: Iterable[str]):
+        """Subscribe and unsubscribe so that exactly ``topics`` are streamed"""
+        topics = set(topics)
+        with self._topics_lock:
+            current = set(self.topics)
+        self.unsubscribe(current - topics)
+        self.subscribe(topics - current)
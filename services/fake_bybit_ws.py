@@ -0,0 +1,159 @@
+"""Local stand-in for the Bybit v5 WebSocket endpoints, for tests and dry runs"""
+import asyncio
+import hashlib
+import hmac
+import json
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+import logging
+
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+logger = logging.getLogger(__name__)
+
+class FakeBybitWebSocketServer:
+    """Speaks enough of the v5 protocol for BybitStream clients.
+
+    Answers subscribe / unsubscribe / ping requests and pushes whatever
+    messages are published for a topic to every client subscribed to it.
+    With credentials it behaves like the private endpoint: clients must
+    authenticate with a valid signature before subscribing. Runs its own
+    event loop in a daemon thread, so tests drive it from ordinary
+    synchronous code.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 api_key: Optional[str] = None, api_secret: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self._authenticated: Set[Any] = set()
+        self.received = []  # every request received, in order
+        self._clients: Dict[Any, Set[str]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._changed = threading.Condition()
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    # ----- lifecycle -----
+
+    def start(self) -> str:
+        """Start serving and return the ws:// URL"""
+        self._thread = threading.Thread(target=self._run, name="FakeBybitWebSocketServer", daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+        return self.url
+
+    def stop(self):
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(5)
+            self._thread.join(5)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._serve())
+
+    async def _serve(self):
+        self._stopped = asyncio.Event()
+        async with serve(self._handler, self.host, self.port) as server:
+            self._server = server
+            self.port = server.sockets[0].getsockname()[1]
+            self._ready.set()
+            await self._stopped.wait()
+
+    async def _shutdown(self):
+        self._server.close()
+        self._stopped.set()
+
+    # ----- protocol -----
+
+    async def _handler(self, connection):
+        self._clients[connection] = set()
+        try:
+            async for raw in connection:
+                request = json.loads(raw)
+                self.received.append(request)
+                reply = self._reply(connection, request)
+                if reply is not None:
+                    await connection.send(json.dumps(reply))
+                self._notify()
+        except ConnectionClosed:
+            pass
+        finally:
+            self._clients.pop(connection, None)
+            self._authenticated.discard(connection)
+            self._notify()
+
+    def _reply(self, connection, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        op = request.get("op")
+        base = {"req_id": request.get("req_id", ""), "conn_id": str(id(connection)), "op": op}
+        if op == "ping":
+            return {**base, "success": True, "ret_msg": "pong"}
+        if op == "auth":
+            ok = self._verify_auth(request.get("args", []))
+            if ok:
+                self._authenticated.add(connection)
+            return {**base, "success": ok, "ret_msg": "" if ok else "Request not authorized"}
+        if op == "subscribe":
+            if self.api_secret and connection not in self._authenticated:
+                return {**base, "success": False, "ret_msg": "Request not authorized"}
+            self._clients[connection].update(request.get("args", []))
+            return {**base, "success": True, "ret_msg": ""}
+        if op == "unsubscribe":
+            self._clients[connection].difference_update(request.get("args", []))
+            return {**base, "success": True, "ret_msg": ""}
+        return {**base, "success": False, "ret_msg": f"unsupported op: {op}"}
+
+    def _verify_auth(self, args) -> bool:
+        if not self.api_secret or len(args) != 3:
+            return False
+        api_key, expires, signature = args
+        expected = hmac.new(self.api_secret.encode(), f"GET/realtime{expires}".encode(), hashlib.sha256).hexdigest()
+        return api_key == self.api_key and int(expires) > time.time() * 1000 and hmac.compare_digest(signature, expected)
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    # ----- test controls -----
+
+    def subscriptions(self) -> Set[str]:
+        """Topics subscribed by any connected client"""
+        return set().union(*list(self._clients.values())) if self._clients else set()
+
+    def wait_for(self, predicate, timeout: float = 5.0) -> bool:
+        """Block until ``predicate(server)`` is true"""
+        with self._changed:
+            return self._changed.wait_for(lambda: predicate(self), timeout)
+
+    def publish(self, topic: str, data: Any, type: str = "snapshot", ts: Optional[int] = None,
+                **extra) -> int:
+        """Push a message to every subscriber of ``topic``; returns the number of recipients"""
+        message = {"topic": topic, "type": type, "ts": ts or int(time.time() * 1000), "data": data, **extra}
+        return asyncio.run_coroutine_threadsafe(self._broadcast(topic, message), self._loop).result(5)
+
+    async def _broadcast(self, topic: str, message: Dict[str, Any]) -> int:
+        raw = json.dumps(message)
+        recipients = [c for c, topics in list(self._clients.items()) if topic in topics]
+        for connection in recipients:
+            try:
+                await connection.send(raw)
+            except ConnectionClosed:
+                pass
+        return len(recipients)
+
+    def disconnect_all(self):
+        """Drop every client connection (to exercise reconnects)"""
+        async def close():
+            for connection in list(self._clients):
+                connection.transport.abort()
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result(5)
@@ -0,0 +1,76 @@
+"""Keep-alive HTTP connection pools for the pybit clients"""
+import socket
+import threading
+from collections import deque
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+# TCP keep-alive on pooled sockets so idle connections survive NATs and
+# load balancers between scans instead of being re-established
+KEEPALIVE_SOCKET_OPTIONS: List[Tuple[int, int, int]] = HTTPConnection.default_socket_options + [
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+]
+for _name, _value in (("TCP_KEEPIDLE", 30), ("TCP_KEEPINTVL", 10), ("TCP_KEEPCNT", 3)):
+    if hasattr(socket, _name):
+        KEEPALIVE_SOCKET_OPTIONS.append((socket.IPPROTO_TCP, getattr(socket, _name), _value))
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections use KEEPALIVE_SOCKET_OPTIONS"""
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        pool_kwargs.setdefault("socket_options", KEEPALIVE_SOCKET_OPTIONS)
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+
+class HTTPPool:
+    """A sized keep-alive connection pool with request latency stats.
+
+    Mount it on the requests.Session of a pybit HTTP client. With
+    ``block=True`` callers beyond ``size`` wait for a free connection
+    instead of opening one that is thrown away afterwards, so the TLS
+    connections stay warm. Connections are established once and then
+    reused: TLS contexts are shared by requests, and urllib3 does not
+    resume TLS sessions, so reuse happens at the connection level.
+    """
+
+    def __init__(self, name: str, size: int = 10, block: bool = True, latency_window: int = 1000):
+        self.name = name
+        self.size = size
+        self.adapter = KeepAliveAdapter(pool_connections=2, pool_maxsize=size, pool_block=block)
+        self._latencies = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0}
+
+    def mount(self, session: requests.Session) -> requests.Session:
+        session.mount("https://", self.adapter)
+        session.mount("http://", self.adapter)
+        return session
+
+    def record(self, seconds: float, error: bool = False):
+        with self._lock:
+            self.stats["requests"] += 1
+            if error:
+                self.stats["errors"] += 1
+            else:
+                self._latencies.append(seconds)
+
+    def connections_opened(self) -> int:
+        """Connections established so far (each one is a TCP + TLS handshake)"""
+        pools = self.adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            stats = dict(self.stats)
+        stats.update({
+            "pool_size": self.size,
+            "connections_opened": self.connections_opened(),
+            "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+            "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else None,
+            "max_ms": float(latencies.max()) if len(latencies) else None,
+        })
+        return stats
@@ -0,0 +1,135 @@
+"""Instrument trading rules (lot size, tick size, leverage) with a disk cache"""
+from decimal import Decimal
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, NamedTuple, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _decimals(step: str) -> int:
+    """Number of decimal places in a step such as "0.001" or "1" """
+    return max(-Decimal(step).normalize().as_tuple().exponent, 0)
+
+class InstrumentInfo(NamedTuple):
+    symbol: str
+    qty_step: float
+    min_order_qty: float
+    max_order_qty: float
+    min_notional: float
+    tick_size: float
+    max_leverage: float
+    qty_decimals: int
+    price_decimals: int
+
+    @classmethod
+    def from_api(cls, item: Dict[str, Any]) -> "InstrumentInfo":
+        """Build from one get_instruments_info list entry"""
+        lot = item.get("lotSizeFilter", {})
+        price = item.get("priceFilter", {})
+        leverage = item.get("leverageFilter", {})
+        qty_step = lot.get("qtyStep") or "0.001"
+        tick_size = price.get("tickSize") or "0.01"
+        return cls(
+            symbol=item["symbol"],
+            qty_step=float(qty_step),
+            min_order_qty=float(lot.get("minOrderQty") or qty_step),
+            max_order_qty=float(lot.get("maxOrderQty") or "inf"),
+            min_notional=float(lot.get("minNotionalValue") or 0),
+            tick_size=float(tick_size),
+            max_leverage=float(leverage.get("maxLeverage") or 1),
+            qty_decimals=_decimals(qty_step),
+            price_decimals=_decimals(tick_size),
+        )
+
+    def round_qty(self, qty: float) -> float:
+        """Round a quantity down to the lot step"""
+        steps = math.floor(qty / self.qty_step + 1e-9)
+        return round(min(steps * self.qty_step, self.max_order_qty), self.qty_decimals)
+
+    def min_qty(self, price: float) -> float:
+        """Smallest order quantity at ``price`` meeting both min_order_qty and min_notional"""
+        if self.min_notional <= 0 or price <= 0:
+            return self.min_order_qty
+        steps = math.ceil(self.min_notional / price / self.qty_step - 1e-9)
+        return max(round(steps * self.qty_step, self.qty_decimals), self.min_order_qty)
+
+    def round_price(self, price: float) -> float:
+        """Round a price to the nearest tick"""
+        return round(round(price / self.tick_size) * self.tick_size, self.price_decimals)
+
+    def format_qty(self, qty: float) -> str:
+        return f"{self.round_qty(qty):.{self.qty_decimals}f}"
+
+    def format_price(self, price: float) -> str:
+        return f"{self.round_price(price):.{self.price_decimals}f}"
+
+class InstrumentCache:
+    """Instrument rules by symbol, persisted as JSON and refreshed periodically"""
+
+    def __init__(self, path: Optional[str] = None, refresh_interval: float = 24 * 3600):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self._instruments: Dict[str, InstrumentInfo] = {}
+        self.loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._instruments)
+
+    def get(self, symbol: str) -> Optional[InstrumentInfo]:
+        return self._instruments.get(symbol)
+
+    def is_stale(self, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        return not self._instruments or now - self.loaded_at >= self.refresh_interval
+
+    def replace(self, items: Iterable[Dict[str, Any]], loaded_at: Optional[float] = None):
+        """Replace the cache with raw get_instruments_info entries"""
+        instruments = {}
+        for item in items:
+            try:
+                info = InstrumentInfo.from_api(item)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.debug(f"Skipping instrument {item.get('symbol')}: {e}")
+                continue
+            instruments[info.symbol] = info
+        with self._lock:
+            self._instruments = instruments
+            self.loaded_at = time.time() if loaded_at is None else loaded_at
+
+    def load(self) -> bool:
+        """Load from disk; False if there is no usable file"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            instruments = {symbol: InstrumentInfo(**fields) for symbol, fields in data["instruments"].items()}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring instrument cache {self.path}: {e}")
+            return False
+        with self._lock:
+            self._instruments = instruments
+            self.loaded_at = float(data.get("loaded_at", 0))
+        return True
+
+    def save(self):
+        """Write to disk atomically"""
+        if not self.path:
+            return
+        with self._lock:
+            data = {
+                "loaded_at": self.loaded_at,
+                "instruments": {symbol: info._asdict() for symbol, info in self._instruments.items()},
+            }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,161 @@
+"""In-memory kline history that is extended incrementally"""
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Candle row: (start time in epoch ms, open, high, low, close, volume)
+KlineRow = Tuple[int, float, float, float, float, float]
+
+# Columnar kline block: int64 epoch ms + float64 OHLCV
+KLINE_DTYPE = np.dtype([
+    ("timestamp", np.int64),
+    ("open", np.float64),
+    ("high", np.float64),
+    ("low", np.float64),
+    ("close", np.float64),
+    ("volume", np.float64),
+])
+
+# Bybit interval -> candle length in milliseconds ("M" has no fixed length)
+INTERVAL_MS = {
+    "1": 60_000,
+    "3": 180_000,
+    "5": 300_000,
+    "15": 900_000,
+    "30": 1_800_000,
+    "60": 3_600_000,
+    "120": 7_200_000,
+    "240": 14_400_000,
+    "360": 21_600_000,
+    "720": 43_200_000,
+    "D": 86_400_000,
+    "W": 604_800_000,
+}
+
+def to_kline_array(klines: Any) -> np.ndarray:
+    """Convert klines to a KLINE_DTYPE structured array.
+
+    Accepts an existing array (returned as-is), a list of KlineRow tuples, or
+    the list-of-dicts format returned by BybitService.get_klines.
+    """
+    if isinstance(klines, np.ndarray):
+        return klines
+    if klines is None or len(klines) == 0:
+        return np.empty(0, dtype=KLINE_DTYPE)
+    if isinstance(klines[0], dict):
+        klines = [
+            (
+                int(datetime.fromisoformat(k["timestamp"].rstrip("Z")).timestamp() * 1000)
+                if k.get("timestamp") else 0,
+                float(k["open"]), float(k["high"]), float(k["low"]),
+                float(k["close"]), float(k["volume"])
+            )
+            for k in klines
+        ]
+    return np.array(klines, dtype=KLINE_DTYPE)
+
+class KlineCache:
+    """Per-(symbol, interval) candle history.
+
+    Each series is a chronological KLINE_DTYPE array. The last candle is
+    usually the still-forming one, so merging new rows replaces every cached
+    candle whose start time is at or after the first incoming row.
+    """
+
+    def __init__(self, max_candles: int = 10_000):
+        self.max_candles = max_candles
+        self._series: Dict[Tuple[str, str], np.ndarray] = {}
+        self._fetched_at: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "full_fetches": 0,
+            "incremental_fetches": 0,
+            "candles_fetched": 0,
+            "stream_updates": 0,
+        }
+
+    def get(self, symbol: str, interval: str, limit: Optional[int] = None) -> np.ndarray:
+        """Return the cached candles (the last ``limit`` when given)"""
+        with self._lock:
+            series = self._series.get((symbol, interval))
+            if series is None:
+                return np.empty(0, dtype=KLINE_DTYPE)
+            return series[-limit:] if limit else series
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    def count(self, symbol: str, interval: str) -> int:
+        """Number of cached candles for a series"""
+        with self._lock:
+            series = self._series.get((symbol, interval))
+            return 0 if series is None else len(series)
+
+    def age(self, symbol: str, interval: str, now: float) -> Optional[float]:
+        """Seconds since a series was last refreshed (monotonic clock), or None"""
+        with self._lock:
+            fetched_at = self._fetched_at.get((symbol, interval))
+            return None if fetched_at is None else now - fetched_at
+
+    def last_timestamp(self, symbol: str, interval: str) -> Optional[int]:
+        """Start time of the newest cached candle, or None if nothing is cached"""
+        with self._lock:
+            series = self._series.get((symbol, interval))
+            return int(series["timestamp"][-1]) if series is not None and len(series) else None
+
+    def replace(self, symbol: str, interval: str, rows: List[KlineRow], fetched_at: float = 0.0):
+        """Replace a series with a freshly downloaded history"""
+        series = to_kline_array(rows)
+        with self._lock:
+            self._series[(symbol, interval)] = series[-self.max_candles:]
+            self._fetched_at[(symbol, interval)] = fetched_at
+            self.stats["full_fetches"] += 1
+            self.stats["candles_fetched"] += len(series)
+
+    def merge(self, symbol: str, interval: str, rows: List[KlineRow], fetched_at: float = 0.0,
+              streamed: bool = False):
+        """Append new candles, replacing any cached candle they overlap"""
+        if len(rows) == 0:
+            return
+
+        incoming = to_kline_array(rows)
+        with self._lock:
+            cached = self._series.get((symbol, interval))
+            if cached is None:
+                cached = np.empty(0, dtype=KLINE_DTYPE)
+            keep = np.searchsorted(cached["timestamp"], incoming["timestamp"][0], side="left")
+            # Candles newer than the incoming block (e.g. a late stream push) are kept
+            after = np.searchsorted(cached["timestamp"], incoming["timestamp"][-1], side="right")
+            merged = np.concatenate([cached[:keep], incoming, cached[after:]])
+            self._series[(symbol, interval)] = merged[-self.max_candles:]
+            self._fetched_at[(symbol, interval)] = fetched_at
+            if streamed:
+                self.stats["stream_updates"] += 1
+            else:
+                self.stats["incremental_fetches"] += 1
+                self.stats["candles_fetched"] += len(incoming)
+
+    def missing_candles(self, symbol: str, interval: str, now_ms: int) -> Optional[int]:
+        """Candles to request to bring a series up to date (including the forming one).
+
+        Returns None when the series is empty or the interval has no fixed
+        length, meaning a full download is required.
+        """
+        last_ts = self.last_timestamp(symbol, interval)
+        interval_ms = INTERVAL_MS.get(interval)
+        if last_ts is None or interval_ms is None:
+            return None
+        return max(now_ms - last_ts, 0) // interval_ms + 1
+
+    def clear(self, symbol: Optional[str] = None):
+        """Drop cached history (for one symbol, or everything)"""
+        with self._lock:
+            if symbol is None:
+                self._series.clear()
+                self._fetched_at.clear()
+            else:
+                for key in [k for k in self._series if k[0] == symbol]:
+                    del self._series[key]
+                    self._fetched_at.pop(key, None)
@@ -0,0 +1,56 @@
+"""Build higher-timeframe klines locally from a base-interval series"""
+from typing import Optional
+
+import numpy as np
+
+from services.kline_cache import INTERVAL_MS, KLINE_DTYPE, to_kline_array
+
+def can_resample(base_interval: str, target_interval: str) -> bool:
+    """True if target candles can be built from whole base candles.
+
+    Minute and daily buckets are aligned to the UTC epoch like Bybit's own
+    candles. Weekly and monthly candles are not, so they are never derived.
+    """
+    if target_interval in ("W", "M") or base_interval == target_interval:
+        return False
+    base_ms = INTERVAL_MS.get(base_interval)
+    target_ms = INTERVAL_MS.get(target_interval)
+    if base_ms is None or target_ms is None:
+        return False
+    return target_ms > base_ms and target_ms % base_ms == 0
+
+def resample_factor(base_interval: str, target_interval: str) -> int:
+    """Number of base candles in one target candle"""
+    return INTERVAL_MS[target_interval] // INTERVAL_MS[base_interval]
+
+def resample_klines(klines, base_interval: str, target_interval: str,
+                    limit: Optional[int] = None) -> np.ndarray:
+    """Aggregate base candles into target candles.
+
+    Open is the first open, high/low the extremes, close the last close and
+    volume the sum of each bucket. A leading bucket that starts before the
+    base history is incomplete and is dropped; the trailing bucket is kept as
+    the still-forming candle, matching what the exchange returns.
+    """
+    klines = to_kline_array(klines)
+    if len(klines) == 0:
+        return np.empty(0, dtype=KLINE_DTYPE)
+
+    target_ms = INTERVAL_MS[target_interval]
+    buckets = klines["timestamp"] // target_ms * target_ms
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(klines)] - 1
+
+    out = np.empty(len(starts), dtype=KLINE_DTYPE)
+    out["timestamp"] = buckets[starts]
+    out["open"] = klines["open"][starts]
+    out["high"] = np.maximum.reduceat(klines["high"], starts)
+    out["low"] = np.minimum.reduceat(klines["low"], starts)
+    out["close"] = klines["close"][ends]
+    out["volume"] = np.add.reduceat(klines["volume"], starts)
+
+    # The first bucket is partial when history starts mid-bucket
+    if klines["timestamp"][0] != buckets[0]:
+        out = out[1:]
+
+    return out[-limit:] if limit else out
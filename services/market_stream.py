@@ -0,0 +1,244 @@
+"""Public market-data stream and the in-memory ticker / kline / order book mirror"""
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from services.bybit_stream import BybitStream, PUBLIC_LINEAR_WS_URL, PUBLIC_LINEAR_WS_URL_TESTNET
+from services.kline_cache import KlineCache
+
+logger = logging.getLogger(__name__)
+
+# Called with (symbol, last price, exchange timestamp in ms)
+PriceListener = Callable[[str, float, int], None]
+
+class OrderBook:
+    """Price-level order book maintained from snapshot and delta messages"""
+
+    def __init__(self):
+        self.bids: Dict[float, float] = {}
+        self.asks: Dict[float, float] = {}
+        self.update_id = 0
+        self.ts = 0
+
+    def apply(self, data: Dict[str, Any], snapshot: bool, ts: int):
+        # update_id 1 means the exchange restarted the book: treat it as a snapshot
+        if snapshot or data.get("u") == 1:
+            self.bids.clear()
+            self.asks.clear()
+        for side, levels in ((self.bids, data.get("b", [])), (self.asks, data.get("a", []))):
+            for price, size in levels:
+                price, size = float(price), float(size)
+                if size == 0:
+                    side.pop(price, None)
+                else:
+                    side[price] = size
+        self.update_id = data.get("u", self.update_id)
+        self.ts = ts
+
+    def best_bid(self) -> Optional[float]:
+        return max(self.bids) if self.bids else None
+
+    def best_ask(self) -> Optional[float]:
+        return min(self.asks) if self.asks else None
+
+    def levels(self, depth: int) -> Dict[str, List[Tuple[float, float]]]:
+        return {
+            "bids": sorted(self.bids.items(), reverse=True)[:depth],
+            "asks": sorted(self.asks.items())[:depth],
+        }
+
+class MarketDataMirror:
+    """Latest tickers, order books and candles as pushed by the public stream.
+
+    Candles are merged into a KlineCache, normally the one BybitService
+    serves klines from, so REST history and streamed candles form one series.
+    Price listeners are called outside the lock on every ticker update.
+    """
+
+    def __init__(self, kline_cache: Optional[KlineCache] = None, max_age: float = 10.0):
+        self.kline_cache = kline_cache or KlineCache()
+        self.max_age = max_age
+        self.live = False
+
+        self._tickers: Dict[str, Dict[str, Any]] = {}
+        self._ticker_at: Dict[str, float] = {}
+        self._books: Dict[str, OrderBook] = {}
+        self._kline_subscribed_at: Dict[Tuple[str, str], float] = {}
+        self._listeners: List[PriceListener] = []
+        self._lock = threading.Lock()
+        self.stats = {"ticker_updates": 0, "kline_updates": 0, "orderbook_updates": 0}
+
+    # ----- listeners -----
+
+    def add_price_listener(self, listener: PriceListener):
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_price_listener(self, listener: PriceListener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _notify(self, symbol: str, price: float, ts: int):
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(symbol, price, ts)
+            except Exception as e:
+                logger.error(f"Price listener error for {symbol}: {str(e)}")
+
+    # ----- stream input -----
+
+    def apply_ticker(self, data: Dict[str, Any], snapshot: bool, ts: int):
+        """Merge a ticker snapshot or delta (deltas carry only changed fields)"""
+        symbol = data["symbol"]
+        with self._lock:
+            if snapshot:
+                ticker = dict(data)
+            elif symbol in self._tickers:
+                ticker = {**self._tickers[symbol], **data}
+            else:
+                return  # a delta is meaningless before its snapshot
+            self._tickers[symbol] = ticker
+            self._ticker_at[symbol] = time.monotonic()
+            self.stats["ticker_updates"] += 1
+        if "lastPrice" in data:
+            self._notify(symbol, float(data["lastPrice"]), ts)
+
+    def apply_kline(self, symbol: str, interval: str, candles: List[Dict[str, Any]]):
+        """Merge pushed candles (the forming candle is replaced until it is confirmed)"""
+        rows = [
+            (int(c["start"]), float(c["open"]), float(c["high"]), float(c["low"]),
+             float(c["close"]), float(c["volume"]))
+            for c in candles
+        ]
+        if not rows:
+            return
+        # Only extend a series that already has history; REST seeds it first
+        if self.kline_cache.count(symbol, interval):
+            self.kline_cache.merge(symbol, interval, rows, fetched_at=time.monotonic(), streamed=True)
+        with self._lock:
+            self.stats["kline_updates"] += 1
+
+    def apply_orderbook(self, data: Dict[str, Any], snapshot: bool, ts: int):
+        symbol = data["s"]
+        with self._lock:
+            book = self._books.setdefault(symbol, OrderBook())
+            book.apply(data, snapshot, ts)
+            self.stats["orderbook_updates"] += 1
+
+    def mark_kline_subscribed(self, symbol: str, interval: str):
+        """Record when a kline topic was (re)subscribed; history before it may have gaps"""
+        with self._lock:
+            self._kline_subscribed_at[(symbol, interval)] = time.monotonic()
+
+    def drop_orderbook(self, symbol: str):
+        with self._lock:
+            self._books.pop(symbol, None)
+
+    # ----- readers -----
+
+    def get_ticker(self, symbol: str, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Latest ticker if it was updated within ``max_age`` seconds, else None"""
+        max_age = self.max_age if max_age is None else max_age
+        with self._lock:
+            ticker = self._tickers.get(symbol)
+            if ticker is None or not self.live or time.monotonic() - self._ticker_at[symbol] > max_age:
+                return None
+            return dict(ticker)
+
+    def get_all_tickers(self, max_age: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """Every fresh ticker keyed by symbol"""
+        max_age = self.max_age if max_age is None else max_age
+        now = time.monotonic()
+        with self._lock:
+            if not self.live:
+                return {}
+            return {
+                symbol: dict(ticker) for symbol, ticker in self._tickers.items()
+                if now - self._ticker_at[symbol] <= max_age
+            }
+
+    def last_price(self, symbol: str, max_age: Optional[float] = None) -> Optional[float]:
+        ticker = self.get_ticker(symbol, max_age)
+        return float(ticker["lastPrice"]) if ticker and ticker.get("lastPrice") else None
+
+    def best_bid_ask(self, symbol: str) -> Tuple[Optional[float], Optional[float]]:
+        with self._lock:
+            book = self._books.get(symbol)
+            return (book.best_bid(), book.best_ask()) if book else (None, None)
+
+    def get_orderbook(self, symbol: str, depth: int = 50) -> Optional[Dict[str, Any]]:
+        """Sorted price levels: {'bids': [(price, size)...], 'asks': [...], 'ts': ms}"""
+        with self._lock:
+            book = self._books.get(symbol)
+            if book is None or not self.live:
+                return None
+            return {**book.levels(depth), "ts": book.ts}
+
+    def kline_subscribed_at(self, symbol: str, interval: str) -> Optional[float]:
+        """Monotonic time the kline topic was last (re)subscribed while live"""
+        with self._lock:
+            return self._kline_subscribed_at.get((symbol, interval)) if self.live else None
+
+    def get_klines_array(self, symbol: str, interval: str, limit: Optional[int] = None) -> np.ndarray:
+        return self.kline_cache.get(symbol, interval, limit)
+
+class PublicMarketStream(BybitStream):
+    """Ticker, kline and order book subscriptions for the active universe"""
+
+    def __init__(self, mirror: MarketDataMirror, url: Optional[str] = None, testnet: bool = False,
+                 intervals: Iterable[str] = (), orderbook_depth: int = 50, **kwargs):
+        super().__init__(url or (PUBLIC_LINEAR_WS_URL_TESTNET if testnet else PUBLIC_LINEAR_WS_URL), **kwargs)
+        self.mirror = mirror
+        self.intervals = list(intervals)
+        self.orderbook_depth = orderbook_depth
+        self.symbols: List[str] = []
+
+    def topics_for(self, symbols: Iterable[str]) -> List[str]:
+        topics = []
+        for symbol in symbols:
+            topics.append(f"tickers.{symbol}")
+            topics.extend(f"kline.{interval}.{symbol}" for interval in self.intervals)
+            if self.orderbook_depth:
+                topics.append(f"orderbook.{self.orderbook_depth}.{symbol}")
+        return topics
+
+    def set_symbols(self, symbols: Iterable[str]):
+        """Stream exactly these symbols"""
+        self.symbols = list(dict.fromkeys(symbols))
+        self.set_topics(self.topics_for(self.symbols))
+
+    def _after_connect(self) -> bool:
+        self.mirror.live = True
+        return super()._after_connect()
+
+    def _on_close(self, ws, status_code, message):
+        self.mirror.live = False
+        super()._on_close(ws, status_code, message)
+
+    def _on_subscribed(self, topics: Iterable[str]):
+        for topic in topics:
+            parts = topic.split(".")
+            if parts[0] == "kline":
+                self.mirror.mark_kline_subscribed(parts[2], parts[1])
+            elif parts[0] == "orderbook":
+                # Deltas are only valid on top of the snapshot that follows
+                self.mirror.drop_orderbook(parts[2])
+
+    def _handle_message(self, payload: Dict[str, Any]):
+        topic = payload["topic"]
+        snapshot = payload.get("type") == "snapshot"
+        ts = int(payload.get("ts", 0))
+        kind = topic.split(".", 1)[0]
+        if kind == "tickers":
+            self.mirror.apply_ticker(payload["data"], snapshot, ts)
+        elif kind == "kline":
+            _, interval, symbol = topic.split(".")
+            self.mirror.apply_kline(symbol, interval, payload["data"])
+        elif kind == "orderbook":
+            self.mirror.apply_orderbook(payload["data"], snapshot, ts)
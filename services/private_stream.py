@@ -0,0 +1,145 @@
+"""Private WebSocket stream for executions, orders, positions and wallet balance"""
+import hashlib
+import hmac
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+from services.bybit_stream import BybitStream, PRIVATE_WS_URL, PRIVATE_WS_URL_TESTNET
+
+logger = logging.getLogger(__name__)
+
+# Called with the list of records in one pushed message
+AccountListener = Callable[[List[Dict[str, Any]]], None]
+
+PRIVATE_TOPICS = ("execution", "order", "position", "wallet")
+
+# Order states after which an order never changes again
+FINAL_ORDER_STATUSES = {"Filled", "Cancelled", "Rejected", "Deactivated", "PartiallyFilledCanceled"}
+
+class AccountState:
+    """Latest account state as pushed by the private stream.
+
+    Positions are keyed by symbol (linear only), open orders by order id and
+    wallet balances by coin. Listeners registered per topic receive every
+    pushed batch after the state has been updated.
+    """
+
+    def __init__(self, max_executions: int = 1000):
+        self.live = False
+        self.positions: Dict[str, Dict[str, Any]] = {}
+        self.orders: Dict[str, Dict[str, Any]] = {}
+        self.executions = deque(maxlen=max_executions)
+        self.wallet: Dict[str, Dict[str, Any]] = {}
+        # "connected" listeners run after every (re)authentication, since
+        # events missed while disconnected are not replayed
+        self._listeners: Dict[str, List[AccountListener]] = {topic: [] for topic in PRIVATE_TOPICS + ("connected",)}
+        self._lock = threading.Lock()
+        self.stats = {topic: 0 for topic in PRIVATE_TOPICS}
+
+    def add_listener(self, topic: str, listener: AccountListener):
+        with self._lock:
+            self._listeners[topic].append(listener)
+
+    def apply(self, topic: str, records: List[Dict[str, Any]]):
+        """Apply one pushed batch and notify the topic's listeners"""
+        with self._lock:
+            if topic == "position":
+                for pos in records:
+                    if pos.get("category", "linear") != "linear":
+                        continue
+                    if float(pos.get("size") or 0) > 0:
+                        self.positions[pos["symbol"]] = pos
+                    else:
+                        self.positions.pop(pos["symbol"], None)
+            elif topic == "order":
+                for order in records:
+                    if order.get("orderStatus") in FINAL_ORDER_STATUSES:
+                        self.orders.pop(order["orderId"], None)
+                    else:
+                        self.orders[order["orderId"]] = order
+            elif topic == "execution":
+                self.executions.extend(records)
+            elif topic == "wallet":
+                for account in records:
+                    for coin in account.get("coin", []):
+                        self.wallet[coin["coin"]] = coin
+            self.stats[topic] += 1
+            listeners = list(self._listeners.get(topic, []))
+
+        for listener in listeners:
+            try:
+                listener(records)
+            except Exception as e:
+                logger.error(f"{topic} listener error: {str(e)}")
+
+    def mark_live(self):
+        self.live = True
+        with self._lock:
+            listeners = list(self._listeners["connected"])
+        for listener in listeners:
+            try:
+                listener([])
+            except Exception as e:
+                logger.error(f"connected listener error: {str(e)}")
+
+    def get_position(self, symbol: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            pos = self.positions.get(symbol)
+            return dict(pos) if pos else None
+
+    def available_balance(self, coin: str = "USDT") -> Optional[float]:
+        """Coin equity, as BybitService.get_balance reports it (None before the first wallet push)"""
+        with self._lock:
+            balance = self.wallet.get(coin)
+        if not balance:
+            return None
+        for field in ("equity", "walletBalance"):
+            if balance.get(field) not in (None, ""):
+                return float(balance[field])
+        return None
+
+class PrivateAccountStream(BybitStream):
+    """Authenticated stream feeding an AccountState"""
+
+    def __init__(self, state: AccountState, api_key: str, api_secret: str, url: Optional[str] = None,
+                 testnet: bool = False, auth_window: float = 10.0, **kwargs):
+        super().__init__(url or (PRIVATE_WS_URL_TESTNET if testnet else PRIVATE_WS_URL), **kwargs)
+        self.state = state
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.auth_window = auth_window
+        self.topics.update(PRIVATE_TOPICS)
+
+    def _after_connect(self) -> bool:
+        # Topics are subscribed once the auth response arrives
+        expires = int((time.time() + self.auth_window) * 1000)
+        signature = hmac.new(
+            self.api_secret.encode(), f"GET/realtime{expires}".encode(), hashlib.sha256
+        ).hexdigest()
+        self._send({"op": "auth", "args": [self.api_key, expires, signature]})
+        return False
+
+    def _handle_response(self, payload: Dict[str, Any]):
+        if payload.get("op") == "auth":
+            if payload.get("success"):
+                self.connected.set()
+                self._resubscribe()
+                self.state.mark_live()
+            else:
+                # Reconnect (with backoff) and sign again rather than sit unauthenticated
+                logger.error(f"Private stream authentication failed: {payload.get('ret_msg')}")
+                self._disconnect()
+            return
+        super()._handle_response(payload)
+
+    def _on_close(self, ws, status_code, message):
+        self.state.live = False
+        super()._on_close(ws, status_code, message)
+
+    def _handle_message(self, payload: Dict[str, Any]):
+        topic = payload["topic"].split(".", 1)[0]
+        if topic in PRIVATE_TOPICS:
+            self.state.apply(topic, payload.get("data", []))
@@ -0,0 +1,122 @@
+"""Token-bucket rate limiting for Bybit REST endpoints"""
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Mapping, Optional
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    ``reserve()`` takes a token immediately (letting the balance go negative)
+    and returns how long the caller must wait, so waiting happens outside the
+    lock and callers are served in arrival order from threads or coroutines.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"acquired": 0, "waited": 0, "wait_seconds": 0.0, "header_updates": 0}
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Take one token and return the seconds to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = max(-self.tokens / self.rate if self.tokens < 0 else 0.0, self._blocked_until - now)
+            self.stats["acquired"] += 1
+            if wait > 0:
+                self.stats["waited"] += 1
+                self.stats["wait_seconds"] += wait
+            return wait
+
+    def acquire(self):
+        """Block the calling thread until a token is available"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Wait in the event loop until a token is available"""
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def update(self, remaining: Optional[int] = None, limit: Optional[int] = None,
+               reset_ms: Optional[int] = None):
+        """Align the bucket with the limit state reported by the exchange"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.stats["header_updates"] += 1
+            if limit:
+                self.capacity = min(self.capacity, float(limit))
+            if remaining is not None:
+                self.tokens = min(self.tokens, float(remaining))
+                if remaining <= 0 and reset_ms:
+                    delay = max(reset_ms / 1000 - time.time(), 0.0)
+                    self._blocked_until = max(self._blocked_until, now + delay)
+
+class RateLimiter:
+    """Per-endpoint-class token buckets shared by every BybitService call.
+
+    Defaults follow Bybit's documented v5 limits: 600 requests per 5 seconds
+    per IP for public market data and 10-50 requests per second per UID for
+    private endpoints. Private limits are refined at runtime from the
+    X-Bapi-Limit* response headers.
+    """
+
+    # endpoint class -> (requests per second, burst capacity)
+    DEFAULT_LIMITS = {
+        "market": (120.0, 120.0),   # tickers / klines / server time (IP limit 600 per 5s)
+        "order": (10.0, 10.0),      # place / cancel order (linear)
+        "leverage": (10.0, 10.0),   # set leverage
+        "position": (50.0, 50.0),   # position list
+        "account": (50.0, 50.0),    # wallet balance, open orders, executions, closed PnL
+    }
+
+    def __init__(self, limits: Optional[Dict[str, tuple]] = None):
+        self.buckets: Dict[str, TokenBucket] = {
+            name: TokenBucket(rate, capacity)
+            for name, (rate, capacity) in {**self.DEFAULT_LIMITS, **(limits or {})}.items()
+        }
+
+    def bucket(self, endpoint: str) -> TokenBucket:
+        return self.buckets.get(endpoint) or self.buckets["market"]
+
+    def acquire(self, endpoint: str):
+        """Block until a request to this endpoint class may be sent"""
+        self.bucket(endpoint).acquire()
+
+    async def acquire_async(self, endpoint: str):
+        """Await until a request to this endpoint class may be sent"""
+        await self.bucket(endpoint).acquire_async()
+
+    def update_from_headers(self, endpoint: str, headers: Optional[Mapping[str, Any]]):
+        """Read X-Bapi-Limit-Status / X-Bapi-Limit / X-Bapi-Limit-Reset-Timestamp"""
+        if not headers or "X-Bapi-Limit-Status" not in headers:
+            return
+        try:
+            self.bucket(endpoint).update(
+                remaining=int(headers["X-Bapi-Limit-Status"]),
+                limit=int(headers["X-Bapi-Limit"]) if headers.get("X-Bapi-Limit") else None,
+                reset_ms=int(headers["X-Bapi-Limit-Reset-Timestamp"]) if headers.get("X-Bapi-Limit-Reset-Timestamp") else None
+            )
+        except (TypeError, ValueError) as e:
+            logger.debug(f"Ignoring malformed rate limit headers: {e}")
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Acquisition and wait counters per endpoint class"""
+        return {name: dict(bucket.stats, tokens=bucket.tokens) for name, bucket in self.buckets.items()}
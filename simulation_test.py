@@ -17,6 +17,8 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from genius_multi_trading_v2_with_trading import GeniusMultiTrader
 from genius_dynamic_exit_strategy import DynamicExitMatrix, PositionManager
+from services.kline_cache import to_kline_array
+from services.instrument_cache import InstrumentInfo
 
 # ログ設定
 logging.basicConfig(
@@ -99,6 +101,10 @@ class MockBybitService:
             return self.mock_data[symbol]['klines'][interval][-limit:]
         return []
     
+    def get_klines_array(self, symbol: str, interval: str, limit: int) -> np.ndarray:
+        """モックのklineデータを配列形式で返す"""
+        return to_kline_array(self.get_klines(symbol, interval, limit))
+    
     def get_ticker(self, symbol: str) -> Dict:
         """モックのtickerデータを返す"""
         if symbol in self.mock_data:
@@ -110,6 +116,14 @@ class MockBybitService:
             }
         return {}
     
+    def get_all_tickers(self, max_age=None) -> Dict:
+        """モックの全通貨tickerスナップショットを返す"""
+        return {symbol: self.get_ticker(symbol) for symbol in self.mock_data}
+    
+    def refresh_tickers(self) -> Dict:
+        """モックのtickerスナップショット更新"""
+        return self.get_all_tickers()
+    
     def get_balance(self) -> Dict:
         """モックの残高データを返す"""
         return {
@@ -129,6 +143,16 @@ class MockBybitService:
             }
         }
     
+    def get_instrument(self, symbol: str) -> InstrumentInfo:
+        """モックの銘柄情報を返す"""
+        qty_step = {'BTCUSDT': '0.001', 'ETHUSDT': '0.01', 'SOLUSDT': '0.1'}.get(symbol, '1')
+        return InstrumentInfo.from_api({
+            'symbol': symbol,
+            'lotSizeFilter': {'qtyStep': qty_step, 'minOrderQty': qty_step, 'maxOrderQty': '1000000', 'minNotionalValue': '5'},
+            'priceFilter': {'tickSize': '0.01'},
+            'leverageFilter': {'maxLeverage': '100'}
+        })
+    
     def set_leverage(self, symbol: str, leverage: int) -> Dict:
         """モックのレバレッジ設定"""
         logger.info(f"🔸 Mock Leverage Set: {symbol} = {leverage}x")
@@ -215,6 +239,11 @@ def test_entry_conditions(results: List[Dict]):
         else:
             logger.info(f"  ❌ エントリー条件満たさず")
     
+    # 最小注文金額（5 USDT）に満たない数量は引き上げる
+    quantity = trader._adjust_quantity('BTCUSDT', 0.001, 2000.0)
+    logger.info(f"\n📏 最小注文金額の調整: 0.001 BTC @ $2,000 → {quantity} BTC (${quantity * 2000:.2f})")
+    assert quantity == 0.003, "最小注文金額を満たしていない"
+    
     return opportunities
 
 
@@ -236,20 +265,20 @@ def test_exit_strategy(opportunities: List[Dict]):
             
         # 利確レベルの表示
         logger.info("\n  📈 段階的利確レベル:")
-        for tp in exit_plan['take_profits']:
+        for tp in exit_plan.take_profits:
             logger.info(f"    レベル{tp['level']}: ${tp['target_price']:,.2f} "
                        f"({tp['percentage_gain']:+.1f}%) - {tp['exit_ratio']*100:.0f}%決済 "
                        f"[{tp['reason']}]")
         
         # 損切りレベルの表示
         logger.info("\n  🛡️ 段階的損切りレベル:")
-        for sl in exit_plan['stop_losses']:
+        for sl in exit_plan.stop_losses:
             logger.info(f"    レベル{sl['level']}: ${sl['trigger_price']:,.2f} "
                        f"({sl['percentage_loss']:.1f}%) - {sl['exit_ratio']*100:.0f}%決済 "
                        f"[{sl['reason']}]")
         
         # トレーリング設定の表示
-        trailing = exit_plan['trailing_config']
+        trailing = exit_plan.trailing_config
         logger.info(f"\n  📈 トレーリングストップ:")
         logger.info(f"    発動: +{trailing['activation_profit']*100:.1f}%")
         logger.info(f"    コールバック: {trailing['callback_rate']*100:.1f}%")
@@ -257,7 +286,7 @@ def test_exit_strategy(opportunities: List[Dict]):
         
         # 価格変動シミュレーション
         logger.info(f"\n  🔄 価格変動シミュレーション:")
-        entry_price = exit_plan['entry_price']
+        entry_price = exit_plan.entry_price
         
         # シナリオ1: 価格が上昇
         test_prices = [
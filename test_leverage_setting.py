@@ -33,7 +33,7 @@ def test_leverage():
     
     # 確認
     print("\n現在のレバレッジを確認中...")
-    response = bybit.client.get_positions(
+    response = bybit.request("position", "get_positions",
         category="linear",
         symbol=symbol
     )
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+ウォークフォワード評価
+ローリングの学習/検証の窓ごとに、学習期間で閾値（trader.THRESHOLDS 全体のシフト）を選び、
+直後の検証期間で評価する。analyze_genius の採点（'genius'）と
+ImprovedConfidenceCalculator の採点（'improved'）を同じ窓で比較する。
+
+指標は因果的なので全期間で1回だけ計算し（FeatureCache で (通貨, 時間足, 期間) ごとに再利用）、
+各フォールドは同じ系列の区間を切り出して使う。フォールドはプロセスプールで並列に実行し、
+ワーカーとは param_sweep.SharedData の mmap で指標を共有する。
+"""
+
+import os
+import time
+import logging
+import multiprocessing
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from backtest import (
+    BARS_PER_DAY, DAILY_WINDOW, TRADE_DTYPE, BacktestResult, FeatureCache, FeatureSeries, MarketHistory,
+    compute_features, compute_signals, simulate_trades
+)
+from param_sweep import SharedData, build_trader, trader_settings
+
+logger = logging.getLogger(__name__)
+
+MODELS = ('genius', 'improved')
+
+# 学習期間で選ぶ閾値のシフト（通貨別の閾値の差は保つ）
+THRESHOLD_OFFSETS = (-0.10, -0.05, 0.0, 0.05, 0.10)
+
+def make_folds(history: MarketHistory, n_folds: int, train_days: int, test_days: Optional[int] = None) -> List[Dict]:
+    """
+    ローリングの学習/検証の窓（日の区切りに揃えたバー番号）
+    最初の DAILY_WINDOW 日は日足指標の準備期間として使わない。
+    test_days 省略時は残りの期間を n_folds 等分する。
+    """
+    total_days = len(history) // BARS_PER_DAY
+    usable_days = total_days - DAILY_WINDOW - train_days
+    if test_days is None:
+        test_days = usable_days // n_folds
+    if test_days < 1 or n_folds * test_days > usable_days:
+        raise ValueError(
+            f"{n_folds} folds × {test_days} test days do not fit in {total_days} days "
+            f"({DAILY_WINDOW} warm-up + {train_days} train)"
+        )
+    folds = []
+    for k in range(n_folds):
+        train_start = (DAILY_WINDOW + k * test_days) * BARS_PER_DAY
+        train_end = train_start + train_days * BARS_PER_DAY
+        folds.append({
+            'fold': k,
+            'train': (train_start, train_end),
+            'test': (train_end, train_end + test_days * BARS_PER_DAY),
+        })
+    return folds
+
+def shifted_thresholds(trader, offset: float) -> Dict[str, float]:
+    return {symbol: threshold + offset for symbol, threshold in trader.THRESHOLDS.items()}
+
+def _objective(trades: np.ndarray, history: MarketHistory) -> float:
+    """学習期間の評価値（複利の累計リターン、取引なしは0）"""
+    return BacktestResult(history, trades).stats.get('total_return', 0.0)
+
+def evaluate_fold(fold: Dict, model: str, history: MarketHistory, signals, trader,
+                  offsets: Sequence[float] = THRESHOLD_OFFSETS, plan_cache: Optional[Dict] = None,
+                  **simulation_kwargs) -> Dict[str, Any]:
+    """
+    1フォールド・1モデル分の学習（閾値選択）と検証
+    plan_cache は同じモデルのフォールド間で共有する（重なる学習期間の決済プランを再利用）
+    """
+    started = time.perf_counter()
+    train_start, train_end = fold['train']
+    scores = []
+    for offset in offsets:
+        trades = simulate_trades(
+            signals, trader, thresholds=shifted_thresholds(trader, offset),
+            start=train_start, end=train_end, plan_cache=plan_cache, **simulation_kwargs
+        )
+        scores.append(_objective(trades, history))
+    best = int(np.argmax(scores))
+
+    test_start, test_end = fold['test']
+    trades = simulate_trades(
+        signals, trader, thresholds=shifted_thresholds(trader, offsets[best]),
+        start=test_start, end=test_end, plan_cache=plan_cache, **simulation_kwargs
+    )
+    return {
+        'fold': fold['fold'],
+        'model': model,
+        'offset': offsets[best],
+        'train_return': scores[best],
+        'test_stats': BacktestResult(history, trades).stats,
+        'trades': trades,
+        'elapsed': time.perf_counter() - started,
+    }
+
+class WalkForwardResult:
+    """フォールドごとの結果とモデルごとの検証期間の通算成績"""
+
+    def __init__(self, history: MarketHistory, folds: List[Dict], records: List[Dict], timings: Dict[str, float]):
+        self.history = history
+        self.folds = folds
+        self.records = sorted(records, key=lambda record: (record['model'], record['fold']))
+        self.timings = timings
+
+    def models(self) -> List[str]:
+        return sorted({record['model'] for record in self.records})
+
+    def test_trades(self, model: str) -> np.ndarray:
+        """検証期間の取引を連結（フォールドの検証期間は重ならない）"""
+        trades = [record['trades'] for record in self.records if record['model'] == model]
+        return np.concatenate(trades) if trades else np.empty(0, dtype=TRADE_DTYPE)
+
+    def out_of_sample(self, model: str) -> BacktestResult:
+        return BacktestResult(self.history, self.test_trades(model))
+
+    def summary(self) -> str:
+        lines = []
+        for model in self.models():
+            offsets = [record['offset'] for record in self.records if record['model'] == model]
+            lines.append(
+                f"{model}: {self.out_of_sample(model).summary()} "
+                f"(閾値シフト平均 {np.mean(offsets):+.3f})"
+            )
+        return "\n".join(lines)
+
+# ワーカープロセスの状態（initializer で設定）
+_worker = {}
+
+def _init_worker(directory: str, settings: Dict[str, Any], offsets: Sequence[float], simulation: Dict[str, Any]):
+    history, features = SharedData(directory).attach()
+    _worker.update(
+        history=history, features=features, trader=build_trader(settings),
+        offsets=offsets, simulation=simulation, signals={}, plans={}
+    )
+
+def _worker_signals(model: str):
+    """ワーカー内でモデルごとに1回だけ採点"""
+    if model not in _worker['signals']:
+        _worker['signals'][model] = compute_signals(
+            _worker['history'], _worker['trader'], features=_worker['features'], model=model
+        )
+        _worker['plans'][model] = {}
+    return _worker['signals'][model]
+
+def _run_fold(job):
+    fold, model = job
+    return evaluate_fold(
+        fold, model, _worker['history'], _worker_signals(model), _worker['trader'],
+        _worker['offsets'], _worker['plans'][model], **_worker['simulation']
+    )
+
+def walk_forward(history: MarketHistory, n_folds: int = 24, train_days: int = 60, test_days: Optional[int] = None,
+                 models: Sequence[str] = MODELS, workers: Optional[int] = None, trader=None,
+                 cache: Optional[FeatureCache] = None, features: Optional[FeatureSeries] = None,
+                 offsets: Sequence[float] = THRESHOLD_OFFSETS, **simulation_kwargs) -> WalkForwardResult:
+    """
+    ウォークフォワード評価を実行
+    workers=1 はプロセスプールを使わずにこのプロセスで実行する。
+    ワーカーでは trader と同じクラス・設定（TRADER_SETTINGS）のトレーダーで評価する。
+    simulation_kwargs は simulate_trades に渡す（exits='matrix' など）。
+    """
+    if trader is None:
+        from genius_multi_trading_v2_with_trading import GeniusMultiTrader
+        trader = GeniusMultiTrader(None)
+    folds = make_folds(history, n_folds, train_days, test_days)
+    jobs = [(fold, model) for model in models for fold in folds]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    timings = {}
+
+    started = time.perf_counter()
+    if features is None:
+        features = compute_features(history, trader, cache=cache)
+    timings['features'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if workers == 1:
+        signals = {model: compute_signals(history, trader, features=features, model=model) for model in models}
+        plans = {model: {} for model in models}
+        records = [
+            evaluate_fold(fold, model, history, signals[model], trader, offsets, plans[model], **simulation_kwargs)
+            for fold, model in jobs
+        ]
+    else:
+        shared = SharedData.export(history, features)
+        try:
+            with multiprocessing.Pool(
+                workers, initializer=_init_worker,
+                initargs=(shared.directory, trader_settings(trader), offsets, simulation_kwargs)
+            ) as pool:
+                records = pool.map(_run_fold, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+        finally:
+            shared.cleanup()
+    timings['folds'] = time.perf_counter() - started
+
+    logger.info(
+        f"🚶 Walk-forward: {n_folds} folds × {len(models)} models on {workers} workers "
+        f"(features {timings['features']:.1f}s, folds {timings['folds']:.1f}s)"
+    )
+    return WalkForwardResult(history, folds, records, timings)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+ウォークフォワード評価の整合性チェックとベンチマーク
+指標キャッシュ（FeatureCache）を使った計算が直接計算と一致するか、区間指定のシミュレーションが
+区間外に出ないか、ワーカー数によらず（ワーカーでも渡したトレーダーの設定で）同じ結果になるかを確認し、
+24フォールドの評価が全期間のバックテスト1回と比べてどれだけかかるかを計測
+"""
+
+import os
+import sys
+import time
+import logging
+import tempfile
+import numpy as np
+
+from backtest import FeatureCache, MarketHistory, compute_features, compute_signals, run_backtest, simulate_trades
+from backtest_benchmark import synthetic_klines
+from walk_forward import make_folds, walk_forward
+from genius_multi_trading_v2_with_trading import GeniusMultiTrader
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+def same_features(a, b) -> bool:
+    arrays_a, arrays_b = a.to_arrays(), b.to_arrays()
+    return arrays_a.keys() == arrays_b.keys() and all(np.array_equal(arrays_a[k], arrays_b[k]) for k in arrays_a)
+
+def check_cache(history: MarketHistory, trader: GeniusMultiTrader) -> int:
+    """キャッシュなし・空のキャッシュ・一部のみ・ディスクからの読み込みで指標が一致するか（失敗数を返す）"""
+    failures = 0
+    expected = compute_features(history, trader)
+    with tempfile.TemporaryDirectory() as directory:
+        cache = FeatureCache(directory)
+        cases = {'空のキャッシュ': compute_features(history, trader, cache=cache)}
+        cases['全件ヒット'] = compute_features(history, trader, cache=cache)
+        if cache.stats['D']['hits'] != len(history.symbols):
+            failures += 1
+            logger.info(f"  ❌ 2回目の計算がキャッシュを使っていない: {cache.summary()}")
+
+        # 新しいプロセスでディスクから読み込み、1通貨だけ追加された場合を再現
+        for filename in os.listdir(directory):
+            if filename.startswith(history.symbols[-1] + '_'):
+                os.remove(os.path.join(directory, filename))
+        partial = FeatureCache(directory)
+        cases['ディスクから一部'] = compute_features(history, trader, cache=partial)
+        if partial.stats['D'] != {'hits': len(history.symbols) - 1, 'misses': 1}:
+            failures += 1
+            logger.info(f"  ❌ 追加した通貨だけを計算していない: {partial.summary()}")
+
+    for name, features in cases.items():
+        if not same_features(expected, features):
+            failures += 1
+            logger.info(f"  ❌ {name}: 直接計算と不一致")
+    return failures
+
+def check_windows(history: MarketHistory, trader: GeniusMultiTrader) -> int:
+    """区間指定のシミュレーションの確認（失敗数を返す）"""
+    failures = 0
+    signals = compute_signals(history, trader)
+    if not np.array_equal(simulate_trades(signals, trader), simulate_trades(signals, trader, start=0, end=len(history))):
+        failures += 1
+        logger.info("  ❌ 全区間を指定した結果が区間指定なしと異なる")
+    for fold in make_folds(history, 4, train_days=5):
+        for exits in ('bracket', 'matrix'):
+            start, end = fold['test']
+            trades = simulate_trades(signals, trader, start=start, end=end, exits=exits)
+            if len(trades) and (trades['entry_index'].min() < start or trades['exit_index'].max() >= end):
+                failures += 1
+                logger.info(f"  ❌ フォールド{fold['fold']} ({exits}): 区間外の取引")
+    return failures
+
+def same_records(a, b) -> bool:
+    return len(a.records) == len(b.records) and all(
+        x['offset'] == y['offset'] and np.array_equal(x['trades'], y['trades']) for x, y in zip(a.records, b.records)
+    )
+
+def check_workers(history: MarketHistory) -> int:
+    """設定を変えたトレーダーで1ワーカーと2ワーカーの結果が一致するか（失敗数を返す）"""
+    failures = 0
+    trader = GeniusMultiTrader(None)
+    trader.THRESHOLDS = {symbol: threshold - 0.08 for symbol, threshold in trader.THRESHOLDS.items()}
+    trader.BASE_POSITION_SIZE = 0.05
+    trader.dynamic_exit.profit_cascade.atr_multiples = {
+        tier: [m * 0.5 for m in multiples] for tier, multiples in trader.dynamic_exit.profit_cascade.atr_multiples.items()
+    }
+    runs = {
+        workers: walk_forward(history, n_folds=4, train_days=5, workers=workers, trader=trader, exits='matrix')
+        for workers in (1, 2)
+    }
+    default = walk_forward(history, n_folds=4, train_days=5, workers=1, exits='matrix')
+    if same_records(runs[1], default):
+        failures += 1
+        logger.info("  ❌ 設定を変えたトレーダーでも既定と同じ結果（チェックにならない）")
+    if not same_records(runs[1], runs[2]):
+        failures += 1
+        logger.info("  ❌ ワーカー数によって結果が異なる（ワーカーがトレーダーの設定を使っていない）")
+    return failures
+
+def main():
+    trader = GeniusMultiTrader(None)
+    failures = 0
+
+    logger.info("=" * 60)
+    logger.info("🔬 指標キャッシュと区間指定の整合性チェック（5通貨 × 45日）")
+    logger.info("=" * 60)
+    history = MarketHistory.from_klines(synthetic_klines(5, 45))
+    mismatches = check_cache(history, trader)
+    if mismatches:
+        failures += 1
+    else:
+        logger.info("  ✅ キャッシュ経由の指標が直接計算と一致（追加した通貨だけを計算）")
+    mismatches = check_windows(history, trader)
+    if mismatches:
+        failures += 1
+    else:
+        logger.info("  ✅ 区間指定の取引は区間内でエントリー・決済")
+    mismatches = check_workers(history)
+    if mismatches:
+        failures += 1
+    else:
+        logger.info("  ✅ 渡したトレーダーの設定で1ワーカーと2ワーカーの結果が一致")
+
+    logger.info("\n" + "=" * 60)
+    logger.info("⏱️  24フォールド（50通貨 × 365日、学習60日）")
+    logger.info("=" * 60)
+    history = MarketHistory.from_klines(synthetic_klines(50, 365, seed=50))
+    started = time.perf_counter()
+    run_backtest(history, trader)
+    full_pass = time.perf_counter() - started
+    logger.info(f"  全期間のバックテスト1回: {full_pass:.1f}秒")
+
+    cache = FeatureCache()
+    for workers in sorted({1, os.cpu_count() or 1}):
+        for label in ('初回', 'キャッシュ済み'):
+            started = time.perf_counter()
+            result = walk_forward(history, n_folds=24, train_days=60, workers=workers, trader=trader, cache=cache)
+            elapsed = time.perf_counter() - started
+            logger.info(f"  {workers}ワーカー {label}: {elapsed:.1f}秒 (全期間の{elapsed / full_pass:.1f}倍)")
+    logger.info(f"  キャッシュ: {cache.summary()}")
+    for line in result.summary().split("\n"):
+        logger.info(f"    {line}")
+    if len(result.records) != 48 or not all(len(result.test_trades(model)) for model in result.models()):
+        failures += 1
+        logger.info("  ❌ 検証期間の取引がない")
+
+    if failures:
+        logger.info(f"\n❌ {failures}件のチェックが失敗しました")
+        sys.exit(1)
+    logger.info("\n✅ すべてのテストが完了しました！")
+
+if __name__ == "__main__":
+    main()
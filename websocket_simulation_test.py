@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+WebSocketストリームのシミュレーションテスト
+ローカルのBybit互換WebSocketサーバーに接続し、価格・板・ローソク足のミラーを検証
+"""
+
+import sys
+import time
+import logging
+import threading
+from typing import Dict, List
+
+from genius_dynamic_exit_strategy import ExitPlan
+from genius_multi_trading_v2_with_trading import GeniusMultiTrader
+from services.bybit_service import BybitService
+from services.fake_bybit_ws import FakeBybitWebSocketServer
+from services.market_stream import MarketDataMirror, PublicMarketStream
+from services.private_stream import AccountState, PrivateAccountStream
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+logging.getLogger('websockets').setLevel(logging.WARNING)
+logging.getLogger('websocket').setLevel(logging.WARNING)
+logging.getLogger('services.bybit_service').setLevel(logging.WARNING)
+
+FIVE_MINUTES = 300_000
+
+
+class FakeKlineClient:
+    """get_kline だけを返すRESTクライアントのモック"""
+
+    def __init__(self, now_ms: int):
+        self.now_ms = now_ms
+        self.kline_calls = 0
+
+    def get_kline(self, **params) -> Dict:
+        self.kline_calls += 1
+        last = self.now_ms // FIVE_MINUTES * FIVE_MINUTES
+        rows = [
+            [str(last - i * FIVE_MINUTES), "100", "101", "99", "100.5", "10", "1000"]
+            for i in range(params.get("limit", 200))
+        ]
+        return {"retCode": 0, "result": {"list": rows}}
+
+
+class FakeTradingClient:
+    """トレーダーが呼ぶREST APIのモック（呼び出し回数を記録）"""
+
+    def __init__(self):
+        self.calls: List[str] = []
+        self.positions: Dict[str, Dict] = {}
+        self.closed: List[Dict] = []
+
+    def get_positions(self, symbol=None) -> List[Dict]:
+        self.calls.append('get_positions')
+        return [p for s, p in self.positions.items() if symbol in (None, s)]
+
+    def close_position(self, **kwargs) -> Dict:
+        self.calls.append('close_position')
+        self.closed.append(kwargs)
+        return {'success': True, 'order_id': 'close-1'}
+
+    def get_all_tickers(self) -> Dict[str, Dict]:
+        self.calls.append('get_all_tickers')
+        return {}
+
+    def get_instrument(self, symbol):
+        return None
+
+
+def wait_until(predicate, timeout: float = 2.0) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def check(condition: bool, message: str, failures: List[str]):
+    if condition:
+        logger.info(f"  ✅ {message}")
+    else:
+        logger.error(f"  ❌ {message}")
+        failures.append(message)
+
+
+def test_public_stream(failures: List[str]):
+    """ティッカー・板・ローソク足の受信とミラーへの反映"""
+    logger.info("\n" + "="*60)
+    logger.info("📡 パブリックストリームテスト")
+    logger.info("="*60)
+
+    server = FakeBybitWebSocketServer()
+    url = server.start()
+
+    bybit = BybitService("", "", testnet=True)
+    rest = FakeKlineClient(int(time.time() * 1000))
+    bybit.client = bybit.public_client = rest
+    mirror = MarketDataMirror()
+    bybit.attach_market_mirror(mirror)
+
+    stream = PublicMarketStream(mirror, url=url, intervals=['5'], orderbook_depth=50, reconnect_delay=0.1)
+    stream.set_symbols(['BTCUSDT', 'ETHUSDT'])
+    check(stream.start(timeout=5), "サーバーに接続", failures)
+
+    expected = set(stream.topics_for(['BTCUSDT', 'ETHUSDT']))
+    check(server.wait_for(lambda s: s.subscriptions() >= expected), f"{len(expected)}トピックを購読", failures)
+
+    # 価格リスナー（受信から通知までの遅延を計測）
+    received = []
+    arrived = threading.Event()
+    def on_price(symbol, price, ts):
+        received.append((symbol, price, time.perf_counter()))
+        arrived.set()
+    mirror.add_price_listener(on_price)
+
+    ticker = {
+        'symbol': 'BTCUSDT', 'lastPrice': '45000', 'bid1Price': '44999.5', 'ask1Price': '45000.5',
+        'volume24h': '1000', 'turnover24h': '45000000', 'highPrice24h': '46000',
+        'lowPrice24h': '44000', 'prevPrice24h': '44500', 'price24hPcnt': '0.011'
+    }
+    sent_at = time.perf_counter()
+    server.publish('tickers.BTCUSDT', ticker)
+    arrived.wait(2)
+    check(bool(received) and received[-1][1] == 45000.0, "ティッカースナップショット受信", failures)
+    if received:
+        logger.info(f"     配信→通知: {(received[-1][2] - sent_at) * 1000:.2f} ms")
+
+    arrived.clear()
+    server.publish('tickers.BTCUSDT', {'symbol': 'BTCUSDT', 'lastPrice': '45100'}, type='delta')
+    arrived.wait(2)
+    ticker_now = bybit.get_ticker('BTCUSDT')
+    check(ticker_now.get('lastPrice') == '45100' and ticker_now.get('highPrice24h') == '46000',
+          "差分をスナップショットにマージし get_ticker がミラーから応答", failures)
+    check(mirror.last_price('BTCUSDT') == 45100.0, "最新価格を参照可能", failures)
+
+    # 板: スナップショット + 差分（サイズ0は削除）
+    server.publish('orderbook.50.BTCUSDT', {
+        's': 'BTCUSDT', 'b': [['45099', '1'], ['45098', '2']], 'a': [['45101', '1'], ['45102', '3']], 'u': 10, 'seq': 1
+    })
+    server.publish('orderbook.50.BTCUSDT', {
+        's': 'BTCUSDT', 'b': [['45099', '0'], ['45100', '0.5']], 'a': [['45101', '0']], 'u': 11, 'seq': 2
+    }, type='delta')
+    deadline = time.time() + 2
+    while time.time() < deadline and mirror.stats['orderbook_updates'] < 2:
+        time.sleep(0.01)
+    check(mirror.best_bid_ask('BTCUSDT') == (45100.0, 45102.0), "板の差分を反映（最良気配 45100 / 45102）", failures)
+
+    # ローソク足: REST で履歴を取得した後はストリームで更新され REST を呼ばない
+    klines = bybit.get_klines_array('BTCUSDT', '5', 60)
+    calls_after_seed = rest.kline_calls
+    last_ts = int(klines['timestamp'][-1])
+    server.publish('kline.5.BTCUSDT', [{
+        'start': last_ts + FIVE_MINUTES, 'end': last_ts + 2 * FIVE_MINUTES - 1, 'interval': '5',
+        'open': '100.5', 'high': '103', 'low': '100', 'close': '102', 'volume': '5', 'turnover': '500',
+        'confirm': False, 'timestamp': last_ts + FIVE_MINUTES + 1000
+    }])
+    deadline = time.time() + 2
+    while time.time() < deadline and mirror.stats['kline_updates'] < 1:
+        time.sleep(0.01)
+    klines = bybit.get_klines_array('BTCUSDT', '5', 60)
+    check(int(klines['timestamp'][-1]) == last_ts + FIVE_MINUTES and klines['close'][-1] == 102.0,
+          "ストリームの足が履歴に追加", failures)
+    check(rest.kline_calls == calls_after_seed, "ストリーム購読中はローソク足のRESTを呼ばない", failures)
+
+    # 再接続: 再購読後は取りこぼし防止のためRESTで1回同期
+    server.disconnect_all()
+    deadline = time.time() + 5
+    while time.time() < deadline and stream.stats['connects'] < 2:
+        time.sleep(0.01)
+    check(server.wait_for(lambda s: s.subscriptions() >= expected, timeout=5), "切断後に自動再接続・再購読", failures)
+    time.sleep(0.05)
+    bybit.get_klines_array('BTCUSDT', '5', 60)
+    check(rest.kline_calls == calls_after_seed + 1, "再接続後の最初の取得はRESTで同期", failures)
+    bybit.get_klines_array('BTCUSDT', '5', 60)
+    check(rest.kline_calls == calls_after_seed + 1, "同期後は再びストリームのみ", failures)
+
+    # ユニバース変更: 外れた通貨は購読解除
+    stream.set_symbols(['BTCUSDT'])
+    check(server.wait_for(lambda s: not any('ETHUSDT' in t for t in s.subscriptions())),
+          "ユニバースから外れた通貨を購読解除", failures)
+
+    stream.stop()
+    server.stop()
+
+
+def test_private_stream(failures: List[str]):
+    """約定・注文・ポジション・残高イベントによるポジション状態の更新"""
+    logger.info("\n" + "="*60)
+    logger.info("🔐 プライベートストリームテスト")
+    logger.info("="*60)
+
+    server = FakeBybitWebSocketServer(api_key='test-key', api_secret='test-secret')
+    url = server.start()
+
+    # 誤った署名では認証されず購読もされない
+    rejected = PrivateAccountStream(AccountState(), 'test-key', 'wrong-secret', url=url, reconnect_delay=0.1)
+    check(not rejected.start(timeout=1) and not server.subscriptions(), "不正な署名は認証拒否", failures)
+    rejected.stop()
+
+    state = AccountState()
+    rest = FakeTradingClient()
+    trader = GeniusMultiTrader(rest, account_state=state)
+    trader.RECONCILE_DELAY = 0.05
+
+    # execute_trade 直後と同じ未確認のポジションを登録
+    for symbol, order_id in (('BTCUSDT', 'entry-btc'), ('ETHUSDT', 'entry-eth')):
+        rest.positions[symbol] = {'symbol': symbol, 'side': 'Buy', 'size': 0.1}
+        trader.active_positions[symbol] = {
+            'entry_price': 45000, 'quantity': 0.1, 'direction': 'LONG', 'order_id': order_id, 'confirmed': False
+        }
+        trader.position_manager.active_positions[symbol] = {
+            'exit_plan': ExitPlan(symbol, 45000, 0.1, [], [], [], []),
+            'order_id': order_id, 'side': 'Buy', 'quantity': 0.1, 'confirmed': False
+        }
+
+    stream = PrivateAccountStream(state, 'test-key', 'test-secret', url=url, reconnect_delay=0.1)
+    check(stream.start(timeout=5), "署名付きで認証", failures)
+    check(server.wait_for(lambda s: s.subscriptions() >= {'execution', 'order', 'position', 'wallet'}),
+          "execution / order / position / wallet を購読", failures)
+    # 接続時は切断中のイベントを補うためRESTで1回照合
+    check(wait_until(lambda: rest.calls.count('get_positions') == 2), "接続時に追跡中のポジションをRESTで照合", failures)
+
+    # 約定確認前のサイズ0（レバレッジ変更の通知など）は無視
+    server.publish('position', [{'category': 'linear', 'symbol': 'BTCUSDT', 'side': '', 'size': '0'}])
+    wait_until(lambda: state.stats['position'] >= 1)
+    check('BTCUSDT' in trader.active_positions, "約定前のサイズ0通知ではポジションを削除しない", failures)
+
+    # 約定: 実際の数量と平均建値を反映
+    server.publish('execution', [{
+        'category': 'linear', 'symbol': 'BTCUSDT', 'side': 'Buy', 'execQty': '0.098',
+        'execPrice': '45010', 'execType': 'Trade', 'orderId': 'entry-btc'
+    }])
+    server.publish('position', [{
+        'category': 'linear', 'symbol': 'BTCUSDT', 'side': 'Buy', 'size': '0.098', 'entryPrice': '45010'
+    }])
+    check(wait_until(lambda: trader.position_manager.active_positions['BTCUSDT'].get('confirmed')),
+          "ポジション通知で約定を確認", failures)
+    check(trader.active_positions['BTCUSDT']['quantity'] == 0.098 and
+          trader.active_positions['BTCUSDT']['entry_price'] == 45010.0 and
+          trader.position_manager.active_positions['BTCUSDT']['quantity'] == 0.098,
+          "実際の約定数量・建値を反映", failures)
+
+    # 約定せずに終了したエントリー注文は追跡から外す
+    server.publish('order', [{
+        'category': 'linear', 'symbol': 'ETHUSDT', 'orderId': 'entry-eth', 'orderStatus': 'Cancelled',
+        'cumExecQty': '0', 'rejectReason': 'EC_NoImmediateQtyToFill'
+    }])
+    check(wait_until(lambda: 'ETHUSDT' not in trader.active_positions and
+                     'ETHUSDT' not in trader.position_manager.active_positions),
+          "未約定で終了した注文のポジションを削除", failures)
+
+    # 残高
+    server.publish('wallet', [{'accountType': 'UNIFIED', 'coin': [{'coin': 'USDT', 'equity': '10250.5', 'walletBalance': '10000'}]}])
+    check(wait_until(lambda: state.available_balance() == 10250.5), "残高通知を反映", failures)
+
+    # 部分決済: ストリーム受信中はRESTの照合を行わない
+    calls_before = list(rest.calls)
+    trader._execute_exit_action('BTCUSDT', {'type': 'stop_loss', 'level': 1, 'exit_ratio': 1.0, 'price': 44000.0, 'reason': 'test'})
+    time.sleep(trader.RECONCILE_DELAY + 0.2)
+    check(rest.calls[len(calls_before):] == ['close_position'], "決済注文のみ送信（get_positions の照会なし）", failures)
+
+    # 取引所側の決済（SL約定など）もポジション通知で反映
+    trader.active_positions['BTCUSDT'] = {'entry_price': 45010, 'quantity': 0.098, 'direction': 'LONG', 'confirmed': True}
+    server.publish('position', [{'category': 'linear', 'symbol': 'BTCUSDT', 'side': '', 'size': '0'}])
+    check(wait_until(lambda: 'BTCUSDT' not in trader.active_positions), "サイズ0の通知で決済済みとして削除", failures)
+
+    stream.stop()
+    server.stop()
+
+
+def test_price_dispatch(failures: List[str]):
+    """価格ティックごとの決済判定（ポーリングなし）"""
+    logger.info("\n" + "="*60)
+    logger.info("🎯 ティック駆動の決済判定テスト")
+    logger.info("="*60)
+
+    server = FakeBybitWebSocketServer()
+    url = server.start()
+    mirror = MarketDataMirror()
+    rest = FakeTradingClient()
+    trader = GeniusMultiTrader(rest, market_mirror=mirror)
+    trader.RECONCILE_DELAY = 0.01
+    trader.position_manager.active_positions['BTCUSDT'] = {
+        'exit_plan': ExitPlan('BTCUSDT', 45000, 1.0, [46000], [0.5], [44000], [1.0]),
+        'side': 'Buy', 'quantity': 0.1, 'confirmed': True
+    }
+    trader.monitor_positions()
+
+    stream = PublicMarketStream(mirror, url=url, orderbook_depth=0, reconnect_delay=0.1)
+    stream.set_symbols(['BTCUSDT', 'ETHUSDT'])
+    stream.start(timeout=5)
+    server.wait_for(lambda s: 'tickers.ETHUSDT' in s.subscriptions())
+
+    dispatcher = trader.price_dispatcher
+    server.publish('tickers.BTCUSDT', {'symbol': 'BTCUSDT', 'lastPrice': '45000'})
+    server.publish('tickers.ETHUSDT', {'symbol': 'ETHUSDT', 'lastPrice': '3000'})
+    check(wait_until(lambda: mirror.stats['ticker_updates'] == 2) and dispatcher.stats['ticks'] == 1,
+          "保有中の通貨のティックだけを判定", failures)
+
+    rest.positions['BTCUSDT'] = {'symbol': 'BTCUSDT', 'side': 'Buy', 'size': 0.05}  # 部分決済後の照合結果
+    server.publish('tickers.BTCUSDT', {'symbol': 'BTCUSDT', 'lastPrice': '46100'}, type='delta')
+    check(wait_until(lambda: len(rest.closed) == 1) and abs(rest.closed[0]['qty'] - 0.05) < 1e-12,
+          "利確価格到達のティックで部分決済", failures)
+
+    server.publish('tickers.BTCUSDT', {'symbol': 'BTCUSDT', 'lastPrice': '46200'}, type='delta')
+    wait_until(lambda: dispatcher.stats['ticks'] == 3)
+    check(len(rest.closed) == 1, "実行済みの利確レベルは再発注しない", failures)
+
+    server.publish('tickers.BTCUSDT', {'symbol': 'BTCUSDT', 'lastPrice': '43900'}, type='delta')
+    check(wait_until(lambda: 'BTCUSDT' not in trader.position_manager.active_positions) and
+          len(rest.closed) == 2 and rest.closed[-1]['qty'] == 0.05, "損切り価格到達で残りを全決済", failures)
+    check('get_all_tickers' not in rest.calls, "ストリーム受信中はティッカーをRESTで取得しない", failures)
+
+    # ショート: ロング前提のプランをエントリー価格で反転して判定（利確 2700 / 損切り 3100）
+    trailing = {'enabled': True, 'activation_profit': 0.015, 'callback_rate': 0.008, 'step_size': 0.005, 'aggressive_mode': False}
+    trader.position_manager.active_positions['ETHUSDT'] = {
+        'exit_plan': ExitPlan('ETHUSDT', 3000, 1.0, [3300], [0.5], [2900], [1.0], trailing, side='Sell'),
+        'side': 'Sell', 'quantity': 1.0, 'confirmed': True, 'highest_price': 3000
+    }
+    ticks = dispatcher.stats['ticks']
+    server.publish('tickers.ETHUSDT', {'symbol': 'ETHUSDT', 'lastPrice': '2880'}, type='delta')
+    wait_until(lambda: dispatcher.stats['ticks'] == ticks + 1)
+    check(len(rest.closed) == 2, "ショートの含み益方向の値動きでは損切りしない", failures)
+
+    rest.positions['ETHUSDT'] = {'symbol': 'ETHUSDT', 'side': 'Sell', 'size': 0.5}
+    server.publish('tickers.ETHUSDT', {'symbol': 'ETHUSDT', 'lastPrice': '2690'}, type='delta')
+    check(wait_until(lambda: len(rest.closed) == 3) and rest.closed[-1]['qty'] == 0.5 and
+          rest.closed[-1]['side'] == 'Sell', "ショートの利確価格（下方向）到達で部分決済", failures)
+
+    server.publish('tickers.ETHUSDT', {'symbol': 'ETHUSDT', 'lastPrice': '2730'}, type='delta')
+    check(wait_until(lambda: 'ETHUSDT' not in trader.position_manager.active_positions) and
+          len(rest.closed) == 4 and rest.closed[-1]['qty'] == 0.5, "ショートの最安値からの反発でトレーリング決済", failures)
+
+    stream.stop()
+    dispatcher.stop()
+    server.stop()
+
+
+def main():
+    logger.info("="*60)
+    logger.info("🔌 WebSocket Stream Simulation Test")
+    logger.info("="*60)
+
+    failures: List[str] = []
+    test_public_stream(failures)
+    test_private_stream(failures)
+    test_price_dispatch(failures)
+
+    logger.info("\n" + "="*60)
+    if failures:
+        logger.error(f"❌ {len(failures)}件の失敗")
+        sys.exit(1)
+    logger.info("✅ すべてのテストが完了しました！")
+
+
+if __name__ == "__main__":
+    main()